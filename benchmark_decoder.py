@@ -0,0 +1,68 @@
+"""Compares the typed decoder of kuka.decoder with the split/float parsing
+previously used by KUKA_DataReader.get_data
+
+Usage : python benchmark_decoder.py [repeat]
+"""
+
+import sys
+import timeit
+import numpy as np
+
+from kuka.decoder import decode, decode_array, decode_axis, decode_bool
+
+rng = np.random.default_rng(0)
+
+def krl_array (n: int) -> bytes:
+    """Raw reading of a KRL REAL array, as sent by the C3 Bridge"""
+    return (" ".join(f"{v:.7g}" for v in rng.normal(0, 100, n)) + " ").encode()
+
+TAB_1 = krl_array(36)
+BUFFER = krl_array(2000)
+E6AXIS = ("{E6AXIS: " + ", ".join(
+    f"{n} {v:.6g}" for n, v in zip([ f"A{i}" for i in range(1, 7) ] + [ f"E{i}" for i in range(1, 7) ], rng.normal(0, 90, 12))
+) + "}").encode()
+
+def split_float (raw: bytes):
+    """Previous parsing of get_data"""
+    values = raw.split(b" ")[:-1]
+    return [ float(values[i]) for i in range(len(values)) ]
+
+def split_axis (raw: bytes):
+    """Parsing of a structure by hand"""
+    return [ float(field.split(b" ")[-1]) for field in raw[raw.index(b":") + 1:-1].split(b",") ]
+
+CASES = [
+    ("__TAB_1[] (36 REAL)", [
+        ("split/float", lambda: split_float(TAB_1)),
+        ("decode_array", lambda: decode_array(TAB_1)),
+        ("decode_array().tolist()", lambda: decode_array(TAB_1).tolist()),
+    ]),
+    ("ColBUFFER chunk (2000 REAL)", [
+        ("split/float", lambda: split_float(BUFFER)),
+        ("split/float -> np.array", lambda: np.array(split_float(BUFFER))),
+        ("decode_array", lambda: decode_array(BUFFER)),
+    ]),
+    ("E6AXIS", [
+        ("split/float", lambda: split_axis(E6AXIS)),
+        ("decode_axis", lambda: decode_axis(E6AXIS)),
+        ("decode (guessed)", lambda: decode(E6AXIS)),
+    ]),
+    ("BOOL", [
+        ("== b'TRUE'", lambda: b'TRUE' == b'TRUE'),
+        ("decode_bool", lambda: decode_bool(b'TRUE')),
+    ]),
+]
+
+if __name__ == "__main__":
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    assert np.allclose(decode_array(TAB_1), split_float(TAB_1))
+    assert np.allclose(decode_array(BUFFER), split_float(BUFFER))
+    assert np.allclose(decode_axis(E6AXIS), split_axis(E6AXIS))
+
+    for name, variants in CASES:
+        print(name)
+        for label, func in variants:
+            number, _ = timeit.Timer(func).autorange()
+            best = min(timeit.repeat(func, number=number, repeat=repeat)) / number
+            print(f"  {label:<28}{best * 1e6:>10.2f} us")
@@ -0,0 +1,113 @@
+"""Compares the vectorised KUKA_Trace.convert_r64 and kuka.resample with the
+loops over every sample previously used to decode the .r64 files and to
+upsample the KRCIpo module
+
+Usage : python benchmark_trace.py [duration in s] [repeat]
+"""
+
+import os
+import sys
+import tempfile
+import timeit
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+from kuka.resample import resample
+from kuka.trace import DatFile, KUKA_Trace
+
+rng = np.random.default_rng(0)
+
+# A NextGenDrive module : eight channels sampled every 4 ms
+SAMPLING = 0.004
+CHANNELS = [ "Position_Command", "Position", "Position_Error", "Velocity_Error",
+             "Temperature", "Torque", "Current", "AnalogOut" ]
+
+def module (folder: str, duration: float) -> DatFile:
+    """Writes the .r64 file of a module, and gives its channels as read from the .dat file"""
+    dat = DatFile()
+    dat.sampling = SAMPLING
+    dat.traces = [ f"{c}_A1" for c in CHANNELS ]
+    dat.col241 = rng.uniform(0.5, 2, len(CHANNELS)).tolist()
+    dat.length = int(duration / SAMPLING)
+
+    rng.normal(0, 100, (dat.length, len(CHANNELS))).tofile(os.path.join(folder, "module.r64"))
+    return dat
+
+def loop_convert (r64: Path, dat: DatFile) -> Dict[str, List[float]]:
+    """Previous decoding of convert_r64"""
+    out: Dict[str, List[float]] = {}
+    for col in dat.traces:
+        out[col] = []
+    N = len(dat.traces)
+    with open(r64, "rb") as file:
+        samples = np.fromfile(file, dtype='float64')
+        length = len(samples) // N
+        for i in range(length):
+            for n in range(N):
+                col = dat.traces[n]
+                out[col].append(samples[i * N + n] * dat.col241[n])
+    return out
+
+def loop_linear (data: np.ndarray, ratio: int) -> np.ndarray:
+    """Previous linear_interpolation, without its interpolation error"""
+    data_len = len(data)
+    neo = np.zeros(data_len * ratio)
+    neo[::ratio] = data
+    for i in range(1, len(neo)):
+        if i % ratio == 0:
+            continue
+        k = i // ratio
+        if (k + 1) >= data_len:
+            neo[i] = data[k]
+            continue
+        neo[i] = data[k] + (i % ratio) / ratio * (data[k+1] - data[k])
+    return neo
+
+def loop_hold (data: np.ndarray, ratio: int) -> np.ndarray:
+    """Previous step interpolation of AnalogOut"""
+    temp = np.zeros(len(data) * ratio)
+    for i in range(ratio):
+        temp[i::ratio] = data
+    return temp
+
+if __name__ == "__main__":
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 600
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    trace = KUKA_Trace(None)
+
+    with tempfile.TemporaryDirectory() as folder:
+        dat = module(folder, duration)
+        r64 = Path(folder, "module.r64")
+
+        loop = loop_convert(r64, dat)
+        vectorised = trace.convert_r64(r64, dat)
+        for col in dat.traces:
+            assert np.allclose(loop[col], vectorised[col])
+
+        print(f"One module, {len(CHANNELS)} channels, {duration:g} s at {SAMPLING * 1000:g} ms ({dat.length} samples)")
+        for label, func, number in [
+            ("loop", lambda: loop_convert(r64, dat), 1),
+            ("convert_r64", lambda: trace.convert_r64(r64, dat), 20),
+        ]:
+            best = min(timeit.repeat(func, number=number, repeat=repeat)) / number
+            print(f"  {label:<28}{best * 1e3:>10.2f} ms")
+
+    # A KRCIpo channel, every 12 ms, on the 4 ms time base
+    ipo = rng.normal(0, 100, int(duration / 0.012))
+    assert np.allclose(loop_linear(ipo, 3), resample(ipo, 0.012, 0.004))
+    assert np.allclose(loop_hold(ipo, 3), resample(ipo, 0.012, 0.004, method="hold"))
+
+    print(f"KRCIpo channel, {duration:g} s from 12 ms to 4 ms ({len(ipo)} samples)")
+    for label, func, number in [
+        ("loop, linear", lambda: loop_linear(ipo, 3), 1),
+        ("resample, linear", lambda: resample(ipo, 0.012, 0.004), 20),
+        ("loop, hold", lambda: loop_hold(ipo, 3), 20),
+        ("resample, hold", lambda: resample(ipo, 0.012, 0.004, method="hold"), 20),
+        ("resample, polyphase", lambda: resample(ipo, 0.012, 0.004, method="polyphase"), 5),
+        ("resample, polyphase 5 ms", lambda: resample(ipo, 0.012, 0.005, method="polyphase"), 5),
+    ]:
+        best = min(timeit.repeat(func, number=number, repeat=repeat)) / number
+        print(f"  {label:<28}{best * 1e3:>10.2f} ms")
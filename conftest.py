@@ -0,0 +1,2 @@
+# test_trace.py and test_ui.py are scripts run by hand, with a robot and the user interface
+collect_ignore = [ "test_trace.py", "test_ui.py" ]
@@ -1,9 +1,13 @@
 # import python classes from the folder kuka
 
 from .kukavarproxy import openshowvar
+from .pool import KUKA_ConnectionPool, PRIORITY_SAMPLING, PRIORITY_CONTROL, PRIORITY_UI
 from .handler import KUKA_Handler
 from .trace import KUKA_Trace
 from .array import KUKA_Array
 from .reader import	KUKA_DataReader
+from .aio import openshowvar_async, KUKA_AsyncHandler, KUKA_AsyncDataReader, acquire_all
+from .cells import Cell, CellRegistry
+from .process import KUKA_CollectorProcess, RunBarrier, SampleFeed
 
 print("Loaded Kuka classes")
\ No newline at end of file
@@ -0,0 +1,676 @@
+'''
+asyncio versions of the C3 Bridge client, the connection handler and the
+data reader, used to poll several robots from a single event loop.
+'''
+
+from __future__ import annotations
+
+import asyncio
+import random
+from threading import BrokenBarrierError
+from time import perf_counter, time
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .clock import ClockSync
+from .kukavarproxy import ENCODING, _FRAME_HEADER, Burst, set_keepalive, unpack_rsp
+from .handler import KUKA_Handler
+from .pool import PRIORITY_CONTROL
+from .reader import KUKA_DataReader
+from .stats import PHASE_PARSE, PHASE_REQUEST, PHASE_SEND, PHASE_WAIT, new_timings, summarize
+from .steps import run_async
+
+class openshowvar_async(object):
+    """asyncio connector class for C3 Bridge
+    """
+
+    def __init__(self, ip: str, port: int, timeout: float = 2.0):
+        """asyncio connector class for C3 Bridge. Requests can be sent
+        concurrently : the responses are matched back to their request by id.
+
+        Args:
+            ip (str): Robot's IPv4
+            port (int): C3 Bridge port. Usually 7000
+            timeout (float, optional): Time to wait for a response before reconnecting, in seconds. Defaults to 2.0.
+        """
+
+        self.ip = ip
+        self.port = port
+        self.timeout = timeout
+        self.msg_id = random.randint(1, 100)
+        self.retry = 0
+        self.retry_limit = 5
+
+        # Delay before the first reconnection, doubled after each failure
+        self.backoff = 0.05
+        self.backoff_max = 2.0
+
+        self._reader: asyncio.StreamReader = None
+        self._writer: asyncio.StreamWriter = None
+        self._listener: asyncio.Task = None
+        self._pending: Dict[int, asyncio.Future] = {}
+
+        # Durations of the phases of the requests, see kuka.stats
+        self.timings = new_timings()
+
+    async def connect(self) -> bool:
+        """Opens a new connection to the C3 Bridge, replacing the current one
+
+        Returns:
+            bool: The robot is online
+        """
+
+        await self._disconnect()
+        try:
+            self._reader, self._writer = await asyncio.wait_for(asyncio.open_connection(self.ip, self.port), self.timeout)
+        except (OSError, asyncio.TimeoutError):
+            return False
+
+        set_keepalive(self._writer.get_extra_info('socket'))
+        self._listener = asyncio.create_task(self._listen())
+        return True
+
+    async def _disconnect(self):
+        """Closes the current connection. Its pending requests fail
+        """
+
+        listener, writer = self._listener, self._writer
+        self._reader = self._writer = self._listener = None
+
+        if listener is not None:
+            listener.cancel()
+            try:
+                await listener
+            except asyncio.CancelledError:
+                pass
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    async def _listen(self):
+        """Reads the responses and hands them to the pending requests. When it
+        stops, because the connection is closed or broken, every pending
+        request fails.
+        """
+
+        try:
+            while True:
+                header = await self._reader.readexactly(_FRAME_HEADER.size)
+                _msg_id, body_len = _FRAME_HEADER.unpack(header)
+                body = await self._reader.readexactly(body_len)
+
+                future = self._pending.pop(_msg_id, None)
+                if future is not None and not future.done():
+                    future.set_result((header + body, perf_counter()))
+
+        except (asyncio.IncompleteReadError, OSError):
+            pass
+
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError('C3 bridge closed the connection'))
+            self._pending.clear()
+
+    @property
+    def connected(self) -> bool:
+        """The connection is open and its responses are being read
+        """
+
+        return self._writer is not None and self._listener is not None and not self._listener.done()
+
+    async def _retry(self, request: Callable[[], Awaitable], default = None):
+        """Runs a request. On a network error or a response not received
+        within `timeout`, reconnects with a bounded exponential backoff and
+        sends the request again, up to `retry_limit` times, as openshowvar._retry.
+
+        Args:
+            request (Callable[[], Awaitable]): The request to run
+            default (optional): The result if all the tries failed. Defaults to None.
+
+        Returns:
+            The result of the request, or `default`
+        """
+
+        delay = self.backoff
+        for self.retry in range(1, self.retry_limit + 1):
+            try:
+                return await request()
+            except (OSError, asyncio.TimeoutError) as e:
+                print(f'{self.ip} : request error ({e!r}), {self.retry} - try')
+                await asyncio.sleep(delay)
+                delay = min(2 * delay, self.backoff_max)
+                await self.connect()
+
+        print(f'{self.ip} : request failed {self.retry_limit} times')
+        self.retry = 0
+        return default
+
+    def _write(self, data: bytes) -> float:
+        """Hands bytes to the transport, sent in the background
+
+        Raises:
+            ConnectionError: The connection is closed
+
+        Returns:
+            float: The time the bytes were written at
+        """
+
+        if not self.connected:
+            raise ConnectionError('Not connected to the C3 bridge')
+
+        start = perf_counter()
+        self._writer.write(data)
+        return start
+
+    async def _drain(self, start: float) -> float:
+        """Waits until the written bytes are sent, timing the send
+
+        Args:
+            start (float): The time the bytes were written at
+
+        Returns:
+            float: The time the bytes were sent at
+        """
+
+        await asyncio.wait_for(self._writer.drain(), self.timeout)
+        sent = perf_counter()
+        self.timings[PHASE_SEND].add(sent - start)
+        return sent
+
+    async def _run_burst(self, burst: Burst):
+        """Sends the requests of a burst not done yet, and waits for the
+        responses of those waited for
+
+        Args:
+            burst (Burst): The requests, updated as they are sent and answered
+
+        Raises:
+            ConnectionError: The connection is closed, or was closed before all the responses were received
+            asyncio.TimeoutError: The responses were not received within `timeout`
+        """
+
+        loop = asyncio.get_running_loop()
+        start = perf_counter()
+        reqs = burst.pack(self._next_id)
+        futures: Dict[int, Tuple[int, asyncio.Future]] = {}
+        for index, msg_id, _ in reqs:
+            if index >= burst.posted:
+                futures[msg_id] = (index, loop.create_future())
+                self._pending[msg_id] = futures[msg_id][1]
+
+        error = None
+        sent = start
+        try:
+            # The posted writes are handed to the transport whole, and never sent again
+            sent = self._write(b''.join(req for _, _, req in reqs))
+            burst.sent.update(index for index, _, _ in reqs if index < burst.posted)
+            sent = await self._drain(sent)
+            if futures:
+                await asyncio.wait([ future for _, future in futures.values() ], timeout=self.timeout)
+        finally:
+            # A lost response can not resolve a future of the next requests
+            for msg_id, (index, future) in futures.items():
+                self._pending.pop(msg_id, None)
+                if not future.done():
+                    future.cancel()
+                elif future.cancelled():
+                    pass
+                elif future.exception() is not None:
+                    error = future.exception()
+                else:
+                    rsp, received = future.result()
+                    self.timings[PHASE_WAIT].add(received - sent)
+                    parse = perf_counter()
+                    _, value, isok = unpack_rsp(rsp)
+                    self.timings[PHASE_PARSE].add(perf_counter() - parse)
+                    burst.responses[index] = (value, isok)
+
+        if not burst.done:
+            raise error or asyncio.TimeoutError()
+        self.timings[PHASE_REQUEST].add(perf_counter() - start)
+
+    def _next_id(self) -> int:
+        """Returns a new message id
+        """
+
+        msg_id = self.msg_id
+        self.msg_id = (self.msg_id + 1) % 65536
+        return msg_id
+
+    async def read(self, var: str) -> bytes | None:
+        """Reads data from the robot
+
+        Args:
+            var (str): The variable to read in KRL syntax
+
+        Returns:
+            bytes | None: The read bytes. None if the read failed
+        """
+
+        return (await self.read_many([ var ]))[0]
+
+    async def read_many(self, vars: List[str], writes: List[Tuple[str, str]] = ()) -> List[bytes | None]:
+        """Reads several variables in a single round trip
+
+        Args:
+            vars (List[str]): The variables to read in KRL syntax
+            writes (List[Tuple[str, str]], optional): Variables to assign before the readings, in the same burst. Their responses are not waited for. Defaults to ().
+
+        Returns:
+            List[bytes | None]: The read bytes, in the order of `vars`. None for a failed read
+        """
+
+        burst = Burst(
+            [ (var.encode(ENCODING), value.encode(ENCODING)) for var, value in writes ],
+            [ (var.encode(ENCODING), None) for var in vars ]
+        )
+        await self._retry(lambda: self._run_burst(burst))
+        return [ rsp[0] if rsp is not None and rsp[1] else None for rsp in burst.results() ]
+
+    async def write(self, var: str, value: str) -> bool:
+        """Assigns a value to a variable
+
+        Args:
+            var (str): The variable to write
+            value (str): The value to assign to the variable
+
+        Returns:
+            bool: The value has been written
+        """
+
+        return (await self.write_many([ (var, value) ]))[0]
+
+    async def write_many(self, values: List[Tuple[str, str]], wait: bool = True) -> List[bool]:
+        """Assigns values to several variables in a single round trip
+
+        Args:
+            values (List[Tuple[str, str]]): The variables to write and their values
+            wait (bool, optional): Waits for the acknowledgements. Else their responses are dropped. Defaults to True.
+
+        Returns:
+            List[bool]: For each variable, the value has been written, or sent if not waiting
+        """
+
+        encoded = [ (var.encode(ENCODING), value.encode(ENCODING)) for var, value in values ]
+        burst = Burst(encoded) if not wait else Burst(waited=encoded)
+        await self._retry(lambda: self._run_burst(burst))
+        if not wait:
+            return [ index in burst.sent for index in range(len(values)) ]
+        return [ rsp is not None and rsp[1] for rsp in burst.results() ]
+
+    async def close(self):
+        """Closes the connection
+        """
+
+        await self._disconnect()
+
+class KUKA_AsyncHandler:
+    """asyncio version of KUKA_Handler. Requests share a single connection :
+    they are matched by id and never interleave, so the priority arguments
+    are only kept for compatibility with KUKA_Handler.
+    """
+
+    def __init__(self, ipAddress, port, cell = None, trace_share = None):
+        self.connected = False
+        self.ipAddress = ipAddress
+        self.port = port
+        self.cell = cell
+        self.trace_share = trace_share
+        self.client = None
+        self.loop = None
+        self.blocking = KUKA_BlockingHandler(self)
+
+    async def KUKA_Open(self):
+        if self.connected == False:
+            self.client = openshowvar_async(self.ipAddress, self.port)
+
+            if await self.client.connect():
+                print('Connection is established!')
+                self.connected = True
+                self.loop = asyncio.get_running_loop()
+                return True
+            else:
+                print('Connection is broken! Check configuration or restart C3_Server at KUKA side.')
+                self.connected = False
+                return False
+        else:
+            print('Connection is ready!')
+
+    async def KUKA_ReadVar(self, var, priority = PRIORITY_CONTROL):
+        if self.connected:
+            return KUKA_Handler._convert(await self.client.read(var))
+        else:
+            return False
+
+    async def KUKA_ReadMany(self, vars, priority = PRIORITY_CONTROL, writes = None):
+        if self.connected:
+            writes = [ (var, str(value)) for var, value in (writes or {}).items() ]
+            return [ KUKA_Handler._convert(res) for res in await self.client.read_many(vars, writes) ]
+        else:
+            return [ False ] * len(vars)
+
+    async def KUKA_WriteVar(self, var, value, priority = PRIORITY_CONTROL):
+        if self.connected:
+            await self.client.write(var, str(value))
+            return True
+        else:
+            return False
+
+    async def KUKA_WriteMany(self, values, priority = PRIORITY_CONTROL, wait = True):
+        if self.connected:
+            return all(await self.client.write_many([ (var, str(value)) for var, value in values.items() ], wait))
+        else:
+            return False
+
+    async def KUKA_SyncClock(self, clock = None, probes = 8, priority = PRIORITY_CONTROL):
+        """Adds a synchronisation to the clock mapping of the robot, see
+        KUKA_Handler.KUKA_SyncClock
+        """
+        clock = clock if clock is not None else ClockSync()
+        if not self.connected:
+            return clock
+
+        readings = []
+        for _ in range(probes):
+            sent = perf_counter()
+            raw = await self.client.read("$TIMER[1]")
+            received = perf_counter()
+            try:
+                readings.append((sent, float(raw), received))
+            except (TypeError, ValueError):
+                pass
+        clock.add(readings)
+        return clock
+
+    async def KUKA_WaitFor(self, vars, predicate, timeout = None, period = 0.02):
+        """Waits until the values of variables match a predicate, reading them
+        in one request per period
+
+        Args:
+            vars (List[str]): The variables to watch
+            predicate (Callable[[list], bool]): Checks the values, given in the order of `vars`
+            timeout (float, optional): The longest time to wait, in seconds. Defaults to None (forever).
+            period (float, optional): The time between two readings, in seconds. Defaults to 0.02.
+
+        Returns:
+            bool: The predicate is true, False on timeout
+        """
+        async def poll ():
+            while not predicate(await self.KUKA_ReadMany(vars)):
+                await asyncio.sleep(period)
+
+        try:
+            await asyncio.wait_for(poll(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def KUKA_Stats(self):
+        """Gives the statistics of the connection to the robot
+
+        Returns:
+            Dict: Per request phase (send, wait, parse, request), the count, mean,
+            min, max and percentiles of the durations in seconds
+        """
+        if self.client is None:
+            return {}
+        return { "latency": summarize([ self.client.timings ]) }
+
+    async def KUKA_Close(self):
+        if self.connected == True:
+            await self.client.close()
+            self.connected = False
+            return True
+        else:
+            return False
+
+class KUKA_BlockingHandler:
+    """Blocking view of a KUKA_AsyncHandler, for the code running in worker
+    threads (Kuka Trace control) while the event loop keeps polling
+    """
+
+    def __init__(self, handler: KUKA_AsyncHandler):
+        self.handler = handler
+
+    @property
+    def ipAddress(self):
+        return self.handler.ipAddress
+
+    @property
+    def port(self):
+        return self.handler.port
+
+    @property
+    def cell(self):
+        return self.handler.cell
+
+    @property
+    def trace_share(self):
+        return self.handler.trace_share
+
+    def __call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.handler.loop).result()
+
+    def KUKA_ReadVar(self, var, priority = PRIORITY_CONTROL):
+        return self.__call(self.handler.KUKA_ReadVar(var, priority))
+
+    def KUKA_ReadMany(self, vars, priority = PRIORITY_CONTROL, writes = None):
+        return self.__call(self.handler.KUKA_ReadMany(vars, priority, writes))
+
+    def KUKA_WriteVar(self, var, value, priority = PRIORITY_CONTROL):
+        return self.__call(self.handler.KUKA_WriteVar(var, value, priority))
+
+    def KUKA_WriteMany(self, values, priority = PRIORITY_CONTROL, wait = True):
+        return self.__call(self.handler.KUKA_WriteMany(values, priority, wait))
+
+    def KUKA_SyncClock(self, clock = None, probes = 8, priority = PRIORITY_CONTROL):
+        return self.__call(self.handler.KUKA_SyncClock(clock, probes, priority))
+
+    def KUKA_WaitFor(self, vars, predicate, timeout = None):
+        return self.__call(self.handler.KUKA_WaitFor(vars, predicate, timeout))
+
+class KUKA_AsyncDataReader (KUKA_DataReader):
+    """asyncio version of KUKA_DataReader. It runs the same collection steps
+    (see kuka.steps) in the event loop. Kuka Trace control, download and
+    parsing run in worker threads so that they never block the event loop.
+    """
+
+    def __init__(self, handler: KUKA_AsyncHandler, dosysvar: bool, dotrace: bool) -> None:
+        """Creates a new asyncio Data Reader
+
+        Args:
+            handler (KUKA_AsyncHandler): The C3 Bridge Connection handler
+            dosysvar (bool): Collect the system variables
+            dotrace (bool): Collect the Kuka Traces
+        """
+
+        super().__init__(handler.blocking, dosysvar, dotrace)
+        self.handler = handler
+
+    async def get_data (self) -> Tuple[np.ndarray, int, bool, int]:
+        """Collects the latest sample(s) made available by the Data collector sub, see KUKA_DataReader.get_data
+        """
+
+        return await run_async(self._get_data_steps(), self.handler)
+
+    async def read (self, time_before) -> Tuple[np.ndarray, int, float, bool, int]:
+        """Reads the available samples from the data collection sub, see KUKA_DataReader.read
+        """
+
+        samples, write, data_available, done = await self.get_data()
+        return samples, write, (time() - time_before) * 1000, data_available, done
+
+    async def reset (self):
+        """Resets the data collection sub
+        """
+
+        await run_async(self._reset_steps(), self.handler)
+
+    async def init (self, A_iter: List[str], speed: str, sampling: str):
+        """Prepares and starts data collection, see KUKA_DataReader.init
+        """
+
+        await run_async(self._init_steps(A_iter, speed, sampling), self.handler)
+
+    async def run_sysvar (
+            self,
+            next: Callable[[float, int, int], None] = None,
+            load: int = -1
+        ) -> pd.DataFrame:
+        """Runs data collection using system variables, see KUKA_DataReader.run_sysvar
+        """
+
+        return await run_async(self._sysvar_steps(next, load), self.handler)
+
+    async def run_sysvar_drain (
+            self,
+            next: Callable[[float, int, int], None] = None,
+            load: int = -1
+        ) -> pd.DataFrame:
+        """Runs data collection using system variables, reading the buffers
+        of the sub in bulk, see KUKA_DataReader.run_sysvar_drain
+        """
+
+        return await run_async(self._drain_steps(next, load), self.handler)
+
+    async def run_single_speed (self, A_iter, speed, sampling, next, barrier, load, now, trace_config, trace_sampling, temp_dir, trace_offset):
+        return await run_async(
+            self._run_steps(A_iter, speed, sampling, next, load, now, trace_config, trace_sampling, temp_dir, trace_offset),
+            self.handler, barrier
+        )
+
+    async def acquire (
+            self,
+            A_iter: List[str],
+            speed: str | int | slice,
+            sampling: str,
+            trace_config = "12_ms",
+            next: Callable[[float], None] = None,
+            load: int = -1,
+            barrier: asyncio.Barrier = None,
+            temp_dir: str = None
+        ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Collects a full dataset using both system variables and Kuka Traces
+
+        Args:
+            A_iter (List[str]): The number of iteration per axis
+            speed (str | int | slice): The speed (range) at which to run the iterations
+            sampling (str): The system variables sampling time
+            trace_config (str, optional): The trace configuration file name. Defaults to "12_ms".
+            next (Callable[[float], None], optional): A function used to update the user interface in order to show the current progress. Defaults to None.
+            load (int, optional): The dataset class. Defaults to -1.
+            barrier (asyncio.Barrier, optional): A barrier used to start the runs of multiple robots together. Defaults to None.
+            temp_dir (str, optional): The folder in which to store the files to process. Defaults to None.
+
+        Returns:
+            Tuple[pd.DataFrame, pd.DataFrame]: The system variables Dataframe and the Kuka Trace DataFrame
+        """
+
+        return await run_async(self._acquire_steps(A_iter, speed, sampling, trace_config, next, load, temp_dir), self.handler, barrier)
+
+class _Barrier:
+    """asyncio.Barrier for Python 3.10 : the tasks waiting are released
+    together when `parties` of them wait, and fail with BrokenBarrierError
+    once the barrier is aborted
+    """
+
+    def __init__(self, parties: int):
+        """Creates a barrier
+
+        Args:
+            parties (int): The number of tasks to wait for
+        """
+
+        self.parties = parties
+        self._cond = asyncio.Condition()
+        self._waiting = 0
+        self._cycle = 0
+        self._broken = False
+
+    async def wait (self) -> int:
+        """Waits for the other tasks
+
+        Raises:
+            BrokenBarrierError: The barrier was aborted
+
+        Returns:
+            int: The number of tasks which arrived before this one
+        """
+
+        async with self._cond:
+            if self._broken:
+                raise BrokenBarrierError
+            index = self._waiting
+            self._waiting += 1
+            if self._waiting == self.parties:
+                self._waiting = 0
+                self._cycle += 1
+                self._cond.notify_all()
+                return index
+
+            cycle = self._cycle
+            await self._cond.wait_for(lambda: self._cycle != cycle or self._broken)
+            if self._cycle == cycle:
+                raise BrokenBarrierError
+            return index
+
+    async def abort (self):
+        """Breaks the barrier, releasing the tasks waiting with an error
+        """
+
+        async with self._cond:
+            self._broken = True
+            self._cond.notify_all()
+
+# Barrier of the robots of `acquire_all`. asyncio.Barrier is only in Python 3.11 and later
+Barrier = getattr(asyncio, "Barrier", _Barrier)
+
+async def acquire_all (
+        readers: List[KUKA_AsyncDataReader],
+        A_iter: List[str],
+        speed: str | int | slice,
+        sampling: str,
+        trace_config = "12_ms",
+        nexts: List[Callable[[float, int, int], None]] = None,
+        loads: List[int] = None,
+        temp_dir: str = None
+    ) -> List[Tuple[pd.DataFrame, pd.DataFrame] | BaseException]:
+    """Runs the same acquisition on several robots from the current event
+    loop. The runs of all the robots start together.
+
+    Args:
+        readers (List[KUKA_AsyncDataReader]): The data reader of each robot
+        A_iter (List[str]): The number of iteration per axis
+        speed (str | int | slice): The speed (range) at which to run the iterations
+        sampling (str): The system variables sampling time
+        trace_config (str, optional): The trace configuration file name. Defaults to "12_ms".
+        nexts (List[Callable[[float, int, int], None]], optional): The progress callback of each robot. Defaults to None.
+        loads (List[int], optional): The dataset class of each robot. Defaults to -1 for all.
+        temp_dir (str, optional): The folder in which to store the files to process. Defaults to None.
+
+    Returns:
+        List[Tuple[pd.DataFrame, pd.DataFrame] | BaseException]: The result of each robot, or the exception that stopped it
+    """
+
+    nexts = nexts if nexts is not None else [ None ] * len(readers)
+    loads = loads if loads is not None else [ -1 ] * len(readers)
+    barrier = Barrier(len(readers))
+
+    async def run (reader: KUKA_AsyncDataReader, next, load):
+        try:
+            return await reader.acquire(A_iter, speed, sampling, trace_config, next, load, barrier, temp_dir)
+        except BaseException:
+            # Releasing the other robots waiting for this one
+            await barrier.abort()
+            raise
+
+    return await asyncio.gather(
+        *[ run(reader, next, load) for reader, next, load in zip(readers, nexts, loads) ],
+        return_exceptions=True
+    )
@@ -1,3 +1,4 @@
+from .decoder import decode_bool, decode_int, decode_real, decode_string
 from .handler import KUKA_Handler
 from typing import Any
 
@@ -22,6 +23,14 @@ class KUKA_Array:
         self.handler = handler
         self.name = name
 
+    # Decoders of the raw readings, per Python type
+    __DECODERS = {
+        bool: decode_bool,
+        int: decode_int,
+        float: decode_real,
+        str: decode_string,
+    }
+
     def __read_index (self, index: int):
         """Attempts to read the value at the specified index 
 
@@ -35,7 +44,9 @@ class KUKA_Array:
         v = self.handler.KUKA_ReadVar(f"{self.name}[{index}]")
         if v == b'' or v is None:
             return self.default
-        return self.type(v)
+        if isinstance(v, bool):
+            return self.type(v)
+        return self.__DECODERS.get(self.type, self.type)(v)
 
     def __getitem__(self, name: int | slice) -> Any:
         """Attempts to read the value(s) at the specified index(es)
@@ -69,7 +80,6 @@ class KUKA_Array:
             end = name.stop if name.stop is not None else self.len
             step = name.step if name.step is not None else 1
 
-            for i in range(start, end, step):
-                self.handler.KUKA_WriteVar(f"{self.name}[{i}]", value)
+            self.handler.KUKA_WriteMany({ f"{self.name}[{i}]": value for i in range(start, end, step) })
         else:    
             self.handler.KUKA_WriteVar(f"{self.name}[{name}]", value)
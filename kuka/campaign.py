@@ -0,0 +1,123 @@
+'''
+Pipelined download of the Kuka Traces of a campaign.
+
+Once the robot has stopped moving and the trace has been written by the
+controller, the robot can start its next run : copying the trace files,
+parsing them and exporting the result are left to background workers. The
+runs waiting for a worker are held in a bounded queue, so that a slow
+network share holds the robot back instead of piling traces up in memory.
+The exported traces are not kept in memory unless asked for, and a failed
+run does not discard the traces of the others.
+'''
+
+import traceback
+from queue import Queue
+from threading import Lock, Thread
+from typing import Callable, Dict, List
+
+import pandas as pd
+
+class TracePipeline:
+    """Downloads and parses the Kuka Traces of the finished runs on
+    background threads, while the robot goes on with the next runs
+    """
+
+    def __init__(
+            self,
+            download: Callable[..., pd.DataFrame],
+            workers: int = 1,
+            depth: int = 2,
+            export: Callable[[pd.DataFrame, int], None] = None,
+            keep: bool = None
+        ):
+        """Creates a pipeline, its workers starting with the first run
+
+        Args:
+            download (Callable[..., pd.DataFrame]): Downloads and parses the trace of a run, given the arguments of `submit`
+            workers (int, optional): The number of runs processed at the same time. Defaults to 1.
+            depth (int, optional): The number of runs waiting for a worker beyond which `submit` blocks. Defaults to 2.
+            export (Callable[[pd.DataFrame, int], None], optional): Called by the worker with the trace of
+            each run and the index of the run, once parsed. Defaults to None.
+            keep (bool, optional): Keeps the traces in memory until `results`. Defaults to None (only without `export`).
+        """
+
+        self.download = download
+        self.workers = max(1, workers)
+        self.export = export
+        self.keep = export is None if keep is None else keep
+
+        self._queue = Queue(max(1, depth))
+        self._threads: List[Thread] = []
+        self._lock = Lock()
+        self.begin()
+
+    def begin (self):
+        """Forgets the traces of the previous campaign
+        """
+
+        self._results: Dict[int, pd.DataFrame] = {}
+        self._errors: Dict[int, BaseException] = {}
+        self._runs = 0
+
+    def submit (self, *args):
+        """Queues the trace of a run. Blocks while `depth` runs are already waiting.
+
+        Args:
+            args: The arguments of `download`
+        """
+
+        if not self._threads:
+            for _ in range(self.workers):
+                thread = Thread(target=self._work, daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+        self._queue.put((self._runs, args))
+        self._runs += 1
+
+    def _work (self):
+        """Processes the queued runs
+        """
+
+        while True:
+            index, args = self._queue.get()
+            try:
+                data = self.download(*args)
+                if self.export is not None:
+                    self.export(data, index)
+                if self.keep:
+                    with self._lock:
+                        self._results[index] = data
+            except Exception as e:
+                traceback.print_exception(e)
+                with self._lock:
+                    self._errors[index] = e
+            finally:
+                self._queue.task_done()
+
+    @property
+    def pending (self) -> int:
+        """The number of runs not processed yet
+        """
+
+        return self._queue.unfinished_tasks
+
+    @property
+    def errors (self) -> Dict[int, BaseException]:
+        """The error of each failed run, by index
+        """
+
+        return dict(self._errors)
+
+    def results (self) -> List[pd.DataFrame | None]:
+        """Waits for every queued run
+
+        Returns:
+            List[pd.DataFrame | None]: The traces of the runs, in the order of `submit`. None for
+            the failed runs, and for all the runs if the traces are not kept
+        """
+
+        self._queue.join()
+        for index, error in sorted(self._errors.items()):
+            print(f"Kuka Trace of run {index} failed : {error!r}")
+        return [ self._results.get(i) for i in range(self._runs) ]
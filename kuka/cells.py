@@ -0,0 +1,219 @@
+'''
+Registry of the robot cells.
+
+The cells are listed in a JSON file, `cells.json` in the working directory by
+default. Each cell gives its number and address, and can override the
+defaults shared by all of them :
+
+    {
+        "defaults": { "port": 7000, "pool_size": 2 },
+        "cells": [
+            { "cell": 1, "address": "192.168.1.151" },
+            { "cell": 4, "address": "10.0.0.4", "name": "Press line", "load": 0,
+              "trace_share": "\\\\\\\\10.0.0.4\\\\roboter\\\\TRACE\\\\" }
+        ]
+    }
+
+Without a file, the registry holds the three cells of the lab, 192.168.1.151
+to 192.168.1.153.
+'''
+
+import json
+import os
+from typing import Dict, Iterator, List
+
+from .handler import KUKA_Handler
+
+# File read by default
+REGISTRY_FILE = "cells.json"
+
+# Settings of a cell which does not set them, and of the registry file
+DEFAULTS = {
+    "port": 7000,
+    "pool_size": 2,
+    "trace_share": None,
+    "load": -1,
+}
+
+class Cell:
+    """A robot controller and its settings
+    """
+
+    def __init__(
+            self,
+            cell: int,
+            address: str,
+            port: int = 7000,
+            name: str = None,
+            trace_share: str = None,
+            pool_size: int = 2,
+            load: int = -1
+        ):
+        """Describes a cell
+
+        Args:
+            cell (int): The number of the cell, used in the file names
+            address (str): The IP of the controller
+            port (int, optional): The C3 Bridge port. Defaults to 7000.
+            name (str, optional): The name shown to the user. Defaults to None ("Robot <cell>").
+            trace_share (str, optional): The folder of the Kuka Traces on the controller. Defaults to None (\\\\<address>\\roboter\\TRACE\\).
+            pool_size (int, optional): The number of C3 Bridge connections. Defaults to 2.
+            load (int, optional): The class of the samples when it is not chosen in the GUI. Defaults to -1.
+        """
+
+        self.number = int(cell)
+        self.address = address
+        self.port = int(port)
+        self.name = name if name is not None else f"Robot {self.number}"
+        self.trace_share = trace_share
+        self.pool_size = int(pool_size)
+        self.load = int(load)
+
+    def __repr__ (self) -> str:
+        return f"Cell({self.number}, {self.address}:{self.port})"
+
+    def handler (self) -> KUKA_Handler:
+        """Creates a handler for this cell, not connected yet
+
+        Returns:
+            KUKA_Handler: The handler
+        """
+
+        return KUKA_Handler(self.address, self.port, self.pool_size, self.number, self.trace_share)
+
+    def to_dict (self) -> Dict[str, object]:
+        """Gives the settings of the cell, as written in the registry file
+        """
+
+        return {
+            "cell": self.number, "address": self.address, "port": self.port, "name": self.name,
+            "trace_share": self.trace_share, "pool_size": self.pool_size, "load": self.load,
+        }
+
+class CellRegistry:
+    """The cells which can be collected
+    """
+
+    def __init__(self, cells: List[Cell], path: str = None):
+        """Creates a registry
+
+        Args:
+            cells (List[Cell]): The cells, in the order they are shown
+            path (str, optional): The file the registry was read from. Defaults to None.
+
+        Raises:
+            ValueError: Two cells have the same number
+        """
+
+        numbers = [ cell.number for cell in cells ]
+        duplicates = sorted(set(n for n in numbers if numbers.count(n) > 1))
+        if duplicates:
+            raise ValueError(f"Duplicate cells : {', '.join(map(str, duplicates))}")
+
+        self.cells = list(cells)
+        self.path = path
+
+    @classmethod
+    def default (cls) -> "CellRegistry":
+        """The three cells of the lab
+        """
+
+        return cls([ Cell(i, f"192.168.1.15{i}") for i in range(1, 4) ])
+
+    @classmethod
+    def load (cls, path: str = None) -> "CellRegistry":
+        """Reads a registry file
+
+        Args:
+            path (str, optional): The file. Defaults to None (REGISTRY_FILE, or the default cells if it does not exist).
+
+        Raises:
+            ValueError: The file is invalid
+
+        Returns:
+            CellRegistry: The registry
+        """
+
+        if path is None:
+            if not os.path.exists(REGISTRY_FILE):
+                return cls.default()
+            path = REGISTRY_FILE
+
+        with open(path, "r") as file:
+            config = json.load(file)
+
+        defaults = { **DEFAULTS, **config.get("defaults", {}) }
+        cells = []
+        for entry in config.get("cells", []):
+            if "cell" not in entry or "address" not in entry:
+                raise ValueError(f"{path} : each cell needs a cell number and an address")
+            settings = { **defaults, **entry }
+            try:
+                cells.append(Cell(**settings))
+            except TypeError as e:
+                raise ValueError(f"{path} : invalid cell {entry['cell']} : {e}")
+
+        if not cells:
+            raise ValueError(f"{path} : no cell")
+        return cls(cells, path)
+
+    def save (self, path: str = None):
+        """Writes the registry to a file
+
+        Args:
+            path (str, optional): The file. Defaults to None (the file it was read from, or REGISTRY_FILE).
+        """
+
+        path = path or self.path or REGISTRY_FILE
+        with open(path, "w") as file:
+            json.dump({ "cells": [ cell.to_dict() for cell in self.cells ] }, file, indent=4)
+        self.path = path
+
+    def __len__ (self) -> int:
+        return len(self.cells)
+
+    def __iter__ (self) -> Iterator[Cell]:
+        return iter(self.cells)
+
+    def __getitem__ (self, index: int) -> Cell:
+        return self.cells[index]
+
+    @property
+    def numbers (self) -> List[int]:
+        """The numbers of the cells
+        """
+
+        return [ cell.number for cell in self.cells ]
+
+    def index (self, number: int) -> int:
+        """Gives the position of a cell
+
+        Args:
+            number (int): The number of the cell
+
+        Raises:
+            KeyError: There is no such cell
+
+        Returns:
+            int: Its position in the registry
+        """
+
+        for i, cell in enumerate(self.cells):
+            if cell.number == number:
+                return i
+        raise KeyError(f"Unknown cell : {number}")
+
+    def get (self, number: int) -> Cell:
+        """Gives a cell
+
+        Args:
+            number (int): The number of the cell
+
+        Raises:
+            KeyError: There is no such cell
+
+        Returns:
+            Cell: The cell
+        """
+
+        return self.cells[self.index(number)]
@@ -0,0 +1,129 @@
+'''
+Channels sampled by the Data collector sub.
+
+Each bit of ColCHANNELS selects one value measured on all six axes. The sub
+only samples and publishes the selected ones : a sample is laid out as its
+time, the selected values of A1, then of A2 ... A6, the analog output and its
+index in the sub buffer.
+'''
+
+from typing import List, Tuple
+
+# Bits of ColCHANNELS
+CHANNEL_POSITION_COMMAND = 1
+CHANNEL_POSITION = 2
+CHANNEL_TORQUE = 4
+CHANNEL_CURRENT = 8
+CHANNEL_TEMPERATURE = 16
+CHANNELS_ALL = 31
+
+# Per-axis values, in their order in a sample : bit, column name and sub buffer.
+# The buffers of the positions hold whole E6AXIS structures
+CHANNELS = (
+    (CHANNEL_POSITION_COMMAND, "Position_Command", "ColBUFFER_POS_ACT"),
+    (CHANNEL_POSITION, "Position", "ColBUFFER_POS_MEAS"),
+    (CHANNEL_TORQUE, "Torque", "ColBUFFER_TQ"),
+    (CHANNEL_CURRENT, "Current", "ColBUFFER_CURR"),
+    (CHANNEL_TEMPERATURE, "Temperature", "ColBUFFER_TEMP"),
+)
+_AXIS_BUFFERS = (CHANNEL_POSITION_COMMAND, CHANNEL_POSITION)
+
+# Values of __TAB_BLOCK available for the samples, after its header
+BLOCK_VALUES = 528
+
+class ChannelSet:
+    """A selection of channels and the matching sample layout
+    """
+
+    def __init__(self, mask: int = CHANNELS_ALL):
+        """Creates a selection
+
+        Args:
+            mask (int, optional): The ColCHANNELS bits. Defaults to CHANNELS_ALL.
+
+        Raises:
+            ValueError: No channel or an unknown channel is selected
+        """
+
+        if mask <= 0 or mask & ~CHANNELS_ALL:
+            raise ValueError(f"Invalid channel mask : {mask}")
+
+        self.mask = mask
+        self.names: Tuple[str, ...] = tuple(name for bit, name, _ in CHANNELS if mask & bit)
+
+        # Indexes of the values in a sample
+        self.width = 6 * len(self.names)
+        self.motor = 1 + self.width
+        self.read = 2 + self.width
+        self.sample_len = 3 + self.width
+
+        # Most samples sent by the sub in one block, 16 with all the channels
+        self.block_samples = BLOCK_VALUES // self.sample_len
+
+    @classmethod
+    def of (cls, *names: str) -> "ChannelSet":
+        """Creates a selection from channel names
+
+        Args:
+            names (str): The names, like "Torque" or "Current"
+
+        Raises:
+            ValueError: A name is unknown
+
+        Returns:
+            ChannelSet: The selection
+        """
+
+        bits = { name: bit for bit, name, _ in CHANNELS }
+        unknown = [ name for name in names if name not in bits ]
+        if unknown:
+            raise ValueError(f"Unknown channels : {', '.join(unknown)}")
+        return cls(sum(set(bits[name] for name in names)))
+
+    def __eq__ (self, other) -> bool:
+        return isinstance(other, ChannelSet) and other.mask == self.mask
+
+    def __repr__ (self) -> str:
+        return f"ChannelSet({', '.join(self.names)})"
+
+    @property
+    def data_columns (self) -> List[str]:
+        """The columns of the per-axis values, in their order in a sample
+        """
+
+        return [ f"{name}_A{axis}" for axis in range(1, 7) for name in self.names ]
+
+    @property
+    def columns (self) -> List[str]:
+        """The columns of the collected DataFrames
+        """
+
+        return [
+            "Sample_time", "Host_time",
+            *self.data_columns,
+            *[ f"A{axis}" for axis in range(1, 7) ],
+            "Queue_Read", "Queue_Write", "Load", "Faulty", "Speed", "Read_time", "Gap",
+        ]
+
+    @property
+    def axis_buffers (self) -> List[str]:
+        """The selected buffers holding E6AXIS structures
+        """
+
+        return [ buffer for bit, _, buffer in CHANNELS if self.mask & bit and bit in _AXIS_BUFFERS ]
+
+    @property
+    def value_buffers (self) -> List[str]:
+        """The selected per-axis buffers holding REAL values, axis by axis
+        """
+
+        names = [ buffer for bit, _, buffer in CHANNELS if self.mask & bit and bit not in _AXIS_BUFFERS ]
+        return [ f"{buffer}_A{axis}" for axis in range(1, 7) for buffer in names ]
+
+    @property
+    def buffers (self) -> List[str]:
+        """The buffers holding a sample, read by the bulk drain : time, axis
+        structures, per-axis values and analog output
+        """
+
+        return [ "ColBUFFER_TIME", *self.axis_buffers, *self.value_buffers, "ColBUFFER_ANALOG" ]
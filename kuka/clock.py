@@ -0,0 +1,112 @@
+'''
+Alignment of the robot clock on the host clock.
+
+The Data collector sub timestamps its samples with $TIMER[1], in ms since it
+was reset for the run. As in NTP, $TIMER[1] is read several times between two
+readings of the host clock : its value is taken at the middle of the round
+trip, and the reading with the shortest round trip gives the offset, within
+half of that round trip. Synchronising again at the end of a run gives the
+drift of the robot clock.
+'''
+
+from time import perf_counter, time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+class ClockSync:
+    """Maps $TIMER[1] of a robot to host epoch time, from bracketed readings
+    """
+
+    def __init__(self):
+        """Creates a mapping with no synchronisation yet
+        """
+
+        # Host epoch time of perf_counter() = 0 : the readings are timed
+        # with perf_counter, which is monotonic and precise
+        self._epoch = time() - perf_counter()
+        self.reset()
+
+    def reset (self):
+        """Forgets the synchronisations, when $TIMER[1] is reset
+        """
+
+        # Robot time and host time (s) of the best reading of each synchronisation, and its round trip
+        self.points: List[Tuple[float, float, float]] = []
+
+        # Host epoch time of $TIMER[1] = 0, in seconds, and relative rate
+        # error of the robot clock, positive when it runs fast
+        self.offset = None
+        self.drift = 0.0
+
+    @property
+    def synced (self) -> bool:
+        """At least one synchronisation succeeded
+        """
+
+        return self.offset is not None
+
+    def host_time (self) -> float:
+        """The current host epoch time, in seconds
+        """
+
+        return self._epoch + perf_counter()
+
+    def add (self, readings: List[Tuple[float, float, float]]) -> bool:
+        """Adds a synchronisation
+
+        Args:
+            readings (List[Tuple[float, float, float]]): For each reading of $TIMER[1], the
+            perf_counter() before sending it, its value in ms and the perf_counter() after receiving it
+
+        Returns:
+            bool: There was a valid reading
+        """
+
+        if not readings:
+            return False
+
+        sent, timer, received = min(readings, key=lambda r: r[2] - r[0])
+        host = self._epoch + (sent + received) / 2
+        self.points.append((timer / 1000, host, received - sent))
+
+        robot = np.array([ p[0] for p in self.points ])
+        hosts = np.array([ p[1] for p in self.points ])
+        if len(self.points) > 1 and np.ptp(robot) > 0:
+            # host = offset + robot / (1 + drift), by least squares
+            slope, offset = np.polyfit(robot, hosts, 1)
+            self.offset = float(offset)
+            self.drift = 1 / float(slope) - 1
+        else:
+            self.offset = float(np.mean(hosts - robot))
+        return True
+
+    def to_host (self, timer: np.ndarray) -> np.ndarray:
+        """Converts robot times to host epoch times
+
+        Args:
+            timer (np.ndarray): The $TIMER[1] values, in ms
+
+        Returns:
+            np.ndarray: The host epoch times, in seconds. NaN before any synchronisation
+        """
+
+        timer = np.asarray(timer, np.float64)
+        if not self.synced:
+            return np.full(timer.shape, np.nan)
+        return self.offset + timer / 1000 / (1 + self.drift)
+
+    def summary (self) -> Dict[str, object]:
+        """Gives the current estimate
+
+        Returns:
+            Dict[str, object]: The offset (host epoch time of $TIMER[1] = 0, in s), the drift
+            (in ppm), the uncertainty (half of the best round trip, in ms) and the number of synchronisations
+        """
+
+        return {
+            "offset": self.offset,
+            "drift_ppm": self.drift * 1e6,
+            "uncertainty_ms": min((p[2] for p in self.points), default=np.nan) / 2 * 1000,
+            "syncs": len(self.points),
+        }
@@ -0,0 +1,203 @@
+'''
+Headless collection runner.
+
+Runs a collection without the GUI, with the settings of the collection
+settings frame, for unattended campaigns and scripts :
+
+    python -m kuka.collect --cells 1 2 --iterations 2 --speed 30 60 --step 10 --sysvar --load 0 2
+
+The cells are read from the cell registry (see kuka.cells). Each cell is collected by `KUKA_DataReader.acquire`, in its own process
+(or thread with `--threads`), and its runs start together with the other
+cells. The files are named as by the measurement windows. The exit code is 0
+when every cell stored its files.
+'''
+
+import argparse
+import os
+import sys
+from datetime import datetime
+from threading import Thread
+from time import sleep
+from typing import List
+
+import dateutil.tz
+
+from .cells import Cell, CellRegistry
+from .process import STATE_COLLECTING, STATE_STORED, KUKA_CollectorProcess, RunBarrier, SampleFeed, _collect
+
+TZ = dateutil.tz.gettz("Europe/Prague")
+
+# Sampling rates of the system variables, in ms
+SAMPLINGS = ("12", "24", "36", "48", "60")
+
+def parse_args (argv: List[str] = None) -> argparse.Namespace:
+    """Reads the settings of the collection
+
+    Args:
+        argv (List[str], optional): The arguments. Defaults to None (sys.argv).
+
+    Returns:
+        argparse.Namespace: The settings
+    """
+
+    parser = argparse.ArgumentParser(prog="python -m kuka.collect", description="Collects the robots without the GUI")
+    parser.add_argument("--registry", default=None, help="The cell registry file. Defaults to cells.json, or the cells of the lab")
+    parser.add_argument("--cells", type=int, nargs="+", default=None, help="The numbers of the cells to collect. Defaults to all the registered cells")
+    parser.add_argument("--iterations", type=int, nargs="+", default=[1], help="The number of iterations of A1 to A6, or of all the axes")
+    parser.add_argument("--speed", type=int, nargs="+", default=[30], help="The speed in %%, or the first and last speeds")
+    parser.add_argument("--step", type=int, default=10, help="The speed step between two runs, in %%")
+    parser.add_argument("--sampling", default="12", choices=SAMPLINGS, help="The system variables sampling rate, in ms")
+    parser.add_argument("--trace-config", default="12_ms_v2", help="The Kuka Trace configuration")
+    parser.add_argument("--sysvar", action="store_true", help="Collects the system variables")
+    parser.add_argument("--trace", action="store_true", help="Collects the Kuka Traces")
+    parser.add_argument("--load", type=int, nargs="+", default=None, help="The class of each cell, or of all the cells. Defaults to the class of each cell in the registry")
+    parser.add_argument("--path", default=os.path.join(os.getcwd(), "data"), help="The folder of the files")
+    parser.add_argument("--name", default=None, help="The name of the dataset. Defaults to the date")
+    parser.add_argument("--temp-dir", default=os.path.join(".", "temp"), help="The folder of the Kuka Trace files")
+    parser.add_argument("--threads", action="store_true", help="Collects the cells in threads instead of processes")
+    parser.add_argument("--progress", type=float, default=5.0, help="The period of the progress messages, in seconds. 0 disables them")
+
+    args = parser.parse_args(argv)
+
+    if not args.sysvar and not args.trace:
+        parser.error("no collection method selected, use --sysvar and/or --trace")
+    if len(args.iterations) not in (1, 6) or not all(99 >= i >= 0 for i in args.iterations):
+        parser.error("--iterations takes 1 or 6 values from 0 to 99")
+    if len(args.speed) not in (1, 2) or not all(100 >= s >= 1 for s in args.speed) or not 100 >= args.step >= 1:
+        parser.error("--speed takes 1 or 2 values and --step a value, from 1 to 100 %")
+
+    try:
+        args.registry = CellRegistry.load(args.registry)
+        numbers = args.cells if args.cells is not None else args.registry.numbers
+        args.cells = [ args.registry.get(number) for number in numbers ]
+    except (OSError, ValueError, KeyError) as e:
+        parser.error(str(e))
+
+    if args.load is not None and len(args.load) not in (1, len(args.cells)):
+        parser.error("--load takes 1 value or 1 per cell")
+
+    if args.name is None:
+        args.name = datetime.now(tz=TZ).strftime("[%Y-%m-%d] %Hh%M data")
+    return args
+
+def speed_setting (args: argparse.Namespace) -> str | slice:
+    """Gives the speed as given to `KUKA_DataReader.acquire`
+
+    Returns:
+        str | slice: The constant speed, or the speed range
+    """
+
+    if len(args.speed) == 1:
+        return str(args.speed[0])
+    return slice(args.speed[0], args.speed[1], args.step)
+
+def iterations (args: argparse.Namespace) -> List[str]:
+    """Gives the number of iterations of each axis
+    """
+
+    return [ str(i) for i in (args.iterations * 6 if len(args.iterations) == 1 else args.iterations) ]
+
+def file_names (args: argparse.Namespace, cell: Cell, load: int) -> List[str]:
+    """Names the files of a cell as the measurement windows do
+
+    Returns:
+        List[str]: The system variables and Kuka Trace file names, without extension
+    """
+
+    speed = speed_setting(args)
+    speed = speed if type(speed) != slice else f"{speed.start}%-{speed.stop}"
+    iter = " ".join(str(i) for i in iterations(args))
+    trace_sampling = "".join(args.trace_config.split("_")[:2])
+
+    prefix = os.path.join(args.path, args.name)
+    settings = f"[{speed}%] [{args.sampling}ms] [class {load}] [{iter}]"
+    trace_settings = f"[{speed}%] [{trace_sampling}] [class {load}] [{iter}]"
+    return [ f"{prefix} {settings} - {cell.name}", f"{prefix} {trace_settings} - {cell.name}" ]
+
+def main (argv: List[str] = None) -> int:
+    """Runs a collection
+
+    Args:
+        argv (List[str], optional): The arguments. Defaults to None (sys.argv).
+
+    Returns:
+        int: The exit code, 0 if every cell stored its files
+    """
+
+    args = parse_args(argv)
+    if not os.path.exists(args.path):
+        os.mkdir(args.path)
+
+    if args.load is None:
+        loads = [ cell.load for cell in args.cells ]
+    else:
+        loads = args.load * len(args.cells) if len(args.load) == 1 else args.load
+    barrier = RunBarrier(len(args.cells))
+    feeds: List[SampleFeed] = []
+    collectors = []
+
+    for cell, load in zip(args.cells, loads):
+        file_name, trace_file_name = file_names(args, cell, load)
+        stream_path = file_name + ".csv" if args.sysvar else None
+        outputs = (file_name + ".xlsx", trace_file_name + "_TRACE.xlsx")
+        settings = {
+            "A_iter": iterations(args), "speed": speed_setting(args), "sampling": args.sampling,
+            "trace_config": args.trace_config, "load": load, "temp_dir": args.temp_dir,
+        }
+        print(f"Starting data collection for {cell.name} ({cell.address}) in {file_name}")
+
+        if args.threads:
+            feed = SampleFeed()
+            collector = Thread(
+                target=_collect,
+                args=[ cell, feed.name, barrier, args.sysvar, args.trace, settings, stream_path, outputs ],
+                daemon=True
+            )
+            collector.start()
+        else:
+            collector = KUKA_CollectorProcess(cell, args.sysvar, args.trace)
+            collector.start(**settings, barrier=barrier, stream_path=stream_path, outputs=outputs)
+            feed = collector.feed
+        feeds.append(feed)
+        collectors.append(collector)
+
+    barrier.start()
+
+    # Waiting for the cells, reporting their progress
+    try:
+        waited = 0.0
+        while any(c.is_alive() if args.threads else c.alive for c in collectors):
+            sleep(0.1)
+            waited += 0.1
+            if args.progress > 0 and waited >= args.progress:
+                waited = 0.0
+                for cell, feed in zip(args.cells, feeds):
+                    if feed.state == STATE_COLLECTING:
+                        print(f"{cell.name} : {feed.runs} runs done, {feed.count} samples, {feed.lost} lost")
+    except KeyboardInterrupt:
+        print("Collection aborted")
+        if not args.threads:
+            for c in collectors:
+                c.terminate()
+        if args.sysvar:
+            print(f"The samples collected can be recovered from the .csv files in {args.path}")
+        return 1
+
+    stored = [ feed.state == STATE_STORED for feed in feeds ]
+    for cell, feed, ok in zip(args.cells, feeds, stored):
+        print(f"{cell.name} : {'stored' if ok else 'failed'}, {feed.runs} runs, {feed.count} samples, {feed.lost} lost")
+
+    skews = barrier.summary()
+    if skews["runs"] > 0:
+        print(f"Runs started within {skews['max_skew_ms']:.1f} ms of each other (mean {skews['mean_skew_ms']:.1f} ms over {skews['runs']} runs)")
+
+    for c, feed in zip(collectors, feeds):
+        if args.threads:
+            feed.unlink()
+        else:
+            c.close()
+
+    return 0 if all(stored) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+'''
+Typed decoding of the values returned by the C3 Bridge.
+
+The C3 Bridge answers with the KRL text representation of a variable :
+`TRUE`, `42`, `1.5`, `#T_WAIT`, `"name"`, `{E6AXIS: A1 0.0, A2 -90.0, ...}`
+or, for a whole array, its elements separated by spaces.
+'''
+
+import re
+import numpy as np
+from typing import Any, Dict, Tuple
+
+# Field order of the KRL axis structures
+AXIS_FIELDS = tuple(f"A{i}" for i in range(1, 7))
+E6AXIS_FIELDS = AXIS_FIELDS + tuple(f"E{i}" for i in range(1, 7))
+
+_INT = re.compile(rb'^[+-]?\d+$')
+
+def _is_empty(raw: bytes | None) -> bool:
+    return raw is None or len(raw) == 0
+
+def decode_bool(raw: bytes | None) -> bool | None:
+    """Decodes a KRL BOOL
+
+    Args:
+        raw (bytes | None): The raw value
+
+    Returns:
+        bool | None: The value, None if nothing was read
+    """
+
+    if _is_empty(raw):
+        return None
+    return raw.strip().upper() == b'TRUE'
+
+def decode_int(raw: bytes | None) -> int | None:
+    """Decodes a KRL INT
+
+    Args:
+        raw (bytes | None): The raw value
+
+    Returns:
+        int | None: The value, None if nothing was read
+    """
+
+    if _is_empty(raw):
+        return None
+    return int(raw)
+
+def decode_real(raw: bytes | None) -> float | None:
+    """Decodes a KRL REAL
+
+    Args:
+        raw (bytes | None): The raw value
+
+    Returns:
+        float | None: The value, None if nothing was read
+    """
+
+    if _is_empty(raw):
+        return None
+    return float(raw)
+
+def decode_enum(raw: bytes | None) -> str | None:
+    """Decodes a KRL ENUM, keeping its leading `#` as used when writing it
+
+    Args:
+        raw (bytes | None): The raw value, like b'#T_WAIT'
+
+    Returns:
+        str | None: The value, like '#T_WAIT', None if nothing was read
+    """
+
+    if _is_empty(raw):
+        return None
+    return bytes(raw).strip().decode()
+
+def decode_string(raw: bytes | None) -> str | None:
+    """Decodes a KRL CHAR array
+
+    Args:
+        raw (bytes | None): The raw value, with or without quotes
+
+    Returns:
+        str | None: The value, None if nothing was read
+    """
+
+    if _is_empty(raw):
+        return None
+    return bytes(raw).strip().strip(b'"').decode()
+
+def decode_array(raw: bytes | None, dtype = np.float64) -> np.ndarray:
+    """Decodes a whole KRL REAL or INT array in a single pass
+
+    Args:
+        raw (bytes | None): The raw value, the elements separated by spaces
+        dtype (optional): The type of the elements. Defaults to np.float64.
+
+    Raises:
+        ValueError: An element is not a number
+
+    Returns:
+        np.ndarray: The elements, empty if nothing was read
+    """
+
+    if _is_empty(raw):
+        return np.empty(0, dtype)
+    return np.fromstring(bytes(raw), dtype=dtype, sep=' ')
+
+def _struct_fields(raw: bytes | None) -> Tuple[bytes | None, Dict[bytes, bytes]]:
+    """Splits a KRL structure literal into its type and raw fields
+    """
+
+    value = b'' if _is_empty(raw) else bytes(raw).strip()
+    if not (value.startswith(b'{') and value.endswith(b'}')):
+        raise ValueError(f"Not a KRL structure : {raw!r}")
+
+    kind, sep, body = value[1:-1].partition(b':')
+    if not sep:
+        kind, body = None, kind
+
+    fields = {}
+    for field in body.split(b','):
+        name, _, field_value = field.strip().partition(b' ')
+        if name:
+            fields[name] = field_value
+    return (kind.strip() if kind is not None else None), fields
+
+def decode_struct(raw: bytes | None) -> Tuple[str | None, Dict[str, Any]]:
+    """Decodes a KRL structure literal, its fields decoded with `decode`
+
+    Args:
+        raw (bytes | None): The raw value, like b'{E6AXIS: A1 0.0, A2 -90.0}'
+
+    Raises:
+        ValueError: The value is not a structure
+
+    Returns:
+        Tuple[str | None, Dict[str, Any]]: The structure type, if given, and its fields
+    """
+
+    kind, fields = _struct_fields(raw)
+    return (
+        kind.decode() if kind is not None else None,
+        { name.decode(): decode(value) for name, value in fields.items() }
+    )
+
+def decode_axis(raw: bytes | None, fields: Tuple[str, ...] = E6AXIS_FIELDS) -> np.ndarray:
+    """Decodes an AXIS, E6AXIS or E6POS-like structure into an array of its
+    numeric fields
+
+    Args:
+        raw (bytes | None): The raw value
+        fields (Tuple[str, ...], optional): The fields to extract, in this order. Defaults to E6AXIS_FIELDS.
+
+    Raises:
+        ValueError: The value is not a structure
+
+    Returns:
+        np.ndarray: The fields, NaN for the ones missing from the structure
+    """
+
+    _, values = _struct_fields(raw)
+    return np.array([ float(values.get(name.encode(), b'nan')) for name in fields ], dtype=np.float64)
+
+def decode(raw: bytes | None) -> Any:
+    """Decodes a value of unknown type, guessing it from its representation
+
+    Args:
+        raw (bytes | None): The raw value
+
+    Returns:
+        Any: None if nothing was read, a bool, an int, a float, a str for enums
+        and strings, a (type, fields) tuple for structures, or a np.ndarray for arrays
+    """
+
+    if _is_empty(raw):
+        return None
+
+    value = bytes(raw).strip()
+    if value in (b'TRUE', b'FALSE'):
+        return value == b'TRUE'
+    if value.startswith(b'#'):
+        return decode_enum(value)
+    if value.startswith(b'"'):
+        return decode_string(value)
+    if value.startswith(b'{'):
+        return decode_struct(value)
+    if b' ' in value:
+        return decode_array(value)
+    if _INT.match(value):
+        return int(value)
+    try:
+        return float(value)
+    except ValueError:
+        return value.decode(errors='replace')
@@ -1,16 +1,27 @@
-from .kukavarproxy import openshowvar
+from time import perf_counter
+
+from .clock import ClockSync
+from .pool import KUKA_ConnectionPool, PRIORITY_CONTROL
+from .stats import summarize
+from .watcher import KUKA_Watcher
 
 class KUKA_Handler:
-    def __init__(self, ipAddress, port):
+    def __init__(self, ipAddress, port, pool_size = 2, cell = None, trace_share = None):
         self.connected = False
         self.ipAddress = ipAddress
         self.port = port
-        self.client = None
+        self.pool_size = pool_size
+
+        # Number of the cell and folder of its Kuka Traces, see kuka.cells
+        self.cell = cell
+        self.trace_share = trace_share
+        self.pool = None
+        self.watcher = KUKA_Watcher(self)
 
     def KUKA_Open(self):
         if self.connected == False:
-            self.client = openshowvar(self.ipAddress, self.port)
-            res = self.client.can_connect
+            self.pool = KUKA_ConnectionPool(self.ipAddress, self.port, self.pool_size)
+            res = self.pool.can_connect
 
             if res == True:
                 print('Connection is established!')
@@ -23,28 +34,139 @@ class KUKA_Handler:
         else:
             print('Connection is ready!')
 
-    def KUKA_ReadVar(self, var):
+    def lease(self, priority = PRIORITY_CONTROL):
+        """Gives exclusive access to one of the connections, to chain several
+        requests without being interleaved with other threads
+
+        Args:
+            priority (int, optional): The priority of the caller. Defaults to PRIORITY_CONTROL.
+
+        Returns:
+            The context manager yielding the leased openshowvar
+        """
+        return self.pool.lease(priority)
+
+    def KUKA_ReadVar(self, var, priority = PRIORITY_CONTROL):
         if self.connected:
-            res = self.client.read(var, debug=False)
-            if res == b'TRUE':
-                return True
-            elif res == b'FALSE':
-                return False
-            else:
-                return res
+            with self.pool.lease(priority) as client:
+                return self._convert(client.read(var, debug=False))
         else:
             return False
 
-    def KUKA_WriteVar(self, var, value):
+    def KUKA_ReadMany(self, vars, priority = PRIORITY_CONTROL, writes = None):
+        """Reads several variables in a single round trip
+
+        Args:
+            vars (List[str]): The variables to read
+            priority (int, optional): The priority of the caller. Defaults to PRIORITY_CONTROL.
+            writes (Dict[str, Any], optional): Variables to assign first in the same burst, without waiting for their responses. Defaults to None.
+
+        Returns:
+            List: The read values, in the order of `vars`
+        """
+        if self.connected:
+            writes = [ (var, str(value)) for var, value in (writes or {}).items() ]
+            with self.pool.lease(priority) as client:
+                return [ self._convert(res) for res in client.read_many(vars, writes=writes) ]
+        else:
+            return [ False ] * len(vars)
+
+    @staticmethod
+    def _convert(res):
+        if res == b'TRUE':
+            return True
+        elif res == b'FALSE':
+            return False
+        else:
+            return res
+
+    def KUKA_WriteVar(self, var, value, priority = PRIORITY_CONTROL):
         if self.connected:
-            self.client.write(var, str(value))
+            with self.pool.lease(priority) as client:
+                client.write(var, str(value))
             return True
         else:
             return False
 
+    def KUKA_WriteMany(self, values, priority = PRIORITY_CONTROL, wait = True):
+        """Assigns values to several variables in a single round trip
+
+        Args:
+            values (Dict[str, Any]): The variables to write and their values, written in this order
+            priority (int, optional): The priority of the caller. Defaults to PRIORITY_CONTROL.
+            wait (bool, optional): Waits for the acknowledgements of the robot. Defaults to True.
+
+        Returns:
+            bool: All the values have been written, or sent if not waiting
+        """
+        if self.connected:
+            with self.pool.lease(priority) as client:
+                return all(client.write_many([ (var, str(value)) for var, value in values.items() ], wait=wait))
+        else:
+            return False
+
+    def KUKA_SyncClock(self, clock = None, probes = 8, priority = PRIORITY_CONTROL):
+        """Reads $TIMER[1] between two readings of the host clock, several
+        times in a row, and adds the reading with the shortest round trip to
+        the clock mapping of the robot
+
+        Args:
+            clock (ClockSync, optional): The mapping to update. Defaults to None (a new one).
+            probes (int, optional): The number of readings. Defaults to 8.
+            priority (int, optional): The priority of the caller. Defaults to PRIORITY_CONTROL.
+
+        Returns:
+            ClockSync: The mapping
+        """
+        clock = clock if clock is not None else ClockSync()
+        if not self.connected:
+            return clock
+
+        readings = []
+        with self.pool.lease(priority) as client:
+            for _ in range(probes):
+                sent = perf_counter()
+                raw = client.read("$TIMER[1]", debug=False)
+                received = perf_counter()
+                try:
+                    readings.append((sent, float(raw), received))
+                except (TypeError, ValueError):
+                    pass
+        clock.add(readings)
+        return clock
+
+    def KUKA_WaitFor(self, vars, predicate, timeout = None):
+        """Waits until the values of variables match a predicate. The variables
+        are polled by the shared watcher, in one request for all the callers
+
+        Args:
+            vars (List[str]): The variables to watch
+            predicate (Callable[[list], bool]): Checks the values, given in the order of `vars`
+            timeout (float, optional): The longest time to wait, in seconds. Defaults to None (forever).
+
+        Returns:
+            bool: The predicate is true, False on timeout
+        """
+        return self.watcher.wait_for(vars, predicate, timeout)
+
+    def KUKA_Stats(self):
+        """Gives the statistics of the connections to the robot
+
+        Returns:
+            Dict: The connection pool statistics, and per request phase (send, wait,
+            parse, request) the count, mean, min, max and percentiles of the durations in seconds
+        """
+        if self.pool is None:
+            return {}
+        return {
+            "pool": self.pool.stats(),
+            "latency": summarize(client.timings for client in self.pool.clients),
+        }
+
     def KUKA_Close(self):
         if self.connected == True:
-            self.client.close()
+            self.watcher.close()
+            self.pool.close()
             self.connected = False
             return True
 
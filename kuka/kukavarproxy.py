@@ -8,32 +8,257 @@ Slightly modified by the BYR0034@VSB.CZ, and PIE0073@VSB.CZ
 import struct
 import random
 import socket
+from time import perf_counter, sleep
+from typing import Callable, Dict, List, Set, Tuple
+
+from .stats import PHASE_PARSE, PHASE_REQUEST, PHASE_SEND, PHASE_WAIT, new_timings
 
 __version__ = '1.1.8'
 ENCODING = 'UTF-8'
 
+# Response framing : msg_id, body_len, then body_len bytes of body
+_FRAME_HEADER = struct.Struct('!HH')
+# Request and response start : msg_id, body_len, flag, name or value length
+_MSG_HEADER = struct.Struct('!HHBH')
+# Written value length
+_VALUE_LEN = struct.Struct('!H')
+# Response body end : error code and success flag
+_RSP_TAIL_LEN = 3
+# Biggest response allowed by the 16 bits body length
+MAX_FRAME_LEN = _FRAME_HEADER.size + 0xFFFF
+
+def pack_read_req(msg_id: int, varname: bytes) -> bytes:
+    """Packs a read request to the C3 Bridge format
+
+    Args:
+        msg_id (int): The id of the request
+        varname (bytes): The encoded name of the variable
+
+    Returns:
+        bytes: The encoded data
+    """
+
+    var_name_len = len(varname)
+    flag = 0
+    req_len = var_name_len + 3
+
+    return _MSG_HEADER.pack(
+        msg_id,
+        req_len,
+        flag,
+        var_name_len
+        ) + varname
+
+def pack_write_req(msg_id: int, varname: bytes, value: bytes) -> bytes:
+    """Packs a write request to the C3 Bridge format
+
+    Args:
+        msg_id (int): The id of the request
+        varname (bytes): The encoded name of the variable
+        value (bytes): The encoded value to write
+
+    Returns:
+        bytes: The encoded data
+    """
+
+    var_name_len = len(varname)
+    flag = 1
+    value_len = len(value)
+    req_len = var_name_len + 3 + 2 + value_len
+
+    return _MSG_HEADER.pack(
+        msg_id,
+        req_len,
+        flag,
+        var_name_len
+        ) + varname + _VALUE_LEN.pack(value_len) + value
+
+def unpack_rsp(rsp: bytes | memoryview, debug=False) -> Tuple[int, bytes, bool]:
+    """Unpacks a raw response of the C3 Bridge. Only the value is copied
+    out of `rsp`.
+
+    Args:
+        rsp (bytes | memoryview): The raw response
+        debug (bool, optional): Prints the raw result to the terminal. Defaults to False.
+
+    Returns:
+        Tuple[int, bytes, bool]: The message id, the value and the success flag
+    """
+
+    _msg_id, body_len, flag, var_value_len = _MSG_HEADER.unpack_from(rsp)
+    var_value = bytes(rsp[_MSG_HEADER.size:len(rsp) - _RSP_TAIL_LEN])
+    isok = rsp[-1] == 1
+    if debug:
+        print('[DEBUG]', (_msg_id, body_len, flag, var_value_len, var_value, bytes(rsp[-_RSP_TAIL_LEN:])))
+    return _msg_id, var_value, isok
+
+def set_keepalive(sock: socket.socket):
+    """Sends small requests without delay and uses TCP keep-alive to detect
+    dead connections
+
+    Args:
+        sock (socket.socket): A connected or new TCP socket
+    """
+
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    if hasattr(socket, 'SIO_KEEPALIVE_VALS') and hasattr(sock, 'ioctl'):
+        # Windows : enabled, 5 s idle, 1 s between probes
+        sock.ioctl(socket.SIO_KEEPALIVE_VALS, (1, 5000, 1000))
+    else:
+        for option, value in (('TCP_KEEPIDLE', 5), ('TCP_KEEPINTVL', 1), ('TCP_KEEPCNT', 3)):
+            if hasattr(socket, option):
+                sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+
+class Burst(object):
+    """The requests of a burst, kept across the reconnections. A try only
+    sends the requests not done yet : the posted writes not sent whole, and
+    the other requests not answered. A write is thus never applied twice
+    because another request of its burst failed.
+    """
+
+    def __init__(self, posted: List[Tuple[bytes, bytes]] = (), waited: List[Tuple[bytes, bytes | None]] = ()):
+        """The requests of a burst
+
+        Args:
+            posted (List[Tuple[bytes, bytes]], optional): The encoded variables and values of the writes sent first, whose responses are not waited for. Defaults to ().
+            waited (List[Tuple[bytes, bytes | None]], optional): The encoded variables and values of the requests waited for, the value None for a read. Defaults to ().
+        """
+
+        self.requests = [ *posted, *waited ]
+        self.posted = len(posted)
+
+        # Indices of the posted writes sent whole
+        self.sent: Set[int] = set()
+        # Value and success flag of the answered requests, by index
+        self.responses: Dict[int, Tuple[bytes, bool]] = {}
+
+    def pack(self, next_id: Callable[[], int]) -> List[Tuple[int, int, bytes]]:
+        """Packs the requests not done yet, with new message ids
+
+        Args:
+            next_id (Callable[[], int]): Gives the next message id of the connection
+
+        Returns:
+            List[Tuple[int, int, bytes]]: The index, message id and packed bytes of each request
+        """
+
+        out = []
+        for index, (varname, value) in enumerate(self.requests):
+            if index in self.sent or index in self.responses:
+                continue
+            msg_id = next_id()
+            req = pack_read_req(msg_id, varname) if value is None else pack_write_req(msg_id, varname, value)
+            out.append((index, msg_id, req))
+        return out
+
+    @property
+    def done(self) -> bool:
+        """Every request is sent, or answered if waited for
+        """
+
+        return len(self.sent) + len(self.responses) == len(self.requests)
+
+    def results(self) -> List[Tuple[bytes, bool] | None]:
+        """Gives the responses of the requests waited for
+
+        Returns:
+            List[Tuple[bytes, bool] | None]: The value and success flag of each response, None if not answered
+        """
+
+        return [ self.responses.get(index) for index in range(self.posted, len(self.requests)) ]
+
 class openshowvar(object):
     """Connector class for C3 Bridge
     """    
 
-    def __init__(self, ip: str, port: int):
+    def __init__(self, ip: str, port: int, timeout: float = 2.0):
         """Connector class for C3 Bridge
 
         Args:
             ip (str): Robot's IPv4
             port (int): C3 Bridge port. Usually 7000
+            timeout (float, optional): Time to wait for a response before reconnecting, in seconds. Defaults to 2.0.
         """        
 
         self.ip = ip
         self.port = port
+        self.timeout = timeout
         self.msg_id = random.randint(1, 100)
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock = None
         self.retry = 0
         self.retry_limit = 5
+
+        # Delay before the first reconnection, doubled after each failure
+        self.backoff = 0.05
+        self.backoff_max = 2.0
+
+        # Receive buffer, reused by every request. Twice the size of the
+        # biggest frame so that a partial frame can always be moved back
+        # to the start without overlapping itself.
+        self._buffer = bytearray(2 * MAX_FRAME_LEN)
+        self._view = memoryview(self._buffer)
+        self._start = 0
+        self._end = 0
+
+        # Durations of the phases of the requests, see kuka.stats
+        self.timings = new_timings()
+
+        self.connect()
+
+    def connect(self) -> bool:
+        """Opens a new connection to the C3 Bridge, replacing the current one.
+        The socket sends small requests without delay and uses TCP keep-alive
+        to detect dead connections.
+
+        Returns:
+            bool: The connection is established
+        """
+
+        if self.sock is not None:
+            self.sock.close()
+        self._start = self._end = 0
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        set_keepalive(self.sock)
+        self.sock.settimeout(self.timeout)
+
         try:
             self.sock.connect((self.ip, self.port))
+            return True
         except socket.error:
-            pass
+            return False
+
+    def _retry(self, request: Callable, default = None):
+        """Runs a request. On a network error, reconnects with a bounded
+        exponential backoff and sends the request again, up to
+        `retry_limit` times. A burst request only sends again its requests
+        not done, see Burst.
+
+        Args:
+            request (Callable): The request to run
+            default (optional): The result if all the tries failed. Defaults to None.
+
+        Returns:
+            The result of the request, or `default`
+        """
+
+        delay = self.backoff
+        for self.retry in range(1, self.retry_limit + 1):
+            try:
+                start = perf_counter()
+                result = request()
+                self.timings[PHASE_REQUEST].add(perf_counter() - start)
+                return result
+            except OSError as e:
+                print(f'{self.ip} : request error ({e}), {self.retry} - try')
+                sleep(delay)
+                delay = min(2 * delay, self.backoff_max)
+                self.connect()
+
+        print(f'{self.ip} : request failed {self.retry_limit} times')
+        self.retry = 0
+        return default
 
     def test_connection(self) -> bool:
         """Tests the connection to the robot
@@ -43,12 +268,15 @@ class openshowvar(object):
         """        
 
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
         try:
             ret = sock.connect_ex((self.ip, self.port))
             return ret == 0
         except socket.error:
             print('socket error')
             return False
+        finally:
+            sock.close()
 
     can_connect = property(test_connection)
 
@@ -64,24 +292,39 @@ class openshowvar(object):
 
         Returns:
             bytes | None: The read bytes. None if the connection is broken
-        """             
+        """
 
-        try:
-            if not isinstance(var, str):
-                raise Exception('Var name is array string')
-            else:
-                self.varname = var.encode(ENCODING)
-            return self._read_var(debug)
-        except:
-            self.retry += 1
-            if self.retry != self.retry_limit:
-                print('read error, ' + str(self.retry) + ' - try')
-                self.read(var)
-            else:
-                print('read error, socket closed')
-                self.retry = 0
-                self.close()
-                return
+        if not isinstance(var, str):
+            raise Exception('Var name is array string')
+        self.varname = var.encode(ENCODING)
+        return self._retry(lambda: self._read_var(debug))
+
+    def read_many(self, vars: List[str], debug=False, writes: List[Tuple[str, str]] = ()) -> List[bytes | None]:
+        """Reads several variables in a single round trip. All the requests
+        are sent at once with consecutive message ids, and the responses are
+        matched back to their variable by id.
+
+        Args:
+            vars (List[str]): The variables to read in KRL syntax
+            debug (bool, optional): Prints the raw responses in the terminal. Defaults to False.
+            writes (List[Tuple[str, str]], optional): Variables to assign before the readings, in the same burst. Their responses are not waited for. Defaults to ().
+
+        Raises:
+            Exception: 'Var names should be strings'
+
+        Returns:
+            List[bytes | None]: The read bytes, in the order of `vars`. None for a failed read
+        """
+
+        if not all(isinstance(var, str) for var in vars):
+            raise Exception('Var names should be strings')
+
+        burst = Burst(
+            [ (var.encode(ENCODING), value.encode(ENCODING)) for var, value in writes ],
+            [ (var.encode(ENCODING), None) for var in vars ]
+        )
+        self._retry(lambda: self._run_burst(burst, debug))
+        return [ rsp[0] if rsp is not None and rsp[1] else None for rsp in burst.results() ]
 
     def write(self, var: str, value: str, debug=False) -> bool:
         """Assigns a value to a variable
@@ -102,7 +345,82 @@ class openshowvar(object):
             raise Exception('Var name and its value should be string')
         self.varname = var.encode(ENCODING)
         self.value = value.encode(ENCODING)
-        return self._write_var(debug)
+        return self._retry(lambda: self._write_var(debug))
+
+    def write_many(self, values: List[Tuple[str, str]], debug=False, wait=True) -> List[bool]:
+        """Assigns values to several variables in a single round trip. All the
+        requests are sent at once and their acknowledgements are checked
+        together.
+
+        Args:
+            values (List[Tuple[str, str]]): The variables to write and their values
+            debug (bool, optional): Prints the raw responses in the terminal. Defaults to False.
+            wait (bool, optional): Waits for the acknowledgements. Else they are skipped when they arrive with the responses to the next requests. Defaults to True.
+
+        Raises:
+            Exception: 'Var name and its value should be string'
+
+        Returns:
+            List[bool]: For each variable, the value has been written, or sent if not waiting
+        """
+
+        if not all(isinstance(var, str) and isinstance(value, str) for var, value in values):
+            raise Exception('Var name and its value should be string')
+
+        encoded = [ (var.encode(ENCODING), value.encode(ENCODING)) for var, value in values ]
+        burst = Burst(encoded) if not wait else Burst(waited=encoded)
+        self._retry(lambda: self._run_burst(burst, debug))
+        if not wait:
+            return [ index in burst.sent for index in range(len(values)) ]
+        return [ rsp is not None and rsp[1] for rsp in burst.results() ]
+
+    def _next_id(self) -> int:
+        """Returns a new message id
+        """
+
+        msg_id = self.msg_id
+        self.msg_id = (self.msg_id + 1) % 65536
+        return msg_id
+
+    def _run_burst(self, burst: Burst, debug: bool):
+        """Raw pipelined procedure : sends the requests of a burst not done
+        yet, and receives the responses of those waited for
+
+        Args:
+            burst (Burst): The requests, updated as they are sent and answered
+            debug (bool): Prints the raw responses
+        """
+
+        reqs = burst.pack(self._next_id)
+
+        # End of each request in the sent bytes : a posted write is done once
+        # sent whole, even if the rest of the burst is not
+        data = b''.join(req for _, _, req in reqs)
+        ends = []
+        end = 0
+        for index, _, req in reqs:
+            end += len(req)
+            ends.append((index, end))
+
+        offset = 0
+        start = perf_counter()
+        try:
+            view = memoryview(data)
+            while offset < len(data):
+                offset += self.sock.send(view[offset:])
+        finally:
+            burst.sent.update(index for index, end in ends if index < burst.posted and end <= offset)
+        sent = perf_counter()
+        self.timings[PHASE_SEND].add(sent - start)
+
+        ids = { msg_id: index for index, msg_id, _ in reqs if index >= burst.posted }
+        while ids:
+            _msg_id, var_value, isok = self._unpack(self._recv_frame(), sent, debug)
+            index = ids.pop(_msg_id, None)
+            if index is None:
+                # Late response to an older request
+                continue
+            burst.responses[index] = (var_value, isok)
 
     def _read_var(self, debug: bool) -> bytes | None:
         """Raw reading procedure to get data from the C3 bridge
@@ -140,16 +458,101 @@ class openshowvar(object):
             return _value
 
     def _send_req(self, req: bytes):
-        """Sends bytes to the C3 bridge and reads the response. The current 
-        character limit is set to 8192.
+        """Sends bytes to the C3 bridge and reads the whole response
 
         Args:
             req (bytes): The bytes to write to the C3 Bridge
         """        
 
         self.rsp = None
+        sent = self._send(req)
+        rsp = self._recv_frame()
+        while _FRAME_HEADER.unpack_from(rsp)[0] != self.msg_id:
+            # Late response to an older request, like a write not waited for
+            rsp = self._recv_frame()
+        self.rsp = rsp
+        self.timings[PHASE_WAIT].add(perf_counter() - sent)
+
+    def _send(self, req: bytes) -> float:
+        """Sends bytes to the C3 bridge, timing the send
+
+        Args:
+            req (bytes): The bytes to write to the C3 Bridge
+
+        Returns:
+            float: The time the bytes were sent at
+        """
+
+        start = perf_counter()
         self.sock.sendall(req)
-        self.rsp = self.sock.recv(8192)
+        sent = perf_counter()
+        self.timings[PHASE_SEND].add(sent - start)
+        return sent
+
+    def _unpack(self, rsp: memoryview, sent: float, debug: bool) -> Tuple[int, bytes, bool]:
+        """Unpacks a response of a burst, timing its wait and parse phases
+
+        Args:
+            rsp (memoryview): The raw response
+            sent (float): The time the request was sent at
+            debug (bool): Prints the raw response
+
+        Returns:
+            Tuple[int, bytes, bool]: The message id, value and success flag
+        """
+
+        received = perf_counter()
+        self.timings[PHASE_WAIT].add(received - sent)
+        out = unpack_rsp(rsp, debug)
+        self.timings[PHASE_PARSE].add(perf_counter() - received)
+        return out
+
+    def _fill(self, size: int):
+        """Receives data from the socket until at least `size` bytes are
+        buffered after the current frame start
+
+        Args:
+            size (int): The number of bytes needed
+
+        Raises:
+            ConnectionError: The C3 bridge closed the connection
+        """
+
+        if self._end - self._start >= size:
+            return
+
+        if self._start + size > len(self._buffer):
+            # Moving the partial frame back to the start of the buffer
+            available = self._end - self._start
+            self._view[:available] = self._view[self._start:self._end]
+            self._start = 0
+            self._end = available
+
+        while self._end - self._start < size:
+            n = self.sock.recv_into(self._view[self._end:])
+            if n == 0:
+                raise ConnectionError('C3 bridge closed the connection')
+            self._end += n
+
+    def _recv_frame(self) -> memoryview:
+        """Reads one whole response from the socket, using the body length
+        given in its header. The response is not copied : the returned view
+        is only valid until the next call.
+
+        Returns:
+            memoryview: The raw response
+        """
+
+        self._fill(_FRAME_HEADER.size)
+        _msg_id, body_len = _FRAME_HEADER.unpack_from(self._buffer, self._start)
+        frame_len = _FRAME_HEADER.size + body_len
+        self._fill(frame_len)
+
+        start = self._start
+        self._start += frame_len
+        if self._start == self._end:
+            self._start = self._end = 0
+        return self._view[start:start + frame_len]
 
     def _pack_read_req(self) -> bytes:
         """Packs the current request to the C3 Bridge format
@@ -158,18 +561,7 @@ class openshowvar(object):
             bytes: The encoded data
         """        
 
-        var_name_len = len(self.varname)
-        flag = 0
-        req_len = var_name_len + 3
-
-        return struct.pack(
-            '!HHBH'+str(var_name_len)+'s',
-            self.msg_id,
-            req_len,
-            flag,
-            var_name_len,
-            self.varname
-            )
+        return pack_read_req(self.msg_id, self.varname)
 
     def _pack_write_req(self) -> bytes:
         """Packs the current request to the C3 Bridge format
@@ -178,21 +570,7 @@ class openshowvar(object):
             bytes: The encoded data
         """   
 
-        var_name_len = len(self.varname)
-        flag = 1
-        value_len = len(self.value)
-        req_len = var_name_len + 3 + 2 + value_len
-
-        return struct.pack(
-            '!HHBH'+str(var_name_len)+'s'+'H'+str(value_len)+'s',
-            self.msg_id,
-            req_len,
-            flag,
-            var_name_len,
-            self.varname,
-            value_len,
-            self.value
-            )
+        return pack_write_req(self.msg_id, self.varname, self.value)
 
     def _read_rsp(self, debug=False) -> bytes | None:
         """Reads the response to the current request
@@ -205,12 +583,10 @@ class openshowvar(object):
         """        
 
         if self.rsp is None: return None
-        var_value_len = len(self.rsp) - struct.calcsize('!HHBH') - 3
-        result = struct.unpack('!HHBH'+str(var_value_len)+'s'+'3s', self.rsp)
-        _msg_id, body_len, flag, var_value_len, var_value, isok = result
-        if debug:
-            print('[DEBUG]', result)
-        if result[-1].endswith(b'\x01') and _msg_id == self.msg_id:
+        start = perf_counter()
+        _msg_id, var_value, isok = unpack_rsp(self.rsp, debug)
+        self.timings[PHASE_PARSE].add(perf_counter() - start)
+        if isok and _msg_id == self.msg_id:
             self.msg_id = (self.msg_id + 1) % 65536  # format char 'H' is 2 bytes long
             return var_value
 
@@ -0,0 +1,215 @@
+'''
+Accounting of the samples lost by the Data collector sub.
+
+The sub writes its samples in a ring buffer whatever Python has read : when
+the write index laps the read index, the overwritten samples are lost and
+the read index keeps going over newer samples. Samples are also missing when
+the sub is late on its sampling period (ColKEEPING_UP = FALSE). Both show as
+gaps in the Sample_time of consecutive samples. The laps themselves, the
+buffer overruns, are found from the progress of the write index (Queue_Write)
+against the read index (Queue_Read) between two polls.
+'''
+
+from time import time
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+class LossMonitor:
+    """Detects the gaps, overruns and sampling delays of a run and counts
+    the lost samples
+    """
+
+    # Interval between two samples up to which no sample is missing, in
+    # measured sample periods. The sub clears ColKEEPING_UP for the same
+    # delay. Samples are missing after more than gap_factor + 0.5 periods
+    gap_factor = 2
+
+    # Occupancy of the sub buffer above which an overrun is about to happen
+    overrun_warning = 0.9
+
+    def __init__(self, alert: Callable[[str], None] = print):
+        """Creates a monitor
+
+        Args:
+            alert (Callable[[str], None], optional): Called with a message on each loss. Defaults to print.
+        """
+
+        self.alert = alert
+        self.name = ""
+        self.begin(0.012, 20000)
+
+    def begin (self, rate: float, buffer_size: int):
+        """Resets the counters for a new run
+
+        Args:
+            rate (float): The sampling period of the sub, in seconds
+            buffer_size (int): The size of the sub buffer
+        """
+
+        self.rate = rate * 1000
+        self.period = self.rate
+        self.buffer_size = buffer_size
+
+        self.samples = 0
+        self.lost = 0
+        self.overruns = 0
+        self.keeping_up = True
+        self.max_occupancy = 0.0
+        self._warned = False
+        self._last_time = None
+
+        # Read index, write index and time of the previous poll
+        self._indices: Tuple[int, int, float] = None
+
+        # Start and end Sample_time of each gap, and the number of samples lost in it
+        self.gaps: List[Tuple[float, float, int]] = []
+
+    def _alert (self, message: str):
+        if self.alert is not None:
+            self.alert(f"{self.name} : {message}" if self.name else message)
+
+    def poll (self, read: int, write: int, now: float = None) -> int:
+        """Follows the indices of the sub buffer, counting the laps of the
+        write index over the read index since the previous poll as overruns
+
+        Args:
+            read (int): The index of the last sample read in the sub buffer (Queue Read)
+            write (int): The write index of the sub buffer (Queue Write)
+            now (float, optional): The time of the poll, from `time.time`. Defaults to None (now).
+
+        Returns:
+            int: The number of laps
+        """
+
+        now = time() if now is None else now
+        laps = 0
+        if self._indices is not None:
+            last_read, last_write, last_now = self._indices
+            backlog = (last_write - last_read - 1) % self.buffer_size
+            read_progress = (read - last_read) % self.buffer_size
+            write_progress = (write - last_write) % self.buffer_size
+
+            # Whole turns of the write index are only seen in the elapsed time
+            turns = round(((now - last_now) * 1000 / self.period - write_progress) / self.buffer_size)
+            write_progress += max(0, turns) * self.buffer_size
+            if backlog + write_progress < read_progress:
+                write_progress += self.buffer_size
+
+            # The unread samples can not exceed the buffer : each time they
+            # would, the write index passed the read index
+            laps = (backlog + write_progress - read_progress) // self.buffer_size
+            if laps > 0:
+                self.overrun(laps)
+
+        self._indices = (read, write, now)
+        return laps
+
+    def overrun (self, laps: int = 1):
+        """Counts laps of the write index over the read index
+
+        Args:
+            laps (int, optional): The number of laps. Defaults to 1.
+        """
+
+        self.overruns += laps
+        self._alert(f"buffer overrun, the sub wrote {laps} time(s) over unread samples")
+
+    def skip (self, read: int, write: int):
+        """Follows the indices of the sub buffer from a new read index, the
+        samples up to it being dropped
+
+        Args:
+            read (int): The index of the last sample dropped
+            write (int): The write index of the sub buffer (Queue Write)
+        """
+
+        self._indices = (read, write, time())
+
+    def follows (self, sample_times: np.ndarray) -> bool:
+        """Checks that samples are later than each other and than the
+        previously checked ones. Samples overwritten by the sub while being
+        read are not.
+
+        Args:
+            sample_times (np.ndarray): The Sample_time of the samples, in ms
+
+        Returns:
+            bool: The Sample_time are increasing
+        """
+
+        if len(sample_times) == 0:
+            return True
+        previous = sample_times[0] - 1 if self._last_time is None else self._last_time
+        return bool(np.all(np.diff(sample_times, prepend=previous) > 0))
+
+    def check (self, sample_times: np.ndarray, read: int, write: int, keeping_up: bool = True, period: float = None) -> np.ndarray:
+        """Checks new samples, following the previously checked ones
+
+        Args:
+            sample_times (np.ndarray): The Sample_time of the samples, in ms
+            read (int): The index of the last sample in the sub buffer (Queue Read)
+            write (int): The write index of the sub buffer (Queue Write)
+            keeping_up (bool, optional): The latest reading of ColKEEPING_UP. Defaults to True.
+            period (float, optional): The measured sample period, in seconds. Defaults to None (the sampling rate).
+
+        Returns:
+            np.ndarray: The gap mask : 1 for the samples following missing ones, else 0
+        """
+
+        if period is not None and period > 0:
+            self.period = period * 1000
+
+        mask = np.zeros(len(sample_times), np.int8)
+        if len(sample_times) == 0:
+            return mask
+
+        self.poll(read, write)
+
+        # Intervals from the previous sample, the first of the run having none
+        previous = sample_times[0] if self._last_time is None else self._last_time
+        intervals = np.diff(sample_times, prepend=previous)
+        self._last_time = float(sample_times[-1])
+        self.samples += len(sample_times)
+
+        for i in np.flatnonzero(intervals > (self.gap_factor + 0.5) * self.period):
+            interval = float(intervals[i])
+            lost = int(round(interval / self.period)) - 1
+            end = float(sample_times[i])
+            mask[i] = 1
+            self.lost += lost
+            self.gaps.append((end - interval, end, lost))
+            self._alert(f"{lost} samples missing before {end / 1000:.3f} s")
+
+        if self.keeping_up and not keeping_up:
+            self._alert("the sub is late on its sampling period")
+        self.keeping_up = keeping_up
+
+        occupancy = ((write - read - 1) % self.buffer_size) / self.buffer_size
+        self.max_occupancy = max(self.max_occupancy, occupancy)
+        if occupancy >= self.overrun_warning and not self._warned:
+            self._alert(f"buffer {occupancy:.0%} full, samples are about to be overwritten")
+        self._warned = occupancy >= self.overrun_warning
+
+        return mask
+
+    def summary (self) -> Dict[str, object]:
+        """Gives the counters of the run
+
+        Returns:
+            Dict[str, object]: The number of samples received and lost, the lost ratio,
+            the number of gaps and overruns, the longest gap (ms), the peak buffer
+            occupancy and the state of the sub
+        """
+
+        total = self.samples + self.lost
+        return {
+            "samples": self.samples,
+            "lost": self.lost,
+            "lost_ratio": self.lost / total if total else 0.0,
+            "gaps": len(self.gaps),
+            "overruns": self.overruns,
+            "max_gap": max((end - start for start, end, _ in self.gaps), default=0.0),
+            "max_occupancy": self.max_occupancy,
+            "keeping_up": self.keeping_up,
+        }
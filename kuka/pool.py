@@ -0,0 +1,159 @@
+from .kukavarproxy import openshowvar
+from threading import Condition, local
+from contextlib import contextmanager
+from itertools import count
+from time import perf_counter
+from typing import Dict, List, Tuple
+
+# Request priorities, from the most to the least urgent
+PRIORITY_SAMPLING = 0   # System variables polling
+PRIORITY_CONTROL = 1    # Run setup, Kuka Trace control
+PRIORITY_UI = 2         # User commands (gripper, latency test)
+
+PRIORITY_NAMES = {
+    PRIORITY_SAMPLING: "sampling",
+    PRIORITY_CONTROL: "control",
+    PRIORITY_UI: "ui",
+}
+
+class KUKA_ConnectionPool:
+    """Pool of C3 Bridge connections to a single robot.
+
+    Each caller leases a connection for the duration of its request(s), so
+    the bytes of concurrent requests can never interleave on a socket. The
+    first connection is reserved to the sampling priority : the system
+    variables polling is never queued behind Kuka Trace control or user
+    commands. When several callers wait for a connection, the most urgent
+    one gets it first.
+    """
+
+    def __init__(self, ip: str, port: int, size: int = 2):
+        """Opens the connections of the pool
+
+        Args:
+            ip (str): Robot's IPv4
+            port (int): C3 Bridge port. Usually 7000
+            size (int, optional): The number of connections. Defaults to 2.
+        """
+
+        self.ip = ip
+        self.port = port
+        self.clients: List[openshowvar] = [ openshowvar(ip, port) for _ in range(max(1, size)) ]
+
+        self._busy = [ False ] * len(self.clients)
+        self._cond = Condition()
+        self._waiting: List[Tuple[int, int]] = []
+        self._tickets = count()
+        self._local = local()
+
+        self._stats = {
+            priority: { "leases": 0, "waits": 0, "wait_time": 0.0, "max_wait": 0.0 }
+            for priority in PRIORITY_NAMES
+        }
+        self._requests = [ 0 ] * len(self.clients)
+
+    def _allowed (self, priority: int) -> range:
+        """Gives the indexes of the connections usable with a priority
+        """
+
+        if priority == PRIORITY_SAMPLING or len(self.clients) == 1:
+            return range(len(self.clients))
+        return range(1, len(self.clients))
+
+    def _free (self, priority: int) -> int | None:
+        """Gives a free connection usable with a priority, if any
+        """
+
+        for i in self._allowed(priority):
+            if not self._busy[i]:
+                return i
+        return None
+
+    def _is_next (self, ticket: Tuple[int, int], i: int) -> bool:
+        """Checks that no more urgent caller is waiting for the connection `i`
+        """
+
+        return all(
+            other >= ticket
+            for other in self._waiting
+            if i in self._allowed(other[0])
+        )
+
+    @contextmanager
+    def lease (self, priority: int = PRIORITY_CONTROL):
+        """Gives exclusive access to a connection. A thread that already holds
+        a lease gets the same connection back.
+
+        Args:
+            priority (int, optional): The priority of the caller. Defaults to PRIORITY_CONTROL.
+
+        Yields:
+            openshowvar: The leased connection
+        """
+
+        held = getattr(self._local, "client", None)
+        if held is not None:
+            yield held
+            return
+
+        ticket = (priority, next(self._tickets))
+        start = perf_counter()
+
+        with self._cond:
+            waited = False
+            self._waiting.append(ticket)
+            while True:
+                i = self._free(priority)
+                if i is not None and self._is_next(ticket, i):
+                    break
+                waited = True
+                self._cond.wait()
+            self._waiting.remove(ticket)
+            self._busy[i] = True
+
+            wait = perf_counter() - start
+            stats = self._stats[priority]
+            stats["leases"] += 1
+            stats["waits"] += 1 if waited else 0
+            stats["wait_time"] += wait
+            stats["max_wait"] = max(stats["max_wait"], wait)
+            self._requests[i] += 1
+
+        self._local.client = self.clients[i]
+        try:
+            yield self.clients[i]
+        finally:
+            self._local.client = None
+            with self._cond:
+                self._busy[i] = False
+                self._cond.notify_all()
+
+    def stats (self) -> Dict[str, Dict[str, float]]:
+        """Gives the usage statistics of the pool
+
+        Returns:
+            Dict[str, Dict[str, float]]: Per priority, the number of leases, the number
+            of leases that had to wait, the total and max waiting time (s). Per connection,
+            the number of leases.
+        """
+
+        with self._cond:
+            out = { PRIORITY_NAMES[p]: dict(s) for p, s in self._stats.items() }
+            out["connections"] = {
+                "size": len(self.clients),
+                "busy": sum(self._busy),
+                "waiting": len(self._waiting),
+                "leases": list(self._requests),
+            }
+        return out
+
+    @property
+    def can_connect (self) -> bool:
+        return self.clients[0].can_connect
+
+    def close (self):
+        """Closes all the connections
+        """
+
+        for client in self.clients:
+            client.close()
@@ -0,0 +1,464 @@
+'''
+Collection of a robot in a separate process.
+
+Rendering the GUI and parsing the samples of the other robots compete with
+the polling threads for the GIL. A `KUKA_CollectorProcess` runs the whole
+`KUKA_DataReader.acquire` of a robot in its own process, with its own C3
+Bridge connections. Its progress reaches the GUI through a `SampleFeed`, a
+ring buffer in shared memory written by the collector and read by the GUI
+without any lock : a slow GUI can only miss progress points, it never delays
+a reading of the samples. The runs of several processes are started together
+by a `RunBarrier`.
+'''
+
+import multiprocessing as mp
+import traceback
+from multiprocessing.shared_memory import SharedMemory
+from threading import get_ident
+from time import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .cells import Cell
+from .reader import KUKA_DataReader
+from .stream import SampleWriter
+
+# States of a collector, in the feed
+STATE_COLLECTING = 0
+STATE_COLLECTED = 1
+STATE_STORED = 2
+STATE_FAILED = 3
+
+# Header of a feed : int64 values
+_COUNT = 0          # Progress points written since the start
+_STATE = 1          # State of the collector
+_RUNS = 2           # Runs done
+_LOST = 3           # Samples lost by the sub
+_MESSAGE = 4        # Number of messages written, the latest one following the header
+_HEADER = 8
+
+# Longest message, in bytes
+MESSAGE_SIZE = 256
+
+class SampleFeed:
+    """Ring buffer of progress points in shared memory, with one writer and
+    one reader. A point is the number of samples waiting in the sub buffer
+    and the request time of a sample.
+    """
+
+    def __init__(self, capacity: int = 4096, name: str = None):
+        """Creates a feed, or attaches to an existing one
+
+        Args:
+            capacity (int, optional): The number of points kept. Defaults to 4096.
+            name (str, optional): The name of the feed to attach to. Defaults to None (new feed).
+        """
+
+        header = _HEADER * 8 + MESSAGE_SIZE
+        if name is None:
+            self._memory = SharedMemory(create=True, size=header + capacity * 2 * 8)
+            self._memory.buf[:header] = bytes(header)
+        else:
+            self._memory = SharedMemory(name=name)
+            capacity = (self._memory.size - header) // 16
+
+        self.capacity = capacity
+        buf = self._memory.buf
+        self._header = np.ndarray(_HEADER, np.int64, buf)
+        self._message = np.ndarray(MESSAGE_SIZE, np.uint8, buf, _HEADER * 8)
+        self._points = np.ndarray((capacity, 2), np.float64, buf, header)
+
+        # Points already given by `pull`
+        self._pulled = 0
+
+    @property
+    def name (self) -> str:
+        """The name to attach to this feed from another process
+        """
+
+        return self._memory.name
+
+    @property
+    def count (self) -> int:
+        """The number of points written since the start
+        """
+
+        return int(self._header[_COUNT])
+
+    @property
+    def state (self) -> int:
+        """The state of the collector, one of the STATE_ values
+        """
+
+        return int(self._header[_STATE])
+
+    @state.setter
+    def state (self, state: int):
+        self._header[_STATE] = state
+
+    @property
+    def runs (self) -> int:
+        """The number of runs done
+        """
+
+        return int(self._header[_RUNS])
+
+    @runs.setter
+    def runs (self, runs: int):
+        self._header[_RUNS] = runs
+
+    @property
+    def lost (self) -> int:
+        """The number of samples lost by the sub
+        """
+
+        return int(self._header[_LOST])
+
+    @lost.setter
+    def lost (self, lost: int):
+        self._header[_LOST] = lost
+
+    def push (self, buffer: int, latency: float):
+        """Adds a point. Called by the writer only.
+
+        Args:
+            buffer (int): The number of samples waiting in the sub buffer
+            latency (float): The request time of the sample, in ms
+        """
+
+        count = self._header[_COUNT]
+        self._points[count % self.capacity] = (buffer, latency)
+
+        # The point is complete before it is counted
+        self._header[_COUNT] = count + 1
+
+    def pull (self) -> np.ndarray:
+        """Gives the points added since the previous call. Called by the
+        reader only : points overwritten before being pulled are skipped.
+
+        Returns:
+            np.ndarray: The points, one per row : buffered samples and latency (ms)
+        """
+
+        count = self.count
+        first = max(self._pulled, count - self.capacity)
+        self._pulled = count
+        if first >= count:
+            return np.empty((0, 2))
+        index = np.arange(first, count) % self.capacity
+        return self._points[index]
+
+    def post (self, message: str):
+        """Replaces the latest message. Called by the writer only.
+
+        Args:
+            message (str): The message, truncated to MESSAGE_SIZE bytes
+        """
+
+        data = message.encode("utf-8")[:MESSAGE_SIZE - 1] + b"\0"
+        self._message[:len(data)] = np.frombuffer(data, np.uint8)
+        self._header[_MESSAGE] += 1
+
+    def message (self) -> Tuple[int, str]:
+        """Gives the latest message
+
+        Returns:
+            Tuple[int, str]: The number of messages written, and the latest one ("" if none)
+        """
+
+        data = self._message.tobytes()
+        return int(self._header[_MESSAGE]), data[:data.find(b"\0")].decode("utf-8", "replace")
+
+    def close (self):
+        """Detaches from the feed
+        """
+
+        del self._header, self._message, self._points
+        self._memory.close()
+
+    def unlink (self):
+        """Detaches from the feed and frees it. Called by its creator, once
+        the other process is done with it.
+        """
+
+        self.close()
+        self._memory.unlink()
+
+class RunBarrier:
+    """Starts each run of several collector processes, or threads, at the
+    same time. It is used as the `lock` of `KUKA_DataReader.acquire`, and
+    `done` as its `done` callback. Collectors that stop collecting no longer
+    hold the others. The skew of each run, between the first and the last
+    collector leaving `acquire`, is measured.
+    """
+
+    def __init__(self, parties: int):
+        """Creates a barrier, closed until `start`
+
+        Args:
+            parties (int): The number of processes
+        """
+
+        self._cond = mp.Condition()
+        self._active = mp.Value("i", parties, lock=False)
+        self._done = mp.Value("i", 0, lock=False)
+
+        # Number of runs allowed to start, and the next run of each thread
+        # of this process
+        self._opened = mp.Value("i", 0, lock=False)
+        self._next: Dict[int, int] = {}
+
+        # Times the collectors started the current run at, and the number of
+        # runs measured, the total, latest and largest skews (s)
+        self._starts = mp.Array("d", parties, lock=False)
+        self._started = mp.Value("i", 0, lock=False)
+        self._skews = mp.Array("d", 4, lock=False)
+
+    def start (self):
+        """Lets every process begin its first run
+        """
+
+        with self._cond:
+            self._opened.value = 1
+            self._started.value = 0
+            self._cond.notify_all()
+
+    def acquire (self):
+        """Waits for the start of the next run
+        """
+
+        thread = get_ident()
+        run = self._next.get(thread, 1)
+        with self._cond:
+            self._cond.wait_for(lambda: self._opened.value >= run)
+            if self._started.value < len(self._starts):
+                self._starts[self._started.value] = time()
+                self._started.value += 1
+            self._measure()
+        self._next[thread] = run + 1
+
+    def done (self):
+        """Declares the end of a run, starting the next one when every
+        process is done with it
+        """
+
+        with self._cond:
+            self._done.value += 1
+            self._open()
+
+    def leave (self):
+        """Removes a process which stopped collecting, after its last run
+        or an error
+        """
+
+        with self._cond:
+            self._active.value -= 1
+            self._measure()
+            self._open()
+
+    def _open (self):
+        if self._active.value > 0 and self._done.value >= self._active.value:
+            self._done.value = 0
+            self._opened.value += 1
+            self._started.value = 0
+            self._cond.notify_all()
+
+    def _measure (self):
+        # Every collector still active started the current run
+        started = self._started.value
+        if started == 0 or started != self._active.value:
+            return
+        starts = self._starts[:started]
+        skew = max(starts) - min(starts)
+        self._skews[0] += 1
+        self._skews[1] += skew
+        self._skews[2] = skew
+        self._skews[3] = max(self._skews[3], skew)
+
+    def summary (self) -> Dict[str, object]:
+        """Gives the skews of the runs started so far
+
+        Returns:
+            Dict[str, object]: The number of runs, the mean, latest and largest skews (ms)
+        """
+
+        with self._cond:
+            runs, total, last, largest = self._skews[:]
+        return {
+            "runs": int(runs),
+            "mean_skew_ms": total / runs * 1000 if runs else 0.0,
+            "skew_ms": last * 1000,
+            "max_skew_ms": largest * 1000,
+        }
+
+def _save (data, path: str, name: str, what: str):
+    """Writes a collected DataFrame to a .xlsx file
+    """
+
+    if data is None:
+        print(name + " failed to collect " + what)
+        return
+    data.to_excel(path)
+    print("Successfully stored " + what + " from " + name)
+
+def _collect (
+        cell: Cell,
+        feed_name: str,
+        barrier: RunBarrier,
+        dosysvar: bool,
+        dotrace: bool,
+        settings: dict,
+        stream_path: str,
+        outputs: Tuple[str, str]
+    ):
+    """Runs an acquisition. Entry point of the collector processes, see
+    `KUKA_CollectorProcess.start`.
+    """
+
+    feed = SampleFeed(name=feed_name)
+    name = cell.name
+    handler = cell.handler()
+    reader = None
+    left = barrier is None
+
+    def leave ():
+        nonlocal left
+        if not left:
+            left = True
+            barrier.leave()
+
+    def alert (message: str):
+        print(message)
+        feed.lost = reader.losses.lost if reader is not None else 0
+        feed.post(message)
+
+    def next (latency: float, queue_read: int, queue_write: int):
+        feed.push((queue_write - queue_read) % reader._buffer_size, latency)
+
+    def done ():
+        feed.runs += 1
+        if barrier is not None:
+            barrier.done()
+
+    try:
+        if not handler.KUKA_Open():
+            raise ConnectionError(f"Could not connect to {cell.address}")
+
+        reader = KUKA_DataReader(handler, dosysvar, dotrace)
+        reader.losses.alert = alert
+        if dosysvar and stream_path is not None:
+            reader.stream = SampleWriter(stream_path)
+
+        try:
+            data, trace_data = reader.acquire(**settings, next=next, done=done, lock=barrier)
+        finally:
+            # The other collectors go on while this one saves its files
+            leave()
+            if reader.stream is not None:
+                reader.stream.close()
+        feed.state = STATE_COLLECTED
+
+        sysvar_path, trace_path = outputs
+        if dosysvar and sysvar_path is not None:
+            _save(data, sysvar_path, name, "system variables")
+        if dotrace and trace_path is not None:
+            _save(trace_data, trace_path, name, "kuka traces")
+        feed.state = STATE_STORED
+
+    except Exception as e:
+        traceback.print_exception(e)
+        if feed.state == STATE_COLLECTING and reader is not None and reader.stream is not None:
+            print(f"Samples collected from {name} until the error are in {reader.stream.path}")
+        feed.post(f"{type(e).__name__} : {e}")
+        feed.state = STATE_FAILED
+
+    finally:
+        leave()
+        handler.KUKA_Close()
+        feed.close()
+
+class KUKA_CollectorProcess:
+    """Runs the acquisition of a robot in a separate process, and gives its
+    progress through a `SampleFeed`
+    """
+
+    def __init__(self, cell: Cell, dosysvar: bool, dotrace: bool, capacity: int = 4096):
+        """Creates a collector, and its feed
+
+        Args:
+            cell (Cell): The robot, see kuka.cells
+            dosysvar / dotrace (bool): True if the system variable / kuka trace collection method is enabled
+            capacity (int, optional): The number of progress points kept by the feed. Defaults to 4096.
+        """
+
+        self.cell = cell
+        self.dosysvar = dosysvar
+        self.dotrace = dotrace
+
+        self.feed = SampleFeed(capacity)
+        self.process: mp.Process = None
+
+    def start (
+            self,
+            A_iter: List[str],
+            speed: str | int | slice,
+            sampling: str,
+            trace_config: str = "12_ms",
+            load: int = -1,
+            barrier: RunBarrier = None,
+            temp_dir: str = None,
+            stream_path: str = None,
+            outputs: Tuple[str, str] = (None, None)
+        ):
+        """Starts the acquisition, see `KUKA_DataReader.acquire`
+
+        Args:
+            A_iter (List[str]): The number of iteration per axis
+            speed (str | int | slice): The speed (range) at which to run the iterations
+            sampling (str): The system variables sampling time
+            trace_config (str, optional): The trace configuration file name. Defaults to "12_ms".
+            load (int, optional): The dataset class. Defaults to -1.
+            barrier (RunBarrier, optional): Syncs the runs with other collectors. Defaults to None.
+            temp_dir (str, optional): The folder in which to store the files to process. Defaults to None.
+            stream_path (str, optional): The CSV file the samples are streamed to. Defaults to None.
+            outputs (Tuple[str, str], optional): The .xlsx files of the system variables and
+            Kuka Trace DataFrames. Defaults to (None, None) (not saved).
+        """
+
+        settings = {
+            "A_iter": A_iter, "speed": speed, "sampling": sampling,
+            "trace_config": trace_config, "load": load, "temp_dir": temp_dir,
+        }
+        self.process = mp.Process(
+            target=_collect,
+            args=[
+                self.cell, self.feed.name, barrier,
+                self.dosysvar, self.dotrace, settings, stream_path, outputs
+            ],
+            daemon=False
+        )
+        self.process.start()
+
+    @property
+    def alive (self) -> bool:
+        """The process is running
+        """
+
+        return self.process is not None and self.process.is_alive()
+
+    def terminate (self):
+        """Stops the process at once
+        """
+
+        if self.alive:
+            self.process.terminate()
+            self.process.join()
+
+    def close (self):
+        """Waits for the process and frees the feed
+        """
+
+        if self.process is not None:
+            self.process.join()
+        self.feed.unlink()
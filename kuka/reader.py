@@ -1,12 +1,22 @@
 import dateutil.tz
-from time import sleep, time
+from time import time
 import pandas as pd
 from typing import Callable, List, Tuple
 from threading import Semaphore
 from datetime import datetime
 import numpy as np
 
+from .campaign import TracePipeline
+from .channels import CHANNELS_ALL, ChannelSet
+from .clock import ClockSync
+from .decoder import AXIS_FIELDS, decode_array, decode_axis, decode_real
 from .handler import KUKA_Handler
+from .losses import LossMonitor
+from .pool import PRIORITY_SAMPLING
+from .scheduler import PollScheduler
+from .steps import Steps, call, pause, request, run, run_end, run_start
+from .stream import SampleWriter
+from .store import TAB1_SAMPLE, SampleStore, concat
 from .trace import KUKA_Trace
 
 TZ = dateutil.tz.gettz("Europe/Prague")
@@ -32,32 +42,81 @@ class KUKA_DataReader:
     _dosysvar = False
     _dotrace = False
 
-    # The columns order of the read data, used to create the DataFrame
-    _columns = [
-        "Sample_time",
-        "Position_Command_A1", "Position_A1", "Torque_A1", "Current_A1", "Temperature_A1",
-        "Position_Command_A2", "Position_A2", "Torque_A2", "Current_A2", "Temperature_A2",
-        "Position_Command_A3", "Position_A3", "Torque_A3", "Current_A3", "Temperature_A3",
-        "Position_Command_A4", "Position_A4", "Torque_A4", "Current_A4", "Temperature_A4",
-        "Position_Command_A5", "Position_A5", "Torque_A5", "Current_A5", "Temperature_A5",
-        "Position_Command_A6", "Position_A6", "Torque_A6", "Current_A6", "Temperature_A6",
-        "A1", "A2", "A3", "A4", "A5", "A6" ,     
-        "Queue_Read", "Queue_Write", "Load", "Faulty", "Speed", "Read_time",
-    ]
-
     # TAB1 Length
     __TAB1_LEN = 36
     
-    # TAB1 data indexes 
-    __TAB1_SAMPLE = 0
-    __TAB1_SAMPLE_READ = 32
+    # TAB1 data indexes, after the sample values
     __TAB1_SAMPLE_WRITE = 33
-    __TAB1_DATA_START = 1
-    __TAB1_DATA_END = 31
-    __TAB1_MOTOR = 31
     __TAB1_DATA_AVAILABLE = 34
     __TAB1_DONE = 35
 
+    # TAB_BLOCK header indexes, then samples laid out as in TAB1 up to the sample index
+    __BLOCK_COUNT = 0
+    __BLOCK_SAMPLE_WRITE = 1
+    __BLOCK_DATA_AVAILABLE = 2
+    __BLOCK_DONE = 3
+    __BLOCK_HEADER = 4
+
+    # Bulk drain mode : no per-sample handshake, the ColBUFFER arrays are read
+    # in chunks of `drain_chunk` samples when the run ends or when more than
+    # `drain_threshold` of the ring buffer is waiting. Progress is polled
+    # every `drain_period` seconds, and acknowledges the drained samples.
+    # Samples overwritten by the sub before or while being read are dropped
+    # and counted as overruns.
+    drain = False
+    drain_chunk = 100
+    drain_threshold = 0.5
+    drain_period = 0.5
+
+    # The sub supports the block transfer, the current block size and the size of its buffer
+    _blocks = False
+    _block_size = 1
+    _buffer_size = 20000
+
+    # Uses the block transfer when the sub supports it
+    block_mode = True
+
+    # Acknowledges the samples without waiting for the robot : the latest
+    # acknowledgement is sent in the same burst as the next reading, or on its
+    # own before sleeping
+    write_behind = True
+
+    # Writes the samples to disk while collecting them. Unless `keep_streamed`
+    # is set, the written samples are freed and the runs return empty DataFrames
+    stream: SampleWriter = None
+    keep_streamed = True
+
+    # Readings of $TIMER[1] per clock synchronisation, at the start and end of each run
+    clock_probes = 8
+
+    # The Kuka Traces of the finished runs are downloaded and parsed by
+    # `trace_workers` threads while the robot goes on with the next runs, at
+    # most `trace_queue` runs waiting for them. `trace_export` is called by
+    # the workers with the trace of each run and its index. Unless
+    # `keep_exported` is set, the exported traces are freed and the runs
+    # return no trace. A failed download gives no trace for its run only.
+    # With no worker, each trace is downloaded before the next run starts
+    trace_workers = 1
+    trace_queue = 2
+    trace_export: Callable[[pd.DataFrame, int], None] = None
+    keep_exported = False
+    _traces: TracePipeline = None
+
+    # Longest network outage a collection can resume from, in seconds
+    resume_timeout = 60
+
+    # Time after which a collection receiving no new sample resends its acknowledgement, in seconds
+    stall_timeout = 1
+
+    # The sub clears ColRESET once the reset is done
+    _RESET_DONE = { "ColRESET": False, "ColRESET_DONE": True }
+
+    # Values written to reset the sub
+    _RESET_VALUES = { "SAMPLE_NUMBER": 1, "SAMPLE_READ": 1, "__PyResetTimer": True }
+
+    # Longest time to wait for the sub to reset, in seconds
+    reset_timeout = 60
+
     def __init__(self, handler: KUKA_Handler, dosysvar: bool, dotrace: bool) -> None:
         """Creates a new Data Reader
 
@@ -69,6 +128,25 @@ class KUKA_DataReader:
         self._dosysvar = dosysvar
         self._dotrace = dotrace
 
+        # The channels to collect, written to ColCHANNELS, and the ones collected
+        # during the current run. They give the columns of the DataFrames
+        self.channels = ChannelSet()
+        self._channels = ChannelSet()
+
+        # The acknowledgement not sent yet, see `write_behind`
+        self._ack = {}
+
+        # Samples of the current run, and the timing of their readings
+        self._store = SampleStore()
+        self.scheduler = PollScheduler()
+
+        # Samples lost by the sub during the current run
+        self.losses = LossMonitor()
+        self.losses.name = handler.ipAddress
+
+        # Maps the Sample_time of the robot to host epoch time (Host_time)
+        self.clock = ClockSync()
+
         # KUKA TRACE
         self.trace = KUKA_Trace(handler)
         self.trace.Trace_Enable(self._dotrace)
@@ -105,107 +183,163 @@ class KUKA_DataReader:
     
     @HAS_READ.setter
     def HAS_READ (self, value: int):
-        self.handler.KUKA_WriteVar("__PYTHON_HAS_READ", value)
+        self.handler.KUKA_WriteVar("__PYTHON_HAS_READ", value, PRIORITY_SAMPLING)
 
     ### ------------------------------------------------------------------- ###
 
-    def __try_get_data (self, name: str) -> bytes:
-        """Tries to read a variable via the C3 interface up to 10 times
+    def _run (self, steps: Steps, lock: Semaphore = None, done: Callable = None):
+        """Runs collection steps with the handler, in the calling thread
 
         Args:
-            name (str): The name of the variable to read
+            steps (Steps): The steps, see kuka.steps
+            lock (Semaphore, optional): Acquired at the start of each run. Defaults to None.
+            done (Callable, optional): Called at the end of each run. Defaults to None.
+
+        Returns:
+            The result of the steps
+        """
+
+        return run(steps, self.handler, lock, done)
+
+    ## Get data
+    def get_data (self) -> Tuple[np.ndarray, int, bool, int]:
+        """Collects the latest sample(s) made available by the Data collector sub
 
         Raises:
             Exception: The read operation failed 10 times in a row
 
         Returns:
-            bytes: The read data
+            Tuple[np.ndarray, int, bool, int]: The samples, write index, data available flag and PyDone flag
         """        
 
-        tries = 0
-        r: bytes = b''
-        while (r == b'' or r is None) and tries < 10:
-            r = self.handler.KUKA_ReadVar(name)
-            tries += 1
-        if (r == b'' or r is None):
-            raise Exception("Failed to read " + name)
-        return r
+        return self._run(self._get_data_steps())
+
+    def _get_data_steps (self) -> Steps:
+        """Steps of `get_data` : reads the array published by the sub up to
+        10 times, with the pending acknowledgement in the same burst
+        """
+
+        var = self._data_var
+        for _ in range(10):
+            r = (yield request("KUKA_ReadMany", [ var ], PRIORITY_SAMPLING, self._take_ack()))[0]
+            if r != b'' and r is not None:
+                return self.parse(r)
+        raise Exception("Failed to read " + var)
 
-    def __format_motor_value (self, motor: int):
-        """Converts the analog output reading to 7 columns boolean values
+    @property
+    def _data_var (self) -> str:
+        """The array in which the sub currently publishes the samples
+        """
+
+        return "__TAB_BLOCK[]" if self._block_size > 1 else "__TAB_1[]"
+
+    def parse (self, raw: bytes) -> Tuple[np.ndarray, int, bool, int]:
+        """Parses a raw reading of the array given by `_data_var`
 
         Args:
-            motor (int): The analog value
+            raw (bytes): The raw reading
 
         Returns:
-            List[int]: The 7 columns reprensenting the motor states
-        """        
+            Tuple[np.ndarray, int, bool, int]: The samples, write index, data available flag and PyDone flag
+        """
 
-        return [ (1 if i == motor else 0) for i in range(1,7) ]
+        if self._block_size > 1:
+            return self.parse_block(raw)
+        return self.parse_data(raw)
 
-    ## Get data
-    def get_data (self) -> Tuple[List[float|int], bool, int]:
-        """Collects the latest sample made available by the Data collector sub
+    def parse_block (self, raw: bytes) -> Tuple[np.ndarray, int, bool, int]:
+        """Parses a raw reading of `__TAB_BLOCK[]`
+
+        Args:
+            raw (bytes): The raw reading
 
         Raises:
-            Exception: "Incomplete Tab 1 !": Not all columns have been read
+            Exception: "Incomplete block !": Less samples than announced have been read
 
         Returns:
-            List[float|int]: The sample
-        """        
+            Tuple[np.ndarray, int, bool, int]: The samples laid out as in `__TAB_1`, one per row, 
+            the write index, data available flag and PyDone flag
+        """
+
+        try:
+            block = decode_array(raw)
+        except ValueError:
+            block = decode_array(b'')
 
-        r1: bytes = self.__try_get_data("__TAB_1[]")
-        raw = r1.split(b" ")[:-1]
-        if len(raw) != self.__TAB1_LEN:
+        count = int(block[self.__BLOCK_COUNT]) if len(block) > self.__BLOCK_HEADER else 0
+        sample_len = self._channels.sample_len
+        end = self.__BLOCK_HEADER + count * sample_len
+        if len(block) < max(end, self.__BLOCK_HEADER):
             print("Invaild raw data :", raw)
-            raise Exception("Incomplete Tab 1 !")
-        
-        TAB1 = [ float(raw[i]) for i in range(len(raw)) ]           # Bytes to float conversion
+            raise Exception("Incomplete block !")
 
-        data = [
-            TAB1[self.__TAB1_SAMPLE],                               # Sample time
-            *TAB1[self.__TAB1_DATA_START:self.__TAB1_DATA_END],     # Per-axis data
-            *self.__format_motor_value(TAB1[self.__TAB1_MOTOR]),    # Motor status columns
-            TAB1[self.__TAB1_SAMPLE_READ],                          # Queue Read 
-            TAB1[self.__TAB1_SAMPLE_WRITE],                         # Queue Write
-        ]
+        return (
+                block[self.__BLOCK_HEADER:end].reshape(count, sample_len),
+                int(block[self.__BLOCK_SAMPLE_WRITE]),
+                block[self.__BLOCK_DATA_AVAILABLE] == 1 and count > 0,
+                block[self.__BLOCK_DONE]
+                )
+
+    def parse_data (self, r1: bytes) -> Tuple[np.ndarray, int, bool, int]:
+        """Parses a raw reading of `__TAB_1[]`
+
+        Args:
+            r1 (bytes): The raw reading
+
+        Raises:
+            Exception: "Incomplete Tab 1 !": Not all columns have been read
+
+        Returns:
+            Tuple[np.ndarray, int, bool, int]: The sample as a single row, the write index, 
+            data available flag and PyDone flag
+        """
+
+        try:
+            TAB1 = decode_array(r1)                                 # Bytes to float conversion
+        except ValueError:
+            TAB1 = decode_array(b'')
+        if len(TAB1) != self.__TAB1_LEN:
+            print("Invaild raw data :", r1)
+            raise Exception("Incomplete Tab 1 !")
 
         return (
-                data, 
+                TAB1[None, :self._channels.sample_len],
+                int(TAB1[self.__TAB1_SAMPLE_WRITE]),
                 TAB1[self.__TAB1_DATA_AVAILABLE] == 1,              # Data available flag
-                TAB1[self.__TAB1_DONE]                        # PyDone status
+                TAB1[self.__TAB1_DONE]                              # PyDone status
                 )
 
     ## Reading function for the queue
-    def read (self, time_before, load: int = 0) -> Tuple[List[float|int], bool, int]:
-        """Reads a sample from the data collection sub
+    def read (self, time_before) -> Tuple[np.ndarray, int, float, bool, int]:
+        """Reads the available samples from the data collection sub
 
         Args:
             time_before (_type_): The time at which the latest successful read has occured (for latency calculation)
-            load (int, optional): The the class of the sample. Defaults to 0.
 
         Returns:
-            Tuple[List[float|int], bool, bool]: The read data, data available flag and PyDone flag
+            Tuple[np.ndarray, int, float, bool, int]: The read samples, write index, request time (ms),
+            data available flag and PyDone flag
         """        
 
-        data, data_available, done = self.get_data()
-        now = time()
-        data.append(load)                       # Load label
-        data.append(1 if load == 0 else 0)      # Faulty label
-        data.append(f'{self._speed}%')          # Speed Label
-        data.append((now - time_before) * 1000) # Request Time
-        return data, data_available, done
-        
+        samples, write, data_available, done = self.get_data()
+        return samples, write, (time() - time_before) * 1000, data_available, done
 
     def reset (self):
         """Resets the data collection sub
         """        
 
+        self._run(self._reset_steps())
+
+    def _reset_steps (self) -> Steps:
+        """Steps of `reset`
+        """
+
         self._read_done = False
         self._data_available = False
-        self.handler.KUKA_WriteVar("SAMPLE_NUMBER", 1)
-        self.handler.KUKA_WriteVar("SAMPLE_READ", 1)
-        self.handler.KUKA_WriteVar("__PyResetTimer", True)
+        yield request("KUKA_WriteMany", self._RESET_VALUES)
+
+        # $TIMER[1] restarts from 0 at the next reset of the sub
+        self.clock.reset()
                                        
     def init (self, A_iter: List[str], speed: str, sampling: str):
         """Prepares and starts data collection
@@ -214,28 +348,134 @@ class KUKA_DataReader:
             A_iter (List[str]): The number of iterations per axis
             speed (str): The speed for this run
             sampling (str): The sampling rate in ms
+
+        Raises:
+            Exception: The parameters could not be written, or the sub did not reset
         """        
 
-        self.rate = int(sampling)/1000
-        
-        # Writing parameters        
-        for i in range(1,7):
-            self.handler.KUKA_WriteVar(f'PyITER[{i}]', A_iter[i - 1])
+        self._run(self._init_steps(A_iter, speed, sampling))
+
+    def _init_steps (self, A_iter: List[str], speed: str, sampling: str) -> Steps:
+        """Steps of `init` : the run parameters, the reset handshake of the sub
+        and the start of the run
+        """
+
+        # Channels to sample, before the run starts
+        channels = self._dosysvar and (yield request("KUKA_WriteMany", { "ColCHANNELS": self.channels.mask }))
+
+        # Writing parameters
+        if not (yield request("KUKA_WriteMany", self._init_values(A_iter, speed, sampling))):
+            raise Exception("Failed to write the run parameters to " + self.handler.ipAddress)
 
-        self.handler.KUKA_WriteVar('PySPEED', speed)
+        if self._dosysvar:
+            # Block transfer, if the sub supports it
+            blocks = self.block_mode and (yield request("KUKA_WriteMany", { "ColBLOCK_SIZE": 1 }))
+            self._sysvar_setup(blocks, (yield request("KUKA_ReadVar", "ColBUFFER_SIZE")), channels)
+
+            # Waiting for the sub to handle the reset
+            yield from self._wait_steps(list(self._RESET_DONE), self._reset_done, self.reset_timeout)
+            yield request("KUKA_SyncClock", self.clock, self.clock_probes, PRIORITY_SAMPLING)
+
+        yield request("KUKA_WriteMany", self._start_values())
+
+    def _init_values (self, A_iter: List[str], speed: str, sampling: str) -> dict:
+        """Gives the parameters to write before a run
+
+        Args:
+            A_iter (List[str]): The number of iterations per axis
+            speed (str): The speed for this run
+            sampling (str): The sampling rate in ms
+
+        Returns:
+            dict: The variables to write and their values, in order
+        """
+
+        self.rate = int(sampling)/1000
         self._speed = int(speed)
+
+        values = { f'PyITER[{i}]': A_iter[i - 1] for i in range(1,7) }
+        values['PySPEED'] = speed
         if self._dosysvar:
-            self.handler.KUKA_WriteVar('ColSAMPLING', sampling)
-            # Waiting for Reset
-            self.handler.KUKA_WriteVar('ColRESET', True)
-            sleep(0.1)
-            while not self.handler.KUKA_ReadVar('ColRESET_DONE'):
-                sleep(0.2)
-            sleep(0.5)
-            self.handler.KUKA_WriteVar('ColRUN', True)
-        
-        self.handler.KUKA_WriteVar('PyRUN', True)
-        sleep(0.1)
+            values['ColSAMPLING'] = sampling
+            values['ColRESET'] = True
+        return values
+
+    def _sysvar_setup (self, blocks: bool, buffer_size: bytes, channels: bool):
+        """Stores the capabilities of the sub for the next run
+
+        Args:
+            blocks (bool): ColBLOCK_SIZE could be written
+            buffer_size (bytes): The raw reading of ColBUFFER_SIZE
+            channels (bool): ColCHANNELS could be written
+        """
+
+        if channels:
+            self._channels = self.channels
+        else:
+            self._channels = ChannelSet()
+            if self.channels.mask != CHANNELS_ALL:
+                print(f"{self.handler.ipAddress} does not support channel selection, collecting all the channels")
+
+        self._blocks = bool(blocks)
+        self._block_size = 1
+        try:
+            self._buffer_size = int(buffer_size)
+        except (TypeError, ValueError):
+            self._buffer_size = KUKA_DataReader._buffer_size
+
+    def _reset_done (self, values: list) -> bool:
+        """Checks that the sub has handled ColRESET
+        """
+
+        return values == list(self._RESET_DONE.values())
+
+    def _sysvar_done (self, done: int) -> int:
+        """Filters the done flag of the sub. Until the sub publishes a sample
+        of this run, its flag can still report the reset state as done.
+
+        Args:
+            done (int): The done flag read with the samples
+
+        Returns:
+            int: The done flag, 0 while nothing has been published yet
+        """
+
+        if done == 1 and not self._data_available and len(self._store) == 0:
+            return 0
+        return done
+
+    def _done (self, values: list) -> bool:
+        """Checks that the robot program has ended (PyDONE)
+        """
+
+        return values[0] == True
+
+    def _start_values (self) -> dict:
+        """Gives the values to write to start a run
+
+        Returns:
+            dict: The variables to write and their values, in order
+        """
+
+        values = { 'ColRUN': True } if self._dosysvar else {}
+        values['PyRUN'] = True
+        return values
+
+    def _wait_steps (self, vars: List[str], predicate: Callable[[list], bool], timeout: float) -> Steps:
+        """Waits until the values of variables match a predicate, using the
+        watcher of the handler
+
+        Args:
+            vars (List[str]): The variables to watch
+            predicate (Callable[[list], bool]): Checks the values, given in the order of `vars`
+            timeout (float): The longest time to wait, in seconds
+
+        Raises:
+            TimeoutError: The predicate is still false after `timeout`
+        """
+
+        if not (yield request("KUKA_WaitFor", vars, predicate, timeout)):
+            raise TimeoutError(f"Timed out waiting for {', '.join(vars)} on {self.handler.ipAddress}")
 
     def run_sysvar (
             self, 
@@ -251,14 +491,14 @@ class KUKA_DataReader:
         Returns:
             pd.DataFrame: The collected data 
         """               
-        
-        # Indexes of control data in the raw readings
-        __SAMPLE_READ_INDEX = -6
-        __SAMPLE_WRITE_INDEX = -5
-        __SAMPLE_LATENCY = -1
 
-        # Buffers
-        frames = []
+        return self._run(self._sysvar_steps(next, load))
+
+    def _sysvar_steps (self, next: Callable[[float, int, int], None] = None, load: int = -1) -> Steps:
+        """Steps of `run_sysvar`
+        """
+        
+        self._sysvar_begin(load)
         
         # Time data to calculate latency
         now = time()
@@ -266,51 +506,418 @@ class KUKA_DataReader:
         # Flag indicating the state of the collection
         self._read_done = False
         trace_stoped = False
+
+        # Start of the current network outage or stall
+        lost_since = None
         
         while self._read_done != 1 :
             
-            # Getting our sample
-            data, self._data_available, self._read_done = self.read(now, load)
-            if self._read_done == 2 and not(trace_stoped): # stop de trace if robot movement done
+            # Getting our samples, resuming the collection if the connection was lost
+            try:
+                if self.scheduler.wants_keeping_up():
+                    self.scheduler.observe_keeping_up((yield request("KUKA_ReadVar", "ColKEEPING_UP", PRIORITY_SAMPLING)))
+                sent = time()
+                samples, write, self._data_available, done = yield from self._get_data_steps()
+                latency = (time() - now) * 1000
+                self.scheduler.observe_read(sent, time())
+                self._read_done = self._sysvar_done(done)
+            except Exception as e:
+                lost_since = lost_since or time()
+                yield from self._resume_steps(e, lost_since)
+                continue
+
+            if self._read_done in (1, 2) and not(trace_stoped): # stop de trace if robot movement done, samples pending or not
                 trace_stoped = True
-                self.trace.Trace_Stop()
+                yield call(self.trace.Trace_Stop)
             
             # Checking if some data is available
             if (self._data_available):
                 
-                # Getting the last sample number. Defaults to 0 which does not exist in KRL
-                before = 0 if len(frames) == 0 else frames[-1][__SAMPLE_READ_INDEX]
-
-                # Getting the current sample number. Starts at 1
-                after = data[__SAMPLE_READ_INDEX]
-
                 # Ignore duplicates
-                if before == after:
-                    sleep(self.rate)
+                samples = self._sysvar_new(samples)
+                if len(samples) == 0:
+                    # The same sample for too long : our acknowledgement may have been lost
+                    lost_since = lost_since or time()
+                    if time() - lost_since > self.stall_timeout:
+                        yield from self._resume_steps(Exception("Collection stalled"), lost_since)
+                    yield pause(self.scheduler.next_delay(self._backlog, 0))
                     continue
+                lost_since = None
                 
-                # Indicating to the sub that we read the sample
-                self.HAS_READ = after
+                # Indicating to the sub that we read the samples, and how many to send next
+                yield from self._send_ack_steps(self._sysvar_ack(samples, write))
                 
                 # Resetting the current time to measure the next request delay
                 now = time()
                 
-                # Storing the currently measured data
-                frames.append(data)
-
-                # Callback to give a visual feedback on current data collection
-                if next is not None:
-                    next(data[__SAMPLE_LATENCY], data[__SAMPLE_READ_INDEX], data[__SAMPLE_WRITE_INDEX])
+                self._sysvar_store(samples, write, latency, next)
             
-                # Sleeping not to slow down KRL
-                sleep(self.rate/2)
+                # Polling again at once while samples are waiting, or when the next one is due
+                delay = self.scheduler.next_delay(self._backlog, len(samples))
 
             else:
-                # Sleeping to wait for the next data to be sampled
-                sleep(self.rate/2)
+                # Waiting for the next data to be sampled
+                delay = self.scheduler.next_delay(0, 0)
+
+            # The sub gets our acknowledgement while we sleep. The pause is
+            # yielded even without delay, for the other robots of the event loop
+            if delay > 0:
+                yield from self._post_ack_steps()
+            yield pause(delay)
         
-        # Creating a data frame
-        return pd.DataFrame(frames, columns=self._columns)
+        yield request("KUKA_SyncClock", self.clock, self.clock_probes, PRIORITY_SAMPLING)
+        return self._sysvar_end()
+
+    def run_sysvar_drain (
+            self,
+            next: Callable[[float, int, int], None] = None,
+            load: int = -1
+        ) -> pd.DataFrame:
+        """Runs data collection using system variables, reading the buffers
+        of the sub in bulk instead of sample by sample
+
+        Args:
+            next (Callable[[float, int, int], None], optional): A function used to update the user interface in order to show the current progress. Defaults to None.
+            load (int, optional): The class of the sample. Defaults to -1.
+
+        Returns:
+            pd.DataFrame: The collected data
+        """
+
+        return self._run(self._drain_steps(next, load))
+
+    def _drain_steps (self, next: Callable[[float, int, int], None] = None, load: int = -1) -> Steps:
+        """Steps of `run_sysvar_drain`
+        """
+
+        self._sysvar_begin(load)
+
+        while True:
+            yield pause(self.drain_period)
+
+            # ColRUN first : no sample is written after it is seen FALSE
+            running, write, keeping_up = yield request("KUKA_ReadMany", ["ColRUN", "SAMPLE_NUMBER", "ColKEEPING_UP"], PRIORITY_SAMPLING, self._take_ack())
+            self.scheduler.observe_keeping_up(keeping_up)
+            first, count = self._drain_pending(running, write)
+            if count is None:
+                continue
+
+            if running != True:
+                yield call(self.trace.Trace_Stop)
+
+            for chunk_first, chunk_count in self._drain_chunks(first, count):
+                now = time()
+                vars = self._drain_vars(chunk_first, chunk_count)
+                for _ in range(10):
+                    values = yield request("KUKA_ReadMany", vars, PRIORITY_SAMPLING, self._take_ack())
+                    if self._drain_complete(values):
+                        break
+                else:
+                    raise Exception(f"Failed to read the samples {chunk_first} to {chunk_first + chunk_count - 1}")
+
+                if not self._drain_store(values, chunk_first, chunk_count, int(write), now, next):
+                    # The sub lapped the chunk while it was read : the samples
+                    # up to the write index of the poll are lost
+                    self.losses.overrun()
+                    self._drain_skip(int(write), int(write))
+                    break
+                # Sent with the next reading
+                self._ack = { "__PYTHON_HAS_READ": self._acked }
+
+            if running != True:
+                yield from self._post_ack_steps()
+                yield request("KUKA_SyncClock", self.clock, self.clock_probes, PRIORITY_SAMPLING)
+                return self._sysvar_end()
+
+    def _drain_pending (self, running, write) -> Tuple[int, int | None]:
+        """Gives the samples to drain after a progress poll
+
+        Args:
+            running: The reading of ColRUN
+            write: The reading of SAMPLE_NUMBER, the next index written by the sub
+
+        Returns:
+            Tuple[int, int | None]: The first index and the number of samples to drain. None if it is not time to drain
+        """
+
+        if running not in (True, False) or not write:
+            return 0, None
+
+        if self.losses.poll(self._acked, int(write)) > 0:
+            # The sub wrote over the samples waiting since the last poll. While
+            # it runs, it keeps writing over them : they are dropped. Once it
+            # stopped, the latest samples of the buffer are read
+            self._drain_skip(int(write) + 1 if running == False else int(write), int(write))
+
+        first = self._acked % self._buffer_size + 1
+        count = (int(write) - first) % self._buffer_size
+        if running and count < self.drain_threshold * self._buffer_size:
+            return first, None
+        return first, count
+
+    def _drain_skip (self, first: int, write: int):
+        """Drops the samples waiting before an index of the sub buffer
+
+        Args:
+            first (int): The index of the next sample to drain
+            write (int): The write index of the sub buffer (Queue Write)
+        """
+
+        self._acked = (first - 2) % self._buffer_size + 1
+        self.losses.skip(self._acked, write)
+
+    def _drain_chunks (self, first: int, count: int):
+        """Splits the samples to drain into chunks, wrapping around the buffer
+
+        Yields:
+            Tuple[int, int]: The first index and the number of samples of each chunk
+        """
+
+        while count > 0:
+            chunk = min(count, self.drain_chunk, self._buffer_size - first + 1)
+            yield first, chunk
+            first = first + chunk if first + chunk <= self._buffer_size else 1
+            count -= chunk
+
+    def _drain_vars (self, first: int, count: int) -> List[str]:
+        """Gives the variables to read to drain samples
+
+        Args:
+            first (int): The first sample index
+            count (int): The number of samples
+
+        Returns:
+            List[str]: The variables, sample by sample
+        """
+
+        buffers = self._channels.buffers
+        return [ f"{buffer}[{i}]" for i in range(first, first + count) for buffer in buffers ]
+
+    def _drain_complete (self, values: list) -> bool:
+        """Checks that all the variables of a chunk have been read
+        """
+
+        return all(isinstance(v, bytes) and v != b'' for v in values)
+
+    def _drain_store (self, values: list, first: int, count: int, write: int, time_before, next: Callable[[float, int, int], None] = None) -> bool:
+        """Rebuilds drained samples and stores them, if the sub did not write
+        over them while they were read
+
+        Args:
+            values (list): The readings of the variables given by `_drain_vars`
+            first (int): The first sample index
+            count (int): The number of samples
+            write (int): The write index of the sub buffer (Queue Write)
+            time_before (_type_): The time the chunk was requested at
+            next (Callable[[float, int, int], None], optional): The progress callback. Defaults to None.
+
+        Returns:
+            bool: The samples were stored, their ColBUFFER_TIME following the previous samples
+        """
+
+        def real (raw) -> float:
+            value = decode_real(raw) if isinstance(raw, bytes) else None
+            return np.nan if value is None else value
+
+        def axis (raw) -> np.ndarray:
+            try:
+                return decode_axis(raw, AXIS_FIELDS)
+            except ValueError:
+                return np.full(len(AXIS_FIELDS), np.nan)
+
+        # Samples laid out as published by the sub : time, the values of each
+        # axis, analog output and index
+        channels = self._channels
+        structs = len(channels.axis_buffers)
+        width = len(channels.buffers)
+        rows = np.empty((count, channels.sample_len))
+        for k in range(count):
+            sample_time, *per_axis, analog = values[k * width:(k + 1) * width]
+            axes = rows[k, 1:channels.motor].reshape(6, len(channels.names))
+            for c in range(structs):
+                axes[:, c] = axis(per_axis[c])
+            axes[:, structs:] = np.reshape([ real(v) for v in per_axis[structs:] ], (6, -1))
+            rows[k, 0] = real(sample_time)
+            rows[k, channels.motor] = real(analog)
+        rows[:, channels.read] = np.arange(first, first + count)
+
+        if not self.losses.follows(rows[:, 0]):
+            return False
+
+        self._sysvar_store(rows, write, (time() - time_before) * 1000, next)
+        self._acked = first + count - 1
+        return True
+
+    def _sysvar_begin (self, load: int = -1):
+        """Prepares the buffers of a system variables collection
+
+        Args:
+            load (int, optional): The class of the samples. Defaults to -1.
+        """
+
+        self._store.begin(load, self._speed, self._channels)
+        self._store.clock = self.clock
+        self.scheduler.begin(self.rate, self._buffer_size)
+        self.losses.begin(self.rate, self._buffer_size)
+        self._acked = 0
+        self._backlog = 0
+        self._ack = {}
+
+    def _resume_steps (self, error: Exception, since: float) -> Steps:
+        """Waits for the connection to come back after a failed read, then
+        makes sure that the sub knows the last sample acknowledged by Python,
+        so that the collection resumes from the next one.
+
+        Args:
+            error (Exception): The error which interrupted the collection
+            since (float): The time at which the collection was interrupted
+
+        Raises:
+            Exception: `error`, if the collection could not resume within `resume_timeout`
+        """
+
+        if time() - since > self.resume_timeout:
+            raise error
+
+        print(f"Collection from {self.handler.ipAddress} interrupted ({error}), resuming after sample {self._acked}")
+        yield pause(min(1, max(self.rate, time() - since)))
+        self._ack = {}
+
+        has_read = yield request("KUKA_ReadVar", "__PYTHON_HAS_READ", PRIORITY_SAMPLING)
+        if has_read is None or has_read is False or has_read == b'':
+            return
+        if int(has_read) != self._acked:
+            yield request("KUKA_WriteVar", "__PYTHON_HAS_READ", self._acked, PRIORITY_SAMPLING)
+
+    def _sysvar_new (self, samples: np.ndarray) -> np.ndarray:
+        """Keeps the samples following the last stored one. The sub sends its
+        buffer in order, so anything else is a duplicate or a stale reading.
+
+        Args:
+            samples (np.ndarray): The samples, one per row
+
+        Returns:
+            np.ndarray: The samples not stored yet
+        """
+
+        # Getting the last sample number. Defaults to 0 which does not exist in KRL
+        last = self._store.last_read
+
+        new = []
+        for i, index in enumerate(samples[:, self._channels.read]):
+            # Sample numbers start at 1 and wrap around the buffer
+            if index == last % self._buffer_size + 1:
+                new.append(i)
+                last = index
+        return samples[new]
+
+    def _sysvar_ack (self, samples: np.ndarray, write: int) -> dict:
+        """Gives the values acknowledging the samples. Blocks are used while
+        several samples are waiting in the sub buffer, and are as large as
+        possible so that the sub can add the new samples to the current one
+        until it gets the acknowledgement.
+
+        Args:
+            samples (np.ndarray): The read samples, one per row
+            write (int): The write index of the sub buffer
+
+        Returns:
+            dict: The variables to write
+        """
+
+        self._acked = int(samples[-1, self._channels.read])
+        self._backlog = (write - self._acked - 1) % self._buffer_size
+
+        values = {}
+        if self._blocks:
+            block_size = self._channels.block_samples if self._backlog > 1 else 1
+            if block_size != self._block_size:
+                values["ColBLOCK_SIZE"] = block_size
+                self._block_size = block_size
+        values["__PYTHON_HAS_READ"] = self._acked
+        return values
+
+    def _send_ack_steps (self, values: dict) -> Steps:
+        """Acknowledges samples, at once or with the next reading
+
+        Args:
+            values (dict): The variables to write, given by `_sysvar_ack`
+        """
+
+        if self.write_behind:
+            # Only the latest acknowledgement matters : it covers all the previous samples
+            self._ack = values
+        else:
+            yield request("KUKA_WriteMany", values, PRIORITY_SAMPLING)
+
+    def _take_ack (self) -> dict:
+        """Gives the acknowledgement to send with the next reading
+
+        Returns:
+            dict: The variables to write, empty if there are none
+        """
+
+        values, self._ack = self._ack, {}
+        return values
+
+    def _post_ack_steps (self) -> Steps:
+        """Sends the pending acknowledgement without waiting for its response
+        """
+
+        if self._ack:
+            yield request("KUKA_WriteMany", self._take_ack(), PRIORITY_SAMPLING, False)
+
+    def _sysvar_store (self, samples: np.ndarray, write: int, latency: float, next: Callable[[float, int, int], None] = None):
+        """Stores samples and gives a visual feedback on the collection
+
+        Args:
+            samples (np.ndarray): The samples, one per row
+            write (int): The write index of the sub buffer (Queue Write)
+            latency (float): The request time of the samples, in ms
+            next (Callable[[float, int, int], None], optional): The progress callback. Defaults to None.
+        """
+
+        # Storing the currently measured data, with the samples missing before them
+        self.scheduler.observe_samples(samples[:, TAB1_SAMPLE])
+        gaps = self.losses.check(
+            samples[:, TAB1_SAMPLE], int(samples[-1, self._channels.read]), write,
+            self.scheduler.keeping_up, self.scheduler.median_period
+        )
+        self._store.extend(samples, write, latency, gaps)
+        if self.stream is not None and self.stream.due(self._store.unflushed):
+            self._sysvar_flush()
+
+        # Callback to give a visual feedback on current data collection
+        if next is not None:
+            for index in samples[:, self._channels.read]:
+                next(latency, int(index), write)
+
+    def _report_losses (self):
+        """Prints the samples lost during the run, if any
+        """
+
+        losses = self.losses.summary()
+        if losses["lost"] > 0:
+            print(f"{self.handler.ipAddress} lost {losses['lost']} samples ({losses['lost_ratio']:.2%}) in {losses['gaps']} gaps, {losses['overruns']} buffer overruns")
+
+    def _sysvar_flush (self):
+        """Writes the samples not streamed yet to `stream`
+        """
+
+        self.stream.write(self._store.flush())
+        if not self.keep_streamed:
+            self._store.discard()
+
+    def _sysvar_end (self) -> pd.DataFrame:
+        """Builds the result of a system variables collection
+
+        Returns:
+            pd.DataFrame: The collected data
+        """
+
+        if self.stream is not None:
+            self._sysvar_flush()
+        return self._store.frame()
     
     def get_trace_data (
             self, 
@@ -318,7 +925,8 @@ class KUKA_DataReader:
             load: int,
             sampling: int,
             dir: str = ".\\temp",
-            sampling_offset: int = 0
+            sampling_offset: int = 0,
+            name: str = None
         ) -> Tuple[pd.DataFrame, int]:
         """Gets the Kuka Trace data
 
@@ -328,12 +936,13 @@ class KUKA_DataReader:
             sampling (int): The sampling rate of the Kuka Trace
             dir (str, optional): The folder in which to store the files to process. Defaults to ".\temp".
             sampling_offset (int, optional): The index of the first sample. Defaults to 0.
+            name (str, optional): The name of the trace. Defaults to None (the last configured one).
 
         Returns:
             Tuple[pd.DataFrame, int]: The collected data and the number of samples
         """        
 
-        data_trace = self.trace.Trace_Download()
+        data_trace = self.trace.Trace_Download(name)
         
         dataset_length = len(data_trace['Sample_time'])
         data_trace['Speed'] = [int(speed)] * dataset_length
@@ -352,32 +961,40 @@ class KUKA_DataReader:
         return pd.DataFrame(data_trace)
     
     def run_single_speed (self, A_iter, speed, sampling, next, done, load, lock, now, trace_config, trace_sampling, temp_dir, trace_offset):
+        return self._run(
+            self._run_steps(A_iter, speed, sampling, next, load, now, trace_config, trace_sampling, temp_dir, trace_offset),
+            lock, done
+        )
+
+    def _run_steps (self, A_iter, speed, sampling, next, load, now, trace_config, trace_sampling, temp_dir, trace_offset) -> Steps:
+        """Steps of `run_single_speed`
+        """
+
         # Sync with other robots
-        if lock is not None:
-            lock.acquire()
+        yield run_start()
         
         # Print current speed to the terminal    
         print(f"Run with speed {speed}")
         
-        cell = self.handler.ipAddress.split(".")[3][-1]
-        file_name = now + f"[{speed}]_R{cell}"
+        file_name = now + f"[{speed}]_R{self._cell()}"
         
         # KUKA Trace setup
         self.tracing = False
         if self._dotrace:
-            self.trace.Trace_Config([ file_name, trace_config , "600" ])
-            self.tracing = self.trace.Trace_Start()
+            yield call(self.trace.Trace_Config, [ file_name, trace_config , "600" ])
+            self.tracing = yield call(self.trace.Trace_Start)
             if self.tracing:
                 print("Trace start for " + self.handler.ipAddress)
             else:
                 print("Could not start trace for " + self.handler.ipAddress)
         
         # Robot init and launch
-        self.init(A_iter, speed, sampling)
+        yield from self._init_steps(A_iter, speed, sampling)
         
         # KRL System Variables collection
         if self._dosysvar :
-            data_vars = self.run_sysvar(next, load) 
+            data_vars = yield from (self._drain_steps(next, load) if self.drain else self._sysvar_steps(next, load))
+            self._report_losses()
         else:
             data_vars = None
         
@@ -386,17 +1003,19 @@ class KUKA_DataReader:
         if self._dotrace:
             if not self._dosysvar :
                 # check PyDONE robot variable to stop the trace, as it is done in sysvar collection method
-                sleep(1)
-                while self.PyDONE !=True:
-                    sleep(0.1)
-                self.trace.Trace_Stop()
-            if self.tracing:
-                sleep(1)
-                data_trace = self.get_trace_data(speed, load, trace_sampling, temp_dir, trace_offset)
+                yield request("KUKA_WaitFor", ["PyDONE"], self._done)
+                yield call(self.trace.Trace_Stop)
+            if self.tracing and self._pipelined:
+                # The next run can start once the trace is written, while it is downloaded
+                if not (yield call(self.trace.Trace_WaitWritten)):
+                    print(f"The trace of {self.handler.ipAddress} is still being written")
+                yield call(self._traces.submit, speed, load, trace_sampling, temp_dir, trace_offset, self.trace.name)
+            elif self.tracing:
+                yield pause(1)
+                data_trace = yield call(self.get_trace_data, speed, load, trace_sampling, temp_dir, trace_offset)
         
         # Indicating that this run is done
-        if done is not None:
-            done()
+        yield run_end()
         
         # Returning the two collected DataFrames
         return data_vars, data_trace
@@ -429,29 +1048,43 @@ class KUKA_DataReader:
         Returns:
             Tuple[pd.DataFrame, pd.DataFrame]: The system variables Dataframe and the Kuka Trace DataFrame
         """
+
+        return self._run(self._acquire_steps(A_iter, speed, sampling, trace_config, next, load, temp_dir), lock, done)
+
+    def _acquire_steps (self, A_iter, speed, sampling, trace_config, next, load, temp_dir) -> Steps:
+        """Steps of `acquire`
+        """
         
         # Reset the sub
-        self.reset()
+        yield from self._reset_steps()
 
         # Using current date as a unique file name for the Kuka Traces
         now = datetime.now(tz=TZ).strftime("%Y-%m-%d_%H-%M-%S")
 
         # Making sure that Kuka Trace is stopped
-        self.trace.Trace_Stop()
+        yield call(self.trace.Trace_Stop)
 
         # Getting the Kuka Trace sampling rate from the file name
         trace_sampling = int(trace_config.split("_")[0])
 
+        # Background download of the Kuka Traces
+        if self._pipelined:
+            if self._traces is None:
+                self._traces = TracePipeline(self.get_trace_data, self.trace_workers, self.trace_queue)
+            self._traces.export = self.trace_export
+            self._traces.keep = self.trace_export is None or self.keep_exported
+            self._traces.begin()
+
         ## ---- Run for a single speed ---- ##
         if type(speed) == str or type(speed) == int:
-            return self.run_single_speed(A_iter, speed, sampling, next, done, load, lock, now, trace_config, trace_sampling, temp_dir, 0)
+            data_sysvar, data_trace = yield from self._run_steps(A_iter, speed, sampling, next, load, now, trace_config, trace_sampling, temp_dir, 0)
+            if self._pipelined:
+                traces = yield call(self._traces.results)
+                data_trace = traces[0] if traces else None
+            return data_sysvar, data_trace
 
         ## ---- Run for multiple speeds ---- ##
 
-        start = speed.start if speed.start is not None else 20
-        step = speed.step if speed.step is not None else 10
-        stop = speed.stop if speed.stop is not None else start
-       
         # Buffers 
         sysvar_dataframes = []
         trace_dataframes = []
@@ -459,11 +1092,11 @@ class KUKA_DataReader:
         data_sysvar : pd.DataFrame = None
         data_trace : pd.DataFrame = None
         
-        while start <= stop:
-            data_sysvar, data_trace = self.run_single_speed(A_iter, start, sampling, next, done, load, lock, now, trace_config, trace_sampling, temp_dir, trace_offset)
+        for s in self._speeds(speed):
+            data_sysvar, data_trace = yield from self._run_steps(A_iter, s, sampling, next, load, now, trace_config, trace_sampling, temp_dir, trace_offset)
             
-            # KUKA Trace
-            if self.tracing and self._dotrace:
+            # KUKA Trace, unless it is being downloaded in the background
+            if self.tracing and self._dotrace and not self._pipelined:
                 # Updating the offset
                 trace_offset += data_trace.shape[0]
 
@@ -473,17 +1106,72 @@ class KUKA_DataReader:
             # Storing the resulting DataFrame in the buffer
             if self._dosysvar:
                 sysvar_dataframes.append(data_sysvar)  
-            start += step 
 
-        # Merging the results for each speed into one monolithic DataFrame for each method
+        # Waiting for the traces still being downloaded
+        if self._pipelined:
+            trace_dataframes = yield call(self._traces.results)
+
+        return self._merge(sysvar_dataframes, trace_dataframes, trace_sampling)
+
+    def _cell (self) -> str:
+        """The number of the cell, in the Kuka Trace names. Without a cell
+        registry, the last digit of the robot IP
+        """
+
+        if self.handler.cell is not None:
+            return str(self.handler.cell)
+        return self.handler.ipAddress.split(".")[3][-1]
+
+    @property
+    def _pipelined (self) -> bool:
+        """The Kuka Traces are downloaded in the background, see `trace_workers`
+        """
+
+        return self._dotrace and self.trace_workers > 0
+
+    def _speeds (self, speed: slice) -> List[int]:
+        """Lists the speeds of a multiple speeds acquisition
+
+        Args:
+            speed (slice): The speed range
+
+        Returns:
+            List[int]: The speed of each run
+        """
+
+        start = speed.start if speed.start is not None else 20
+        step = speed.step if speed.step is not None else 10
+        stop = speed.stop if speed.stop is not None else start
+
+        return list(range(start, stop + 1, step))
+
+    def _merge (
+            self, 
+            sysvar_dataframes: List[pd.DataFrame], 
+            trace_dataframes: List[pd.DataFrame], 
+            trace_sampling: int
+        ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Merges the results for each speed into one monolithic DataFrame for each method
+
+        Args:
+            sysvar_dataframes (List[pd.DataFrame]): The system variables DataFrame of each run
+            trace_dataframes (List[pd.DataFrame]): The Kuka Trace DataFrame of each run, None if missing
+            trace_sampling (int): The Kuka Trace sampling rate in ms
+
+        Returns:
+            Tuple[pd.DataFrame, pd.DataFrame]: The system variables Dataframe and the Kuka Trace DataFrame
+        """
+
         if self._dosysvar:
-            sys_data = pd.concat(sysvar_dataframes)
+            sys_data = concat(sysvar_dataframes)
         else:
             sys_data = None
-        if self._dotrace:
+        # The failed or freed traces are missing
+        trace_dataframes = [ df for df in trace_dataframes if df is not None ]
+        if self._dotrace and trace_dataframes:
             trace_data = pd.concat(trace_dataframes)
             trace_data["Sample_time"] = np.arange(len(trace_data["Sample_time"])) * (trace_sampling / 1000)
         else:
             trace_data = None
 
-        return sys_data, trace_data 
\ No newline at end of file
+        return sys_data, trace_data
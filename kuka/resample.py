@@ -0,0 +1,170 @@
+'''
+Resampling of the Kuka Trace modules on a common time base.
+
+The modules of a trace are sampled at different rates (KRCIpo every 12 ms,
+the NextGenDrive modules every 4 ms or less), not always multiples of each
+other. Each channel is resampled on the time base of the fastest module :
+
+- "linear" interpolates between the two neighbouring samples,
+- "hold" keeps the last sample (zero-order hold), for the digital values
+  like AnalogOut,
+- "polyphase" uses a windowed sinc filter, low-pass when downsampling. The
+  ratio of the periods is approximated by a fraction L / M, and the filter
+  is computed once for each of the L phases.
+
+Every method runs in NumPy, in time proportional to the number of output
+samples. A sample is taken at time i * period, and the last sample of a
+channel is held after its end.
+'''
+
+from fractions import Fraction
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+METHOD_LINEAR = "linear"
+METHOD_HOLD = "hold"
+METHOD_POLYPHASE = "polyphase"
+
+METHODS = (METHOD_LINEAR, METHOD_HOLD, METHOD_POLYPHASE)
+
+def output_length (length: int, period: float, target: float) -> int:
+    """Gives the number of samples covering a channel once resampled
+
+    Args:
+        length (int): The number of samples of the channel
+        period (float): The sampling period of the channel
+        target (float): The sampling period of the output
+
+    Returns:
+        int: The number of output samples, length * period / target rounded down
+    """
+
+    return int(np.floor(length * period / target + 1e-9))
+
+def resample (
+        values: np.ndarray,
+        period: float,
+        target: float,
+        length: int = None,
+        method: str = METHOD_LINEAR,
+        taps: int = 16,
+        max_denominator: int = 1000
+    ) -> np.ndarray:
+    """Resamples a channel
+
+    Args:
+        values (np.ndarray): The samples
+        period (float): Their sampling period
+        target (float): The sampling period of the output
+        length (int, optional): The number of output samples. Defaults to None (all the samples covered by the channel).
+        method (str, optional): "linear", "hold" or "polyphase". Defaults to "linear".
+        taps (int, optional): The length of the polyphase filter, in input samples. Defaults to 16.
+        max_denominator (int, optional): The largest L of the polyphase ratio. Defaults to 1000.
+
+    Raises:
+        ValueError: Unknown method, or invalid periods
+
+    Returns:
+        np.ndarray: The resampled channel
+    """
+
+    if method not in METHODS:
+        raise ValueError(f"Unknown resampling method : {method}")
+    if not period > 0 or not target > 0:
+        raise ValueError(f"Invalid sampling periods : {period}, {target}")
+
+    values = np.asarray(values, dtype=np.float64)
+    if length is None:
+        length = output_length(len(values), period, target)
+    if length <= 0:
+        return np.zeros(0)
+    if len(values) == 0:
+        return np.full(length, np.nan)
+
+    # Same rate : nothing to compute
+    if abs(period - target) <= 1e-9 * period:
+        return _hold_end(values, length)
+
+    if method == METHOD_POLYPHASE:
+        return _polyphase(values, Fraction(target / period).limit_denominator(max_denominator), length, taps)
+
+    # Integer upsampling : each sample repeated
+    ratio = round(period / target)
+    if method == METHOD_HOLD and ratio > 1 and abs(period / target - ratio) <= 1e-9 * ratio:
+        return _hold_end(np.repeat(values, ratio), length)
+
+    # Positions of the output samples, in input samples
+    positions = np.arange(length) * (target / period)
+
+    if method == METHOD_HOLD:
+        index = np.floor(positions + 1e-9).astype(np.int64)
+        return values[np.minimum(index, len(values) - 1)]
+
+    return np.interp(positions, np.arange(len(values)), values)
+
+def _hold_end (values: np.ndarray, length: int) -> np.ndarray:
+    # Cuts the samples, or holds the last one, to the output length
+    if len(values) >= length:
+        return values[:length]
+    return np.concatenate([ values, np.full(length - len(values), values[-1]) ])
+
+def _polyphase (values: np.ndarray, step: Fraction, length: int, taps: int) -> np.ndarray:
+    # Output sample k is at input position k * M / L : its integer part, and
+    # its phase, the fraction in 1 / L
+    L, M = step.denominator, step.numerator
+    k = np.arange(length, dtype=np.int64)
+    base = (k * M) // L
+    phase = (k * M) % L
+
+    # Windowed sinc filter of each phase, its cutoff lowered when downsampling
+    half = max(1, taps // 2)
+    offsets = np.arange(-half + 1, half + 1)
+    cutoff = min(1.0, L / M)
+    distance = np.arange(L)[:, None] / L - offsets[None, :]
+    window = np.i0(5.0 * np.sqrt(np.clip(1 - (distance / half) ** 2, 0, None))) / np.i0(5.0)
+    weights = cutoff * np.sinc(cutoff * distance) * window
+    weights /= weights.sum(axis=1, keepdims=True)
+
+    # The first and last samples are held around the channel
+    padded = np.pad(values, (half, max(half, int(base[-1]) + half + 1 - len(values))), mode="edge")
+
+    out = np.zeros(length)
+    for i, offset in enumerate(offsets):
+        out += padded[base + offset + half] * weights[phase, i]
+    return out
+
+def align (
+        modules: List[Tuple[float, Dict[str, np.ndarray]]],
+        methods: Dict[str, str] = None,
+        default: str = METHOD_LINEAR,
+        period: float = None
+    ) -> Tuple[float, Dict[str, np.ndarray]]:
+    """Resamples the channels of several modules on a common time base, as long as the shortest module
+
+    Args:
+        modules (List[Tuple[float, Dict[str, np.ndarray]]]): The sampling period and channels of each module
+        methods (Dict[str, str], optional): The method of the channels containing each key. Defaults to None.
+        default (str, optional): The method of the other channels. Defaults to "linear".
+        period (float, optional): The period of the time base. Defaults to None (the period of the fastest module).
+
+    Returns:
+        Tuple[float, Dict[str, np.ndarray]]: The period of the time base and the resampled channels
+    """
+
+    methods = methods or {}
+    if period is None:
+        period = min(p for p, _ in modules)
+
+    length = min(
+        (output_length(len(next(iter(channels.values()))), p, period) for p, channels in modules if channels),
+        default=0
+    )
+
+    out: Dict[str, np.ndarray] = {}
+    for p, channels in modules:
+        for col, values in channels.items():
+            method = next((m for key, m in methods.items() if key in col), default)
+            out[col] = resample(values, p, period, length, method)
+
+    return period, out
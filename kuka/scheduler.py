@@ -0,0 +1,198 @@
+'''
+Adaptive polling of the Data collector sub.
+
+The delay before the next reading of the samples follows the occupancy of the
+sub buffer (Queue_Write - Queue_Read), the measured round trip time and the
+ColKEEPING_UP flag of the sub, instead of a fixed fraction of the sampling
+rate.
+'''
+
+from collections import deque
+from time import time
+from typing import Dict
+
+import numpy as np
+
+from .stats import LatencyHistogram
+
+# Decisions of the scheduler
+DECISION_DRAIN = "drain"        # Samples are waiting : poll again at once
+DECISION_STEADY = "steady"      # Caught up : poll when the next sample is due
+DECISION_BACKOFF = "backoff"    # Nothing new : wait longer after each empty reading
+DECISION_THROTTLE = "throttle"  # The sub is late on its sampling : do not poll faster than it samples
+
+DECISIONS = (DECISION_DRAIN, DECISION_STEADY, DECISION_BACKOFF, DECISION_THROTTLE)
+
+class PollScheduler:
+    """Chooses the delay between two readings of the samples
+    """
+
+    # Occupancy of the sub buffer above which it is drained at full speed, whatever the sub state
+    high_watermark = 0.05
+
+    # Weight of the latest round trip time and sample period in their moving averages
+    smoothing = 0.2
+
+    # Period at which ColKEEPING_UP is read, in seconds
+    keeping_up_period = 1.0
+
+    # Number of the latest sample intervals giving the median sample period
+    period_window = 256
+
+    def __init__(self, rate: float = 0.012, buffer_size: int = 20000, max_delay: float = None):
+        """Creates a scheduler
+
+        Args:
+            rate (float, optional): The sampling period of the sub, in seconds. Defaults to 0.012.
+            buffer_size (int, optional): The size of the sub buffer. Defaults to 20000.
+            max_delay (float, optional): The longest delay, in seconds. Defaults to None (4 sampling periods).
+        """
+
+        self.max_delay = max_delay
+        self.delays = LatencyHistogram()
+        self.begin(rate, buffer_size)
+
+    def begin (self, rate: float, buffer_size: int):
+        """Resets the scheduler for a new run
+
+        Args:
+            rate (float): The sampling period of the sub, in seconds
+            buffer_size (int): The size of the sub buffer
+        """
+
+        self.rate = rate
+        self.buffer_size = buffer_size
+        self.period = rate
+        self._last_sample = None
+        self._intervals = deque(maxlen=self.period_window)
+        self.rtt = None
+        self._last_sent = None
+        self.keeping_up = True
+        self._keeping_up_at = None
+
+        self.delay = 0.0
+        self.decision = DECISION_STEADY
+        self.occupancy = 0.0
+        self.max_occupancy = 0.0
+        self.decisions = { decision: 0 for decision in DECISIONS }
+        self.delays.reset()
+
+    def observe_read (self, sent: float, received: float):
+        """Adds a reading of the samples to the round trip time average
+
+        Args:
+            sent (float): The time the reading was sent at, from `time.time`
+            received (float): The time its response was received at
+        """
+
+        self._last_sent = sent
+        seconds = received - sent
+        if self.rtt is None:
+            self.rtt = seconds
+        else:
+            self.rtt += self.smoothing * (seconds - self.rtt)
+
+    def observe_samples (self, sample_times: np.ndarray):
+        """Updates the sample period average from the times of new samples.
+        The sub can sample slower than ColSAMPLING, as its own cycle rounds
+        the period up.
+
+        Args:
+            sample_times (np.ndarray): The Sample_time of the new samples, in ms
+        """
+
+        if len(sample_times) == 0:
+            return
+        if self._last_sample is not None:
+            period = (float(sample_times[-1]) - self._last_sample) / 1000 / len(sample_times)
+            if 0 < period < 10 * self.rate:
+                self.period += self.smoothing * (period - self.period)
+            self._intervals.extend(np.diff(sample_times, prepend=self._last_sample) / 1000)
+        else:
+            self._intervals.extend(np.diff(sample_times) / 1000)
+        self._last_sample = float(sample_times[-1])
+
+    @property
+    def median_period (self) -> float:
+        """The median of the latest sample intervals, in seconds. Unlike the
+        average, it ignores the gaps of the lost samples.
+        """
+
+        if not self._intervals:
+            return self.rate
+        return float(np.median(self._intervals))
+
+    def wants_keeping_up (self) -> bool:
+        """Tells whether ColKEEPING_UP should be read again
+
+        Returns:
+            bool: The last reading is older than `keeping_up_period`
+        """
+
+        return self._keeping_up_at is None or time() - self._keeping_up_at >= self.keeping_up_period
+
+    def observe_keeping_up (self, raw):
+        """Updates the state of the sub from a reading of ColKEEPING_UP
+
+        Args:
+            raw: The reading, True, False or nothing if it failed
+        """
+
+        self._keeping_up_at = time()
+        if raw is True or raw is False:
+            self.keeping_up = raw
+
+    def next_delay (self, backlog: int, new: int) -> float:
+        """Chooses the delay before the next reading
+
+        Args:
+            backlog (int): The number of samples still waiting in the sub buffer
+            new (int): The number of new samples given by the latest reading
+
+        Returns:
+            float: The delay, in seconds
+        """
+
+        max_delay = self.max_delay if self.max_delay is not None else 4 * self.rate
+
+        self.occupancy = backlog / self.buffer_size
+        self.max_occupancy = max(self.max_occupancy, self.occupancy)
+
+        if backlog > 0 and (self.keeping_up or self.occupancy >= self.high_watermark):
+            decision, delay = DECISION_DRAIN, 0.0
+        elif not self.keeping_up:
+            decision, delay = DECISION_THROTTLE, self.period
+        elif new > 0:
+            # The next sample is written one period after this one : reading
+            # one period after this reading keeps in phase with the sub
+            sent = self._last_sent if self._last_sent is not None else time()
+            decision, delay = DECISION_STEADY, max(0.0, sent + self.period - time())
+        else:
+            # Too early : retry soon, then less and less often
+            previous = self.delay if self.decision == DECISION_BACKOFF else self.rate / 8
+            decision, delay = DECISION_BACKOFF, previous * 2
+
+        self.decision = decision
+        self.delay = min(delay, max_delay)
+        self.decisions[decision] += 1
+        self.delays.add(self.delay)
+        return self.delay
+
+    def telemetry (self) -> Dict[str, object]:
+        """Gives the decisions taken during the run
+
+        Returns:
+            Dict[str, object]: The number of each decision, the delays summary (s),
+            the buffer occupancy, the round trip time and sample period (s) and the state of the sub
+        """
+
+        return {
+            "decisions": dict(self.decisions),
+            "delay": self.delays.summary(),
+            "occupancy": self.occupancy,
+            "max_occupancy": self.max_occupancy,
+            "rtt": self.rtt,
+            "period": self.period,
+            "median_period": self.median_period,
+            "keeping_up": self.keeping_up,
+        }
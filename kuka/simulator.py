@@ -0,0 +1,685 @@
+'''
+Offline simulator of a KUKA cell for the data collector : a C3 Bridge
+server speaking the openshowvar wire format, the `Data_collector.sub`
+submodule and the `_Axis_MAIN_dataset.src` program.
+
+Usage :
+    python -m kuka.simulator --port 7000 --latency 2 --jitter 1 --loss 0.01
+
+Then `KUKA_Handler("127.0.0.1", 7000)` can drive full `acquire()` runs
+with system variables. Kuka Trace files are not produced.
+'''
+
+import argparse
+import asyncio
+import math
+import random
+import re
+import struct
+from threading import Thread
+from time import monotonic
+from typing import Any, Dict, List, Tuple
+
+from .channels import (
+    CHANNEL_CURRENT, CHANNEL_POSITION, CHANNEL_POSITION_COMMAND, CHANNEL_TEMPERATURE, CHANNEL_TORQUE,
+    CHANNELS, CHANNELS_ALL, ChannelSet,
+)
+from .kukavarproxy import ENCODING, _FRAME_HEADER, _MSG_HEADER, _VALUE_LEN, MAX_FRAME_LEN
+
+# Home position of the robot (DOMOV in _Axis_MAIN_dataset.dat)
+HOME = [ 0.0, -90.0, 90.0, 0.0, 60.0, 0.0 ]
+
+# Amplitude of an axis iteration (A1.src to A6.src), in degrees
+AMPLITUDE = 45.0
+
+# Size of __TAB_BLOCK (PUBLISH_BLOCK in Data_collector.sub)
+BLOCK_LEN = 532
+
+class E6AXIS (list):
+    """ KRL E6AXIS structure : 6 robot axes and 6 external axes """
+
+class KRL_Simulator:
+    """Simulated robot controller, serving its variables over the C3 Bridge
+    protocol
+    """
+
+    def __init__ (
+            self,
+            latency: float = 0.0,
+            jitter: float = 0.0,
+            loss: float = 0.0,
+            rto: float = 0.2,
+            cycle: float = 0.004,
+            move_time: float = 0.5,
+            buffer_size: int = 20000,
+            drift: float = 0.0,
+            seed: int = None
+        ):
+        """Creates a simulated controller
+
+        Args:
+            latency (float, optional): Delay of each response, in seconds. Defaults to 0.0.
+            jitter (float, optional): Random extra delay of each response, up to this value in seconds. Defaults to 0.0.
+            loss (float, optional): Probability of a lost packet, delivered again after `rto`. Defaults to 0.0.
+            rto (float, optional): TCP retransmission delay of lost packets, in seconds. Defaults to 0.2.
+            cycle (float, optional): Period of the submodule loop, in seconds. Defaults to 0.004.
+            move_time (float, optional): Duration of one 45° axis move at 100% speed, in seconds. Defaults to 0.5.
+            buffer_size (int, optional): Size of the ColBUFFER arrays. Defaults to 20000.
+            drift (float, optional): Relative drift of $TIMER[1] from the host clock. Defaults to 0.0.
+            seed (int, optional): Seed of the random generator. Defaults to None.
+        """
+
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.rto = rto
+        self.cycle = cycle
+        self.move_time = move_time
+        self.drift = drift
+        self.random = random.Random(seed)
+
+        self.server: asyncio.AbstractServer = None
+        self.loop: asyncio.AbstractEventLoop = None
+        self._tasks: List[asyncio.Task] = []
+
+        # Global variables of $config.dat
+        self.vars: Dict[str, Any] = {
+            "PyRUN": False,
+            "PyDONE": False,
+            "PySPEED": 30,
+            "PyITER": [ 0 ] * 6,
+            "PyOPEN_GRIPPER": False,
+            "PyCLOSE_GRIPPER": False,
+            "PyKNUCKLE": 0,
+            "SPEED": 0.0,
+
+            "ColRUN": False,
+            "ColRESET": False,
+            "ColBUFFER_FULL": False,
+            "ColKEEPING_UP": False,
+            "ColRESET_DONE": True,
+            "ColSAMPLING": 12,
+            "ColBUFFER_SIZE": buffer_size,
+            "ColCHANNELS": CHANNELS_ALL,
+
+            "SAMPLE_READ": 772,
+            "SAMPLE_NUMBER": 772,
+            "__TAB_1": [ 0.0 ] * 36,
+            "ColBLOCK_SIZE": 1,
+            "__TAB_BLOCK": [ 0.0 ] * BLOCK_LEN,
+
+            "__PYTHON_HAS_READ": 771,
+            "__PUBLISHED": 0,
+            "__PUBLISHED_BLOCK": False,
+            "__PyResetTimer": False,
+
+            "$ANOUT": [ 0.0 ] * 32,
+            "$TIMER": None,
+            "$TRACE.MODE": "#T_STOP",
+            "$TRACE.STATE": "#T_END",
+            "$TRACE.NAME": "",
+            "$TRACE.CONFIG": "",
+        }
+        for name in [ "TQ", "TEMP", "CURR" ]:
+            for axis in range(1, 7):
+                self.vars[f"ColBUFFER_{name}_A{axis}"] = [ 0.0 ] * buffer_size
+        self.vars["ColBUFFER_TIME"] = [ 0.0 ] * buffer_size
+        self.vars["ColBUFFER_ANALOG"] = [ 0.0 ] * buffer_size
+        self.vars["ColBUFFER_POS_ACT"] = [ E6AXIS(HOME + [ 0.0 ] * 6) for _ in range(buffer_size) ]
+        self.vars["ColBUFFER_POS_MEAS"] = [ E6AXIS(HOME + [ 0.0 ] * 6) for _ in range(buffer_size) ]
+
+        # Timers, in ms
+        self._timer1_origin = monotonic()
+        self._timer5 = 0.0
+        self._last_cycle = monotonic()
+
+        # Current motion : start and end positions and times
+        self._move_from = list(HOME)
+        self._move_to = list(HOME)
+        self._move_start = 0.0
+        self._move_end = 0.0
+
+    ### ---- Variable access ---- ###
+
+    __NAME = re.compile(r'^(?P<name>[$\w.]+?)(\[(?P<index>\d*)\])?$')
+
+    def _locate (self, var: str) -> Tuple[str, int | None, bool]:
+        """Splits a KRL variable name into its name and 1-based index
+
+        Args:
+            var (str): The KRL variable, as `NAME`, `NAME[]` or `NAME[i]`
+
+        Raises:
+            KeyError: The variable does not exist
+
+        Returns:
+            Tuple[str, int | None, bool]: The name, the index and the whole array flag
+        """
+
+        match = self.__NAME.match(var.strip())
+        if match is None:
+            raise KeyError(var)
+
+        name = match.group("name").upper() if match.group("name").startswith("$") else match.group("name")
+        if name not in self.vars:
+            raise KeyError(var)
+
+        index = match.group("index")
+        whole = index == ""
+        return name, (int(index) if index else None), whole
+
+    def get (self, var: str) -> Any:
+        """Gives the value of a variable, as stored by the simulator
+        """
+
+        name, index, whole = self._locate(var)
+        if name == "$TIMER":
+            return self.timer1()
+        value = self.vars[name]
+        if index is not None:
+            return value[index - 1]
+        return value
+
+    def read (self, var: str) -> bytes:
+        """Reads a variable in the C3 Bridge text format
+        """
+
+        name, index, whole = self._locate(var)
+
+        # Only $TIMER[1] is simulated
+        if name == "$TIMER":
+            return str(int(self.timer1())).encode(ENCODING)
+
+        value = self.vars[name]
+        if index is not None:
+            return self._format(value[index - 1])
+        if whole and isinstance(value, str):
+            return f'"{value}"'.encode(ENCODING)
+        if whole:
+            return b"".join(self._format(v) + b" " for v in value)
+        return self._format(value)
+
+    def write (self, var: str, raw: str):
+        """Writes a variable from the C3 Bridge text format
+        """
+
+        name, index, whole = self._locate(var)
+        raw = raw.strip()
+
+        if name == "$TIMER":
+            self._timer1_origin = monotonic() - float(raw) / 1000 / (1 + self.drift)
+            return
+
+        if index is not None:
+            array = self.vars[name]
+            array[index - 1] = self._parse(raw, array[index - 1])
+        elif whole:
+            self.vars[name] = raw.strip('"')
+        else:
+            self.vars[name] = self._parse(raw, self.vars[name])
+
+        self._on_write(name)
+
+    def _format (self, value: Any) -> bytes:
+        """Formats a value as KRL does
+        """
+
+        if isinstance(value, bool):
+            return b"TRUE" if value else b"FALSE"
+        if isinstance(value, E6AXIS):
+            names = [ f"A{i}" for i in range(1, 7) ] + [ f"E{i}" for i in range(1, 7) ]
+            fields = ", ".join(f"{n} {v:.6g}" for n, v in zip(names, value))
+            return ("{E6AXIS: " + fields + "}").encode(ENCODING)
+        if isinstance(value, int):
+            return str(value).encode(ENCODING)
+        if isinstance(value, float):
+            return f"{value:.7g}".encode(ENCODING)
+        return str(value).encode(ENCODING)
+
+    def _parse (self, raw: str, current: Any) -> Any:
+        """Parses a written value, using the type of the current value
+        """
+
+        if isinstance(current, bool):
+            return raw.upper() == "TRUE"
+        if isinstance(current, int):
+            return int(float(raw))
+        if isinstance(current, float):
+            return float(raw)
+        return raw
+
+    def _on_write (self, name: str):
+        """Reacts to the writes of Python, as the robot programs do
+        """
+
+        if name == "$TRACE.MODE":
+            match self.vars[name]:
+                case "#T_START":
+                    self.vars["$TRACE.STATE"] = "#T_WAIT"
+                case "#T_STOP":
+                    self.vars["$TRACE.STATE"] = "#T_END"
+
+    ### ---- Timers ---- ###
+
+    def timer1 (self, now: float = None) -> float:
+        """$TIMER[1], in ms
+
+        Args:
+            now (float, optional): The time, from `time.monotonic`. Defaults to None (now).
+        """
+
+        now = monotonic() if now is None else now
+        return (now - self._timer1_origin) * 1000 * (1 + self.drift)
+
+    ### ---- Data_collector.sub ---- ###
+
+    def _sub_cycle (self, now: float):
+        """One iteration of the Data_collector.sub loop
+
+        Args:
+            now (float): The time of the iteration, from `time.monotonic`
+        """
+
+        v = self.vars
+        elapsed = round((now - self._last_cycle) * 1000, 6)
+        self._last_cycle = now
+
+        if v["ColRESET"]:
+            v["ColRESET"] = False
+            v["ColRESET_DONE"] = False
+            v["SAMPLE_NUMBER"] = 1
+            v["ColKEEPING_UP"] = True
+            v["ColRESET_DONE"] = True
+            self._reset_communication()
+            if v["__PyResetTimer"]:
+                v["__PyResetTimer"] = False
+                self._timer1_origin = now
+            v["__TAB_1"] = [ 0.0 ] * 36
+
+        if v["ColRUN"]:
+            self._timer5 += elapsed
+            if self._timer5 >= v["ColSAMPLING"]:
+                self._timer5 = 0
+                self._sample(now)
+            else:
+                self._communication_routine()
+            if self._timer5 >= 2 * v["ColSAMPLING"]:
+                v["ColKEEPING_UP"] = False
+        else:
+            self._communication_routine()
+
+    def _sample (self, now: float):
+        """Stores the current robot state at SAMPLE_NUMBER
+        """
+
+        v = self.vars
+        n = v["SAMPLE_NUMBER"] - 1
+
+        # Only the channels selected by ColCHANNELS are sampled
+        channels = v["ColCHANNELS"]
+        position, velocity = self._motion(now)
+        v["ColBUFFER_TIME"][n] = float(int(self.timer1(now)))
+        if channels & CHANNEL_POSITION_COMMAND:
+            v["ColBUFFER_POS_ACT"][n] = E6AXIS(position + [ 0.0 ] * 6)
+        if channels & CHANNEL_POSITION:
+            v["ColBUFFER_POS_MEAS"][n] = E6AXIS(
+                [ p - 0.004 * s + self.random.gauss(0, 0.001) for p, s in zip(position, velocity) ] + [ 0.0 ] * 6
+            )
+
+        for axis in range(6):
+            torque = 0.02 * velocity[axis] + 0.5 * math.sin(math.radians(position[axis])) + self.random.gauss(0, 0.02)
+            if channels & CHANNEL_TORQUE:
+                v[f"ColBUFFER_TQ_A{axis + 1}"][n] = torque
+            if channels & CHANNEL_CURRENT:
+                v[f"ColBUFFER_CURR_A{axis + 1}"][n] = 10 * abs(torque) + self.random.gauss(0, 0.1)
+            if channels & CHANNEL_TEMPERATURE:
+                v[f"ColBUFFER_TEMP_A{axis + 1}"][n] = 303.15 + 0.001 * self.timer1(now) / 1000
+        v["ColBUFFER_ANALOG"][n] = v["$ANOUT"][0]
+
+        v["SAMPLE_NUMBER"] += 1
+        if v["SAMPLE_NUMBER"] > v["ColBUFFER_SIZE"]:
+            v["SAMPLE_NUMBER"] = 1
+
+    def _reset_communication (self):
+        """RESET_COMMUNICATION() of Data_collector.sub
+        """
+
+        v = self.vars
+        v["__TAB_1"] = [ 0.0 ] * 36
+        v["__TAB_BLOCK"][:4] = [ 0.0 ] * 4
+        v["SAMPLE_READ"] = 1
+        v["__PYTHON_HAS_READ"] = 0
+        v["__PUBLISHED"] = 0
+        v["__PUBLISHED_BLOCK"] = False
+
+    def _communication_routine (self):
+        """COMMUNICATION_ROUTINE() of Data_collector.sub
+        """
+
+        v = self.vars
+        tab = v["__TAB_1"]
+        size = v["ColBUFFER_SIZE"]
+        blocks = v["ColBLOCK_SIZE"] > 1
+
+        # The published samples are the __PUBLISHED ones before SAMPLE_READ.
+        # Acknowledgements are cumulative : the publication starts again after
+        # any of them, or from its first sample when the transfer mode changes.
+        # The bulk drain acknowledges samples which were never published
+        first = (v["SAMPLE_READ"] - v["__PUBLISHED"] - 1) % size + 1
+        acked = (v["__PYTHON_HAS_READ"] - first + 1) % size
+        unread = (v["SAMPLE_NUMBER"] - first) % size
+        if 0 < acked and (acked <= v["__PUBLISHED"] or acked <= unread):
+            v["SAMPLE_READ"] = v["__PYTHON_HAS_READ"] % size + 1
+            v["__PUBLISHED"] = 0
+        elif blocks != v["__PUBLISHED_BLOCK"]:
+            v["SAMPLE_READ"] = first
+            v["__PUBLISHED"] = 0
+        v["__PUBLISHED_BLOCK"] = blocks
+
+        if v["SAMPLE_READ"] != v["SAMPLE_NUMBER"]:
+            if blocks:
+                self._publish_block()
+            elif v["__PUBLISHED"] == 0:
+                tab[34] = 0
+                self._copy_sample(tab, 0)
+                tab[33] = float(v["SAMPLE_NUMBER"])
+                self._next_read()
+                v["__PUBLISHED"] = 1
+                tab[34] = 1
+
+        if not v["ColRUN"]:
+            tab[35] = 1 if v["SAMPLE_NUMBER"] == v["SAMPLE_READ"] else 2
+        else:
+            tab[35] = 0
+        v["__TAB_BLOCK"][3] = tab[35]
+
+    def _copy_sample (self, tab: List[float], offset: int) -> int:
+        """COPY_SAMPLE() of Data_collector.sub : copies the sample at
+        SAMPLE_READ to `tab` from `offset` : time, the selected channels of
+        each axis, analog output and SAMPLE_READ. Returns the offset following it
+        """
+
+        v = self.vars
+        n = v["SAMPLE_READ"] - 1
+
+        values = []
+        for axis in range(6):
+            values += [
+                v["ColBUFFER_POS_ACT"][n][axis],
+                v["ColBUFFER_POS_MEAS"][n][axis],
+                v[f"ColBUFFER_TQ_A{axis + 1}"][n],
+                v[f"ColBUFFER_CURR_A{axis + 1}"][n],
+                v[f"ColBUFFER_TEMP_A{axis + 1}"][n],
+            ]
+        selected = [ v["ColCHANNELS"] & bit for bit, _, _ in CHANNELS ] * 6
+
+        tab[offset] = v["ColBUFFER_TIME"][n]
+        offset += 1
+        for value, keep in zip(values, selected):
+            if keep:
+                tab[offset] = value
+                offset += 1
+
+        tab[offset] = v["ColBUFFER_ANALOG"][n]
+        tab[offset + 1] = float(v["SAMPLE_READ"])
+        return offset + 2
+
+    def _next_read (self):
+        v = self.vars
+        v["SAMPLE_READ"] += 1
+        if v["SAMPLE_READ"] > v["ColBUFFER_SIZE"]:
+            v["SAMPLE_READ"] = 1
+
+    def _publish_block (self):
+        """PUBLISH_BLOCK() of Data_collector.sub
+        """
+
+        v = self.vars
+        block = v["__TAB_BLOCK"]
+
+        # A new publication, or new samples appended to the current one
+        count = v["__PUBLISHED"]
+        if count == 0:
+            block[2] = 0
+        sample_len = ChannelSet(v["ColCHANNELS"]).sample_len
+        offset = 4 + count * sample_len
+        while count < v["ColBLOCK_SIZE"] and offset + sample_len <= BLOCK_LEN and v["SAMPLE_READ"] != v["SAMPLE_NUMBER"]:
+            offset = self._copy_sample(block, offset)
+            self._next_read()
+            count += 1
+
+        v["__PUBLISHED"] = count
+        block[0] = float(count)
+        block[1] = float(v["SAMPLE_NUMBER"])
+        block[2] = 1
+
+    async def _sub (self):
+        """Data_collector.sub main loop. The controller runs in real time : the
+        iterations missed while the host was busy run late, at the time they
+        were due.
+        """
+
+        due = monotonic()
+        while True:
+            now = monotonic()
+            while due <= now:
+                self._sub_cycle(due)
+                due += self.cycle
+            await asyncio.sleep(due - now)
+
+    ### ---- _Axis_MAIN_dataset.src ---- ###
+
+    def _motion (self, now: float) -> Tuple[List[float], List[float]]:
+        """Gives the commanded position and velocity of the axes
+
+        Returns:
+            Tuple[List[float], List[float]]: The positions (°) and velocities (°/s)
+        """
+
+        duration = self._move_end - self._move_start
+        if duration <= 0 or now >= self._move_end:
+            return list(self._move_to), [ 0.0 ] * 6
+
+        # Sine velocity profile
+        x = max(0.0, (now - self._move_start) / duration)
+        s = (1 - math.cos(math.pi * x)) / 2
+        ds = math.pi * math.sin(math.pi * x) / 2 / duration
+
+        position = [ a + (b - a) * s for a, b in zip(self._move_from, self._move_to) ]
+        velocity = [ (b - a) * ds for a, b in zip(self._move_from, self._move_to) ]
+        return position, velocity
+
+    async def _move (self, target: List[float]):
+        """SPTP to `target` at PySPEED
+        """
+
+        now = monotonic()
+        start, _ = self._motion(now)
+        distance = max(abs(b - a) for a, b in zip(start, target))
+        speed = max(1, self.vars["PySPEED"]) / 100
+
+        self._move_from = start
+        self._move_to = list(target)
+        self._move_start = now
+        self._move_end = now + self.move_time * (distance / AMPLITUDE) / speed
+        await asyncio.sleep(self._move_end - now)
+
+    async def _program (self):
+        """_Axis_MAIN_dataset.src main loop
+        """
+
+        v = self.vars
+        while True:
+            v["$ANOUT"][0] = 0.0
+            while not v["PyRUN"]:
+                await asyncio.sleep(self.cycle)
+            v["PyDONE"] = False
+            if v["$TRACE.STATE"] == "#T_WAIT":
+                v["$TRACE.STATE"] = "#TRIGGERED"
+
+            await self._move(HOME)
+            for axis in range(6):
+                v["$ANOUT"][0] = float(axis + 1)
+                for _ in range(v["PyITER"][axis]):
+                    for sign in (1, -1):
+                        target = list(HOME)
+                        target[axis] += sign * AMPLITUDE
+                        await self._move(target)
+                v["$ANOUT"][0] = 0.0
+                await self._move(HOME)
+
+            v["PyDONE"] = True
+            v["PyRUN"] = False
+            v["ColRUN"] = False
+            await asyncio.sleep(1)
+            v["PyDONE"] = False
+
+    ### ---- C3 Bridge ---- ###
+
+    def _delay (self) -> float:
+        """Network delay of a response
+        """
+
+        delay = self.latency + self.random.uniform(0, self.jitter)
+        if self.random.random() < self.loss:
+            delay += self.rto
+        return delay
+
+    def _respond (self, body: bytes) -> Tuple[int, bytes, bool]:
+        """Processes one request
+
+        Args:
+            body (bytes): The request body, after msg_id and body_len
+
+        Returns:
+            Tuple[int, bytes, bool]: The flag, value and success of the response
+        """
+
+        flag = body[0]
+        name_len = struct.unpack_from("!H", body, 1)[0]
+        name = body[3:3 + name_len].decode(ENCODING)
+
+        try:
+            if flag == 1:
+                value_len = _VALUE_LEN.unpack_from(body, 3 + name_len)[0]
+                start = 3 + name_len + _VALUE_LEN.size
+                self.write(name, body[start:start + value_len].decode(ENCODING))
+            value = self.read(name)
+            ok = len(value) + _MSG_HEADER.size + 3 <= MAX_FRAME_LEN
+        except (KeyError, ValueError, IndexError):
+            value, ok = b"", False
+
+        return flag, (value if ok else b""), ok
+
+    async def _handle (self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serves one C3 Bridge client. Responses are computed when the
+        request arrives and sent after the network delay, in order.
+        """
+
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def send ():
+            while True:
+                at, rsp = await queue.get()
+                delay = at - monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                writer.write(rsp)
+                await writer.drain()
+
+        sender = asyncio.create_task(send())
+        last = 0.0
+        try:
+            while True:
+                header = await reader.readexactly(_FRAME_HEADER.size)
+                msg_id, body_len = _FRAME_HEADER.unpack(header)
+                body = await reader.readexactly(body_len)
+
+                flag, value, ok = self._respond(body)
+                rsp = struct.pack("!BH", flag, len(value)) + value + (b"\x00\x01\x01" if ok else b"\x00\x00\x00")
+
+                last = max(monotonic() + self._delay(), last)
+                queue.put_nowait((last, _FRAME_HEADER.pack(msg_id, len(rsp)) + rsp))
+
+                # The sub runs beside the C3 Bridge : a long burst must not delay its samples
+                await asyncio.sleep(0)
+
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            sender.cancel()
+            writer.close()
+
+    async def start (self, host: str = "127.0.0.1", port: int = 7000) -> int:
+        """Starts the server and the robot programs in the running loop
+
+        Args:
+            host (str, optional): The address to listen on. Defaults to "127.0.0.1".
+            port (int, optional): The port to listen on, 0 for any. Defaults to 7000.
+
+        Returns:
+            int: The port of the server
+        """
+
+        self.loop = asyncio.get_running_loop()
+        self.server = await asyncio.start_server(self._handle, host, port)
+        self._tasks = [ asyncio.create_task(self._sub()), asyncio.create_task(self._program()) ]
+        return self.server.sockets[0].getsockname()[1]
+
+    def start_in_thread (self, host: str = "127.0.0.1", port: int = 0) -> int:
+        """Runs the simulator in a background thread, to be driven by the
+        blocking KUKA_Handler of the same process
+
+        Args:
+            host (str, optional): The address to listen on. Defaults to "127.0.0.1".
+            port (int, optional): The port to listen on, 0 for any. Defaults to 0.
+
+        Returns:
+            int: The port of the server
+        """
+
+        loop = asyncio.new_event_loop()
+        Thread(target=loop.run_forever, daemon=True).start()
+        return asyncio.run_coroutine_threadsafe(self.start(host, port), loop).result()
+
+    def stop (self):
+        """Stops the server and the robot programs
+        """
+
+        def _stop ():
+            for task in self._tasks:
+                task.cancel()
+            self.server.close()
+
+        self.loop.call_soon_threadsafe(_stop)
+
+async def _main (args):
+    simulator = KRL_Simulator(
+        latency=args.latency / 1000,
+        jitter=args.jitter / 1000,
+        loss=args.loss,
+        cycle=args.cycle / 1000,
+        move_time=args.move_time,
+        drift=args.drift / 1e6,
+        seed=args.seed,
+    )
+    port = await simulator.start(args.host, args.port)
+    print(f"Simulated KUKA cell listening on {args.host}:{port}")
+    await asyncio.Event().wait()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulated C3 Bridge and Data_collector.sub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7000)
+    parser.add_argument("--latency", type=float, default=0.0, help="Response delay (ms)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random extra response delay (ms)")
+    parser.add_argument("--loss", type=float, default=0.0, help="Packet loss probability")
+    parser.add_argument("--cycle", type=float, default=4.0, help="Submodule cycle (ms)")
+    parser.add_argument("--move-time", type=float, default=0.5, help="Duration of a 45° move at 100%% speed (s)")
+    parser.add_argument("--drift", type=float, default=0.0, help="Drift of $TIMER[1] (ppm)")
+    parser.add_argument("--seed", type=int, default=None)
+
+    try:
+        asyncio.run(_main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
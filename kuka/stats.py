@@ -0,0 +1,165 @@
+'''
+Fixed-memory latency statistics of the C3 Bridge requests.
+'''
+
+import math
+from typing import Dict, Iterable
+
+# Phases of a request timed by the C3 Bridge clients
+PHASE_SEND = "send"         # Writing the request to the socket
+PHASE_WAIT = "wait"         # From the request sent to its response received
+PHASE_PARSE = "parse"       # Unpacking the response
+PHASE_REQUEST = "request"   # Whole call, including retries and bursts
+
+PHASES = (PHASE_SEND, PHASE_WAIT, PHASE_PARSE, PHASE_REQUEST)
+
+class LatencyHistogram:
+    """Histogram of durations with logarithmic buckets. The memory used does
+    not depend on the number of values added : percentiles are given with a
+    relative error bounded by the bucket width (about 6 % with the default
+    40 buckets per decade).
+    """
+
+    def __init__(self, low: float = 1e-6, high: float = 100.0, buckets_per_decade: int = 40):
+        """Creates an empty histogram
+
+        Args:
+            low (float, optional): Lowest duration told apart, in seconds. Defaults to 1e-6.
+            high (float, optional): Highest duration told apart, in seconds. Defaults to 100.0.
+            buckets_per_decade (int, optional): Resolution of the histogram. Defaults to 40.
+        """
+
+        self.low = low
+        self.high = high
+        self.buckets_per_decade = buckets_per_decade
+        self._log_low = math.log10(low)
+        n = math.ceil((math.log10(high) - self._log_low) * buckets_per_decade)
+
+        # First and last buckets gather the values out of [low, high)
+        self.counts = [ 0 ] * (n + 2)
+        self.reset()
+
+    def reset (self):
+        """Forgets all the values
+        """
+
+        for i in range(len(self.counts)):
+            self.counts[i] = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def _bucket (self, value: float) -> int:
+        if value < self.low:
+            return 0
+        i = int((math.log10(value) - self._log_low) * self.buckets_per_decade) + 1
+        return min(i, len(self.counts) - 1)
+
+    def _value (self, bucket: int) -> float:
+        """Gives the representative value of a bucket, its geometric middle
+        """
+
+        if bucket == 0:
+            return self.min
+        if bucket == len(self.counts) - 1:
+            return self.max
+        return 10 ** (self._log_low + (bucket - 0.5) / self.buckets_per_decade)
+
+    def add (self, value: float):
+        """Adds a duration
+
+        Args:
+            value (float): The duration, in seconds
+        """
+
+        self.counts[self._bucket(value)] += 1
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge (self, other: "LatencyHistogram"):
+        """Adds the values of a histogram with the same buckets
+
+        Args:
+            other (LatencyHistogram): The histogram to add
+        """
+
+        if len(other.counts) != len(self.counts) or other.low != self.low:
+            raise ValueError("Histograms with different buckets")
+
+        for i, c in enumerate(other.counts):
+            self.counts[i] += c
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def percentile (self, p: float) -> float:
+        """Gives an estimate of a percentile
+
+        Args:
+            p (float): The percentile, between 0 and 100
+
+        Returns:
+            float: The duration, in seconds. NaN if the histogram is empty
+        """
+
+        if self.count == 0:
+            return math.nan
+
+        rank = max(1, math.ceil(p / 100 * self.count))
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return min(max(self._value(i), self.min), self.max)
+        return self.max
+
+    def summary (self, percentiles: Iterable[float] = (50, 90, 99, 99.9)) -> Dict[str, float]:
+        """Gives the main statistics of the histogram
+
+        Args:
+            percentiles (Iterable[float], optional): The percentiles to give. Defaults to (50, 90, 99, 99.9).
+
+        Returns:
+            Dict[str, float]: The count, then the mean, min, max and percentiles in seconds
+        """
+
+        out = {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else math.nan,
+            "min": self.min if self.count else math.nan,
+            "max": self.max if self.count else math.nan,
+        }
+        for p in percentiles:
+            out[f"p{p:g}"] = self.percentile(p)
+        return out
+
+def new_timings () -> Dict[str, LatencyHistogram]:
+    """Creates the histograms of the phases of a request
+
+    Returns:
+        Dict[str, LatencyHistogram]: An empty histogram per phase
+    """
+
+    return { phase: LatencyHistogram() for phase in PHASES }
+
+def summarize (timings: Iterable[Dict[str, LatencyHistogram]]) -> Dict[str, Dict[str, float]]:
+    """Merges the request timings of several clients
+
+    Args:
+        timings (Iterable[Dict[str, LatencyHistogram]]): The histograms of each client
+
+    Returns:
+        Dict[str, Dict[str, float]]: Per phase, the summary of the merged histograms
+    """
+
+    merged = new_timings()
+    for client in timings:
+        for phase, histogram in client.items():
+            merged[phase].merge(histogram)
+    return { phase: histogram.summary() for phase, histogram in merged.items() }
@@ -0,0 +1,137 @@
+'''
+Steps of a data collection, shared by the blocking and asyncio data readers.
+
+The collection logic (run initialisation, sample and acknowledgement steps,
+bulk drain, end of the runs) is written once, as generators which do no I/O :
+they yield the requests, pauses and blocking calls they need, and receive
+their results. A driver runs the steps : `run` with a KUKA_Handler in the
+calling thread, `run_async` with a KUKA_AsyncHandler in the event loop. The
+errors of a step are raised in the generator, where they can be handled.
+
+    def _read_steps (self):
+        value = yield request("KUKA_ReadVar", "ColRUN")
+        yield pause(0.1)
+        return value
+'''
+
+from __future__ import annotations
+
+import asyncio
+from time import sleep
+from typing import Any, Callable, Generator, Tuple
+
+# Kinds of steps
+REQUEST = "request"     # A method of the handler, blocking or coroutine
+PAUSE = "pause"         # A sleep, in seconds
+CALL = "call"           # A blocking function, run in a worker thread by run_async
+RUN_START = "run_start" # Waits for the start of the next run of all the robots
+RUN_END = "run_end"     # Declares the end of a run
+
+Step = Tuple[str, Any, tuple]
+Steps = Generator[Step, Any, Any]
+
+def request (method: str, *args) -> Step:
+    """A request to the robot
+
+    Args:
+        method (str): The name of the handler method, like "KUKA_ReadMany"
+        args: Its arguments
+    """
+
+    return (REQUEST, method, args)
+
+def pause (delay: float) -> Step:
+    """A pause, in seconds
+    """
+
+    return (PAUSE, None, (delay,))
+
+def call (function: Callable, *args) -> Step:
+    """A blocking call, like the Kuka Trace control and download
+    """
+
+    return (CALL, function, args)
+
+def run_start () -> Step:
+    """The wait for the start of the next run
+    """
+
+    return (RUN_START, None, ())
+
+def run_end () -> Step:
+    """The end of a run
+    """
+
+    return (RUN_END, None, ())
+
+def run (steps: Steps, handler, lock = None, on_done: Callable = None):
+    """Runs steps in the calling thread
+
+    Args:
+        steps (Steps): The steps
+        handler (KUKA_Handler): The handler running the requests
+        lock (optional): Acquired at the start of each run, like a RunBarrier. Defaults to None.
+        on_done (Callable, optional): Called at the end of each run. Defaults to None.
+
+    Returns:
+        The result of the steps
+    """
+
+    result, error = None, None
+    while True:
+        try:
+            kind, target, args = steps.throw(error) if error is not None else steps.send(result)
+        except StopIteration as stop:
+            return stop.value
+
+        result, error = None, None
+        try:
+            if kind == REQUEST:
+                result = getattr(handler, target)(*args)
+            elif kind == PAUSE:
+                if args[0] > 0:
+                    sleep(args[0])
+            elif kind == CALL:
+                result = target(*args)
+            elif kind == RUN_START:
+                if lock is not None:
+                    lock.acquire()
+            elif kind == RUN_END:
+                if on_done is not None:
+                    on_done()
+        except Exception as e:
+            error = e
+
+async def run_async (steps: Steps, handler, barrier: asyncio.Barrier = None):
+    """Runs steps in the running event loop. The blocking calls run in worker
+    threads, and every pause yields to the other robots.
+
+    Args:
+        steps (Steps): The steps
+        handler (KUKA_AsyncHandler): The handler running the requests
+        barrier (asyncio.Barrier, optional): Waited for at the start of each run. Defaults to None.
+
+    Returns:
+        The result of the steps
+    """
+
+    result, error = None, None
+    while True:
+        try:
+            kind, target, args = steps.throw(error) if error is not None else steps.send(result)
+        except StopIteration as stop:
+            return stop.value
+
+        result, error = None, None
+        try:
+            if kind == REQUEST:
+                result = await getattr(handler, target)(*args)
+            elif kind == PAUSE:
+                await asyncio.sleep(max(0, args[0]))
+            elif kind == CALL:
+                result = await asyncio.to_thread(target, *args)
+            elif kind == RUN_START:
+                if barrier is not None:
+                    await barrier.wait()
+        except Exception as e:
+            error = e
@@ -0,0 +1,229 @@
+'''
+Columnar storage of the samples collected from the system variables.
+
+Samples are stored in preallocated NumPy columns with a fixed schema, as laid
+out by the Data collector sub in `__TAB_1` for the selected channels. The
+labels of a run are stored once, and the DataFrame, with its one-hot motor
+columns, is only built when the run is finalised.
+'''
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+from typing import List
+
+from .channels import CHANNELS, ChannelSet
+
+# Time of a sample, then its per-axis values, as laid out by the sub
+TAB1_SAMPLE = 0
+TAB1_DATA_START = 1
+
+# Columns of the finalised DataFrame, with all the channels
+COLUMNS = ChannelSet().columns
+
+# Columns holding labels, stored as categories
+CATEGORICAL = ("Load", "Speed")
+
+# Types of the other columns
+DTYPES = {
+    "Sample_time": np.float64, "Host_time": np.float64,
+    **{ f"{name}_A{axis}": np.float32 for axis in range(1, 7) for _, name, _ in CHANNELS },
+    **{ f"A{axis}": np.int8 for axis in range(1, 7) },
+    "Queue_Read": np.int32, "Queue_Write": np.int32,
+    "Faulty": np.int8, "Read_time": np.float32, "Gap": np.int8,
+}
+
+class SampleStore:
+    """Preallocated columns holding the samples of a run. The columns grow by
+    chunks and keep their capacity from one run to the next.
+    """
+
+    def __init__(self, chunk: int = 16384):
+        """Creates an empty store
+
+        Args:
+            chunk (int, optional): The smallest number of samples added to the capacity when growing. Defaults to 16384.
+        """
+
+        self.chunk = chunk
+        self.channels = ChannelSet()
+
+        # Maps Sample_time to Host_time, see kuka.clock
+        self.clock = None
+        self._capacity = 0
+        self._allocate(0)
+        self.begin()
+
+    def _allocate (self, capacity: int):
+        """Resizes the columns, keeping the stored samples
+        """
+
+        n = getattr(self, "_n", 0)
+        columns = {
+            "_time": np.empty(capacity, np.float64),
+            "_data": np.empty((capacity, self.channels.width), np.float32),
+            "_motor": np.empty(capacity, np.int8),
+            "_read": np.empty(capacity, np.int32),
+            "_write": np.empty(capacity, np.int32),
+            "_latency": np.empty(capacity, np.float32),
+            "_gap": np.empty(capacity, np.int8),
+        }
+        for name, column in columns.items():
+            if n:
+                column[:n] = getattr(self, name)[:n]
+            setattr(self, name, column)
+        self._capacity = capacity
+
+    def _reserve (self, count: int):
+        """Makes room for `count` more samples
+        """
+
+        needed = self._n + count
+        if needed <= self._capacity:
+            return
+        capacity = max(needed, self._capacity + max(self.chunk, self._capacity // 2))
+        self._allocate(-(-capacity // self.chunk) * self.chunk)
+
+    def begin (self, load: int = -1, speed: int = 0, channels: ChannelSet = None):
+        """Empties the store for a new run, keeping its capacity
+
+        Args:
+            load (int, optional): The class of the samples. Defaults to -1.
+            speed (int, optional): The speed of the run, in %. Defaults to 0.
+            channels (ChannelSet, optional): The channels of the samples. Defaults to None (unchanged).
+        """
+
+        self._n = 0
+        if channels is not None and channels != self.channels:
+            self.channels = channels
+            self._allocate(self._capacity)
+        self._flushed = 0
+        self._dropped = 0
+        self._last_read = 0
+        self.load = load
+        self.speed = speed
+
+    def __len__ (self) -> int:
+        """The number of samples stored during the run, including the discarded ones
+        """
+
+        return self._dropped + self._n
+
+    @property
+    def last_read (self) -> int:
+        """The index of the last stored sample in the sub buffer, 0 if none
+        """
+
+        return self._last_read
+
+    @property
+    def unflushed (self) -> int:
+        """The number of samples not given by `flush` yet
+        """
+
+        return self._n - self._flushed
+
+    def extend (self, rows: np.ndarray, write: int, latency: float, gaps: np.ndarray = 0):
+        """Stores samples
+
+        Args:
+            rows (np.ndarray): The samples, one per row, laid out as given by `channels`
+            write (int): The write index of the sub buffer (Queue Write)
+            latency (float): The request time of the samples, in ms
+            gaps (np.ndarray, optional): 1 for the samples following lost ones, see `LossMonitor.check`. Defaults to 0.
+        """
+
+        count = len(rows)
+        if count == 0:
+            return
+        self._reserve(count)
+
+        channels = self.channels
+        s = slice(self._n, self._n + count)
+        self._time[s] = rows[:, TAB1_SAMPLE]
+        self._data[s] = rows[:, TAB1_DATA_START:channels.motor]
+        self._motor[s] = np.nan_to_num(rows[:, channels.motor])
+        self._read[s] = rows[:, channels.read]
+        self._write[s] = write
+        self._latency[s] = latency
+        self._gap[s] = gaps
+        self._n += count
+        self._last_read = int(rows[-1, channels.read])
+
+    def frame (self, start: int = 0) -> pd.DataFrame:
+        """Builds the DataFrame of the stored samples
+
+        Args:
+            start (int, optional): The first sample, counted from the oldest one still in memory. Defaults to 0.
+
+        Returns:
+            pd.DataFrame: The samples, with the columns given by `channels`
+        """
+
+        s = slice(start, self._n)
+        n = self._n - start
+        codes = np.zeros(n, np.int8)
+
+        columns = { "Sample_time": self._time[s].copy() }
+        if self.clock is not None:
+            columns["Host_time"] = self.clock.to_host(self._time[s])
+        else:
+            columns["Host_time"] = np.full(n, np.nan)
+        data = self._data[s]
+        for i, name in enumerate(self.channels.data_columns):
+            columns[name] = data[:, i].copy()
+
+        # One-hot motor state
+        motor = self._motor[s]
+        for axis in range(1, 7):
+            columns[f"A{axis}"] = (motor == axis).astype(np.int8)
+
+        columns["Queue_Read"] = self._read[s].copy()
+        columns["Queue_Write"] = self._write[s].copy()
+        columns["Load"] = pd.Categorical.from_codes(codes, [ self.load ])
+        columns["Faulty"] = np.full(n, 1 if self.load == 0 else 0, np.int8)
+        columns["Speed"] = pd.Categorical.from_codes(codes, [ f"{self.speed}%" ])
+        columns["Read_time"] = self._latency[s].copy()
+        columns["Gap"] = self._gap[s].copy()
+
+        return pd.DataFrame(columns, columns=self.channels.columns)
+
+    def flush (self) -> pd.DataFrame:
+        """Gives the samples stored since the previous flush
+
+        Returns:
+            pd.DataFrame: The samples
+        """
+
+        frame = self.frame(self._flushed)
+        self._flushed = self._n
+        return frame
+
+    def discard (self):
+        """Frees the flushed samples, keeping the capacity of the store
+        """
+
+        kept = self._n - self._flushed
+        for name in ("_time", "_data", "_motor", "_read", "_write", "_latency", "_gap"):
+            column = getattr(self, name)
+            column[:kept] = column[self._flushed:self._n]
+        self._dropped += self._flushed
+        self._n = kept
+        self._flushed = 0
+
+def concat (frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """Concatenates the DataFrames of several runs, keeping the labels as
+    categories
+
+    Args:
+        frames (List[pd.DataFrame]): The DataFrames built by `SampleStore.frame`
+
+    Returns:
+        pd.DataFrame: The samples of all the runs
+    """
+
+    data = pd.concat(frames)
+    if len(frames) > 1:
+        for name in CATEGORICAL:
+            data[name] = union_categoricals([ frame[name] for frame in frames ])
+    return data
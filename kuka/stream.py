@@ -0,0 +1,119 @@
+'''
+Crash-safe streaming of the collected samples to disk.
+
+The samples are appended to a CSV file batch by batch while they are
+collected. Each batch is followed by a `# BATCH <rows>` marker and synced to
+disk, and a `# END <rows>` footer is written when the file is closed. After
+a crash, `recover` loads every sample up to the last complete batch.
+'''
+
+import io
+import os
+from time import time
+
+import pandas as pd
+
+from .store import CATEGORICAL, COLUMNS, DTYPES
+
+# Markers following a batch and closing a file
+BATCH_MARKER = "# BATCH "
+END_MARKER = "# END "
+
+class SampleWriter:
+    """Appends DataFrames of samples to a CSV file
+    """
+
+    def __init__(self, path: str, batch: int = 1000, period: float = 1.0):
+        """Opens a file for writing, creating it or appending to it
+
+        Args:
+            path (str): The file
+            batch (int, optional): The number of samples after which a batch is due. Defaults to 1000.
+            period (float, optional): The time after which a batch is due, in seconds. Defaults to 1.0.
+        """
+
+        self.path = path
+        self.batch = batch
+        self.period = period
+
+        self.rows = 0
+        self._written_at = time()
+
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        self._file = open(path, "a", newline="")
+        self._header = not exists
+
+    def due (self, pending: int) -> bool:
+        """Tells whether the samples waiting should be written
+
+        Args:
+            pending (int): The number of samples not written yet
+
+        Returns:
+            bool: A batch is due
+        """
+
+        return pending > 0 and (pending >= self.batch or time() - self._written_at >= self.period)
+
+    def write (self, frame: pd.DataFrame):
+        """Appends a batch of samples and syncs the file
+
+        Args:
+            frame (pd.DataFrame): The samples, with the columns of `SampleStore.frame`
+        """
+
+        self._written_at = time()
+        if len(frame) == 0:
+            return
+
+        text = frame.to_csv(index=False, header=self._header, lineterminator="\n")
+        self._file.write(text + f"{BATCH_MARKER}{len(frame)}\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+        self._header = False
+        self.rows += len(frame)
+
+    def close (self):
+        """Writes the footer and closes the file
+        """
+
+        if self._file.closed:
+            return
+        self._file.write(f"{END_MARKER}{self.rows}\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+    def __enter__ (self):
+        return self
+
+    def __exit__ (self, *args):
+        self.close()
+
+def recover (path: str) -> pd.DataFrame:
+    """Loads the samples of a file written by `SampleWriter`, up to its last
+    complete batch
+
+    Args:
+        path (str): The file
+
+    Returns:
+        pd.DataFrame: The samples. `attrs["complete"]` tells whether the file was closed
+    """
+
+    with open(path, "r", newline="") as file:
+        text = file.read()
+
+    # Anything after the last batch marker was not synced
+    end = text.rfind("\n" + BATCH_MARKER)
+    complete = text.rstrip("\n").rsplit("\n", 1)[-1].startswith(END_MARKER)
+    if end < 0:
+        data = pd.DataFrame({ name: pd.Series(dtype=DTYPES.get(name, object)) for name in COLUMNS })
+    else:
+        data = pd.read_csv(io.StringIO(text[:end + 1]), comment="#", dtype=DTYPES)
+        for name in CATEGORICAL:
+            data[name] = data[name].astype("category")
+
+    data.attrs["complete"] = complete
+    return data
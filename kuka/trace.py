@@ -1,6 +1,5 @@
 from .handler import KUKA_Handler
 import xml.etree.ElementTree as et
-from time import sleep
 import os
 import shutil
 import re
@@ -9,6 +8,8 @@ from typing import List, Dict, Tuple
 from pathlib import Path
 import pandas as pd
 
+from .resample import METHOD_HOLD, METHOD_LINEAR, align, resample
+
 class DatFile:
 
     sampling: float = 0
@@ -34,6 +35,17 @@ class KUKA_Trace:
     # The folder of the robot containing the traces
     trace_root: Path = None
 
+    # Longest time for $TRACE.STATE to follow a $TRACE.MODE change, in seconds
+    state_timeout = 1.0
+
+    # Longest time for the controller to write a stopped trace, in seconds
+    write_timeout = 10.0
+
+    # Resampling of the slower modules on the time base of the fastest one :
+    # "linear", "hold" or "polyphase", and the method of the channels containing each key
+    resampling = METHOD_LINEAR
+    resampling_methods = { "AnalogOut": METHOD_HOLD }
+
     # Translations from German to English
     translations = {
         "Sollposition":                 "Position_Command",
@@ -73,9 +85,13 @@ class KUKA_Trace:
         configuration = parameters[1]
         duration = parameters[2]
         if self.enable:
-            config_path = fr'\\{self.rob_instance.ipAddress}\roboter\TRACE\{configuration}.xml'
+            # Folder of the traces on the controller, given by the cell registry
+            share = self.rob_instance.trace_share
+            if share is None:
+                share = f'\\\\{self.rob_instance.ipAddress}\\roboter\\TRACE\\'
+            config_path = os.path.join(share, f'{configuration}.xml')
 
-            self.trace_root = Path(f'\\\\{self.rob_instance.ipAddress}\\roboter\\TRACE\\')
+            self.trace_root = Path(share)
 
             # try:         # Comented to not modify the xml file
             #     tree = et.parse(config_path)
@@ -90,17 +106,17 @@ class KUKA_Trace:
             #     print(f"XML writing error: {e}")
 
             if type(name) == str and type(configuration) == str:
-                self.rob_instance.KUKA_WriteVar('$TRACE.CONFIG[]', f'"{configuration}.xml"')
-                self.rob_instance.KUKA_WriteVar('$TRACE.NAME[]', f'"{name}"')
+                self.rob_instance.KUKA_WriteMany({
+                    '$TRACE.CONFIG[]': f'"{configuration}.xml"',
+                    '$TRACE.NAME[]': f'"{name}"',
+                })
                 self.name = name
                 self.config = configuration
             else:
                 print('Expected input type: string')
                 return False
-            new_name_raw = self.rob_instance.KUKA_ReadVar('$TRACE.NAME[]')
+            new_name_raw, new_config_raw = self.rob_instance.KUKA_ReadMany(['$TRACE.NAME[]', '$TRACE.CONFIG[]'])
             new_name = new_name_raw.decode('UTF-8').strip('"')
-
-            new_config_raw = self.rob_instance.KUKA_ReadVar('$TRACE.CONFIG[]')
             new_config = new_config_raw.decode('UTF-8').strip('"').strip('.xml')
             if new_name != name:
                 print(f'Trace name: {name} is unavailable, try different trace name.')
@@ -121,8 +137,7 @@ class KUKA_Trace:
         """
         if self.enable:
             self.rob_instance.KUKA_WriteVar('$TRACE.MODE', '#T_START')
-            sleep(0.2)
-            if self.rob_instance.KUKA_ReadVar('$TRACE.STATE') in [b'#T_WAIT', b'#TRIGGERED']:
+            if self.rob_instance.KUKA_WaitFor(['$TRACE.STATE'], lambda state: state[0] in [b'#T_WAIT', b'#TRIGGERED'], self.state_timeout):
                 return True
             else:
                 print(f'Error in trace configuration {self.config}')
@@ -136,11 +151,21 @@ class KUKA_Trace:
         """
         if self.enable:
             self.rob_instance.KUKA_WriteVar('$TRACE.MODE', '#T_STOP')
-            if self.rob_instance.KUKA_ReadVar('$TRACE.STATE') in [b'#T_END', b'#T_WRITING']:
+            if self.rob_instance.KUKA_WaitFor(['$TRACE.STATE'], lambda state: state[0] in [b'#T_END', b'#T_WRITING'], self.state_timeout):
                 print('Trace stopped')
             else:
                 print("Failed to stop the trace")
 
+    def Trace_WaitWritten(self):
+        """
+        Waits for the stopped trace to be written to the hard drive, so that its files can be copied
+        and a new recording started
+        :return: True if the trace is written, False if it is still being written after write_timeout
+        """
+        if self.enable:
+            return self.rob_instance.KUKA_WaitFor(['$TRACE.STATE'], lambda state: state[0] == b'#T_END', self.write_timeout)
+        return False
+
     def Trace_State(self):
         """
         :return: Returns string containing current state of trace recording
@@ -168,9 +193,14 @@ class KUKA_Trace:
             else:
                 return False
 
-    def Trace_Download(self):
+    def Trace_Download(self, name: str = None):
+        """
+        Copies and parses the files of a trace
+        :param name: The name of the trace. Defaults to the last configured one
+        :return: The trace DataFrame
+        """
         if self.enable:
-            result = self.read_traces(self.name)
+            result = self.read_traces(name if name is not None else self.name)
             return result
         return None
 
@@ -180,7 +210,7 @@ class KUKA_Trace:
         
         return value
 
-    def copy_to_local (self, pairs: List[List[Path]], name: str):
+    def copy_to_local (self, pairs: List[List[Path]], name: str) -> Path:
 
         src_folder = None
         if type (self.trace_root) == str :
@@ -188,10 +218,11 @@ class KUKA_Trace:
         else:
             src_folder = self.trace_root.absolute()
 
-        self.dest_folder = self.temp_folder.joinpath(name).absolute()
+        dest_folder = self.temp_folder.joinpath(name).absolute()
+        self.dest_folder = dest_folder
 
-        if not self.dest_folder.exists():
-            self.dest_folder.mkdir(parents=True)
+        if not dest_folder.exists():
+            dest_folder.mkdir(parents=True)
 
         for pair in pairs:
             for file in pair:
@@ -200,10 +231,12 @@ class KUKA_Trace:
                     src = src_folder + str(file)
                 else:
                     src = src_folder.joinpath(file)
-                dest = self.dest_folder.joinpath(file)
+                dest = dest_folder.joinpath(file)
                 shutil.copyfile(src, dest)
                 src.unlink()
 
+        return dest_folder
+
     def find_pairs (self, name: str):
 
         extensions = ['.dat', '.r64', ".trc"]
@@ -270,65 +303,58 @@ class KUKA_Trace:
 
         return out
 
-    def convert_r64 (self, r64: Path, dat: DatFile) -> Dict[str, List[float]]:
-
-        out: Dict[str, List[float]] = {}
-
-        for col in dat.traces:
-            out[col] = []
+    def convert_r64 (self, r64: Path, dat: DatFile) -> Dict[str, np.ndarray]:
+        """
+        Reads the samples of a module, scaled by the factors of its channels
+        :param r64: The .r64 file, the float64 samples of the channels one after the other
+        :param dat: The channels of the module, read from its .dat file
+        :return: The samples of each channel
+        """
 
         N = len(dat.traces)
+        if N == 0:
+            return {}
 
-        with open(r64, "rb") as file:
+        # An empty file can not be mapped
+        if os.path.getsize(r64) == 0:
+            return { col: np.zeros(0) for col in dat.traces }
 
-            samples = np.fromfile(file, dtype='float64')
-            length = len(samples) // N
+        # The file is mapped rather than read, and seen as one row per sample
+        samples = np.memmap(r64, dtype='float64', mode='r')
+        length = len(samples) // N
+        view = samples[:length * N].reshape(length, N)
 
-            for i in range(length):
-                for n in range(N):
-                    col = dat.traces[n]
-                    out[col].append(samples[i * N + n] * dat.col241[n])
+        # Scaled in one step, channel by channel in memory so that each column is contiguous
+        scale = np.asarray(dat.col241[:N], dtype='float64')
+        columns = np.multiply(view.T, scale[:, None], order='C')
+        del samples, view
 
-        return out
+        return dict(zip(dat.traces, columns))
     
-    def linear_interpolation (self, data: List[float], ratio: int = 1):
+    def linear_interpolation (self, data: np.ndarray, ratio: int = 1) -> np.ndarray:
+        """
+        Upsamples a channel by an integer ratio, interpolating between the neighbouring samples
+        :param data: The samples
+        :param ratio: The number of output samples per input sample
+        :return: The upsampled channel, the last sample held
+        """
         if ratio == 1:
             return data
-        
-        data_len = len(data)
-        neo_len = data_len * ratio
-
-        neo = np.zeros(neo_len)
-        neo[::ratio] = data
-
-        for i in range(1,neo_len):
-            # Skip existing data points
-            if i % ratio == 0:
-                continue
-            
-            k = i // ratio
-            if (k + 1) >= data_len:
-                neo[i] = data[k]
-                continue
-
-            a = data[k+1] - data[k]
-            b = data[k+1] - a
-
-            neo[i] = (k / ratio) * a + b
 
-        return neo            
+        return resample(data, ratio, 1, len(data) * ratio, METHOD_LINEAR)
 
     def read_traces (self, name: str):
 
         pairs = self.find_pairs(name)
-        self.copy_to_local(pairs, name)
+        # Several traces can be read at the same time by the workers of a TracePipeline
+        dest_folder = self.copy_to_local(pairs, name)
         self.copy_to_local([[f'{name}_PROG.TXT']], name)
 
         data: List[Tuple[DatFile, Dict[str, List[float]]]] = []
 
         for pair in pairs:
 
-            dat_path = self.dest_folder.joinpath(pair[0])
+            dat_path = dest_folder.joinpath(pair[0])
 
             suffix = ""
             if '#' in dat_path.stem:
@@ -337,48 +363,21 @@ class KUKA_Trace:
 
             dat = self.read_dat(dat_path, suffix)
 
-            r64_path = self.dest_folder.joinpath(pair[1])
+            r64_path = dest_folder.joinpath(pair[1])
             r64 = self.convert_r64(r64_path, dat)
 
             data.append((dat, r64))
 
-        min_sampling = data[0][0].sampling
-        for d in data:
-            min_sampling = min(d[0].sampling, min_sampling)
+        # Every module on the time base of the fastest one
+        min_sampling, columns = align(
+            [ (dat.sampling, { col: v[:dat.length or None] for col, v in values.items() }) for dat, values in data ],
+            self.resampling_methods,
+            self.resampling
+        )
 
-        min_length = 12e9
-        for d in data:
-            ratio = int(d[0].sampling // min_sampling)
-            min_length = min(d[0].length * ratio, min_length)
-
-        length = min_length
-
-        dataframe = pd.DataFrame()
-
-        for d in data:
-            dat = d[0]
-            ratio = int(dat.sampling // min_sampling)
-
-            values = d[1]
-
-            for col in values:
-
-                if ratio > 1:
-                    
-                    if "AnalogOut" in col:
-                        # Step interpolation
-                        temp = np.zeros(len(values[col]) * ratio)
-                        for i in range(ratio):
-                            temp[i::ratio] = values[col]
-                        dataframe[col] = temp[:length]
-                    else:
-                        # Linear interpolation
-                        dataframe[col] = self.linear_interpolation(values[col], ratio)[:length]
-
-                else:
-                    dataframe[col] = np.float64(values[col])[:length]
+        dataframe = pd.DataFrame(columns)
 
-        T = len(dataframe[dataframe.columns[0]])
+        T = len(dataframe.index)
         dataframe["Sample_time"] = np.arange(T) * min_sampling
 
         return dataframe[[dataframe.columns[-1], *dataframe.columns[:-1]]]
@@ -0,0 +1,151 @@
+from threading import Condition, Event, Thread
+from time import perf_counter
+from typing import Any, Callable, Dict, List
+
+from .pool import PRIORITY_CONTROL
+
+class KUKA_Watcher:
+    """Polls the variables that callers are waiting on, all of them in one
+    batched request per period, and wakes the callers whose condition is met.
+
+    A single background thread replaces the sleep-and-read loops of each
+    caller : however many callers wait, the robot sees one request per period.
+    """
+
+    def __init__(self, handler, period: float = 0.02, priority: int = PRIORITY_CONTROL):
+        """Creates a watcher. Its thread starts with the first wait.
+
+        Args:
+            handler (KUKA_Handler): The connection to the robot
+            period (float, optional): The time between two polls, in seconds. Defaults to 0.02.
+            priority (int, optional): The priority of the polls. Defaults to PRIORITY_CONTROL.
+        """
+
+        self.handler = handler
+        self.period = period
+        self.priority = priority
+
+        self._cond = Condition()
+        self._wake = Event()
+        self._thread: Thread = None
+        self._running = False
+
+        # Number of callers watching each variable
+        self._watched: Dict[str, int] = {}
+        self._values: Dict[str, Any] = {}
+
+        # Number of completed polls, and whether one is in progress
+        self._polls = 0
+        self._polling = False
+
+    def _watch (self, vars: List[str]):
+        with self._cond:
+            for var in vars:
+                self._watched[var] = self._watched.get(var, 0) + 1
+            if self._thread is None or not self._thread.is_alive():
+                self._running = True
+                self._thread = Thread(target=self._run, name=f"KUKA_Watcher {self.handler.ipAddress}", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+        self._wake.set()
+
+    def _unwatch (self, vars: List[str]):
+        with self._cond:
+            for var in vars:
+                self._watched[var] -= 1
+                if self._watched[var] == 0:
+                    del self._watched[var]
+                    self._values.pop(var, None)
+
+    def _run (self):
+        """Polling loop of the background thread
+        """
+
+        while True:
+            with self._cond:
+                while self._running and not self._watched:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                vars = list(self._watched)
+                self._polling = True
+
+            values = self.handler.KUKA_ReadMany(vars, self.priority)
+
+            with self._cond:
+                self._values.update(zip(vars, values))
+                self._polls += 1
+                self._polling = False
+                self._cond.notify_all()
+
+            self._wake.wait(self.period)
+            self._wake.clear()
+
+    def get (self, var: str) -> Any:
+        """Gives the latest polled value of a watched variable
+
+        Args:
+            var (str): The variable
+
+        Returns:
+            Any: The value, None if the variable is not watched
+        """
+
+        with self._cond:
+            return self._values.get(var)
+
+    def wait_for (self, vars: List[str], predicate: Callable[[list], bool], timeout: float = None) -> bool:
+        """Waits until the values of variables match a predicate. Only values
+        read after the call are checked.
+
+        Args:
+            vars (List[str]): The variables to watch
+            predicate (Callable[[list], bool]): Checks the values, given in the order of `vars`
+            timeout (float, optional): The longest time to wait, in seconds. Defaults to None (forever).
+
+        Returns:
+            bool: The predicate is true, False on timeout
+        """
+
+        deadline = None if timeout is None else perf_counter() + timeout
+
+        self._watch(vars)
+        try:
+            with self._cond:
+                # A poll already in progress may have been sent before the call
+                fresh = self._polls + (2 if self._polling else 1)
+                while True:
+                    if self._polls >= fresh and predicate([ self._values.get(var) for var in vars ]):
+                        return True
+                    remaining = None if deadline is None else deadline - perf_counter()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+        finally:
+            self._unwatch(vars)
+
+    def wait_until (self, var: str, value: Any, timeout: float = None) -> bool:
+        """Waits until a variable has a value
+
+        Args:
+            var (str): The variable to watch
+            value (Any): The expected value, like True or b'#T_END'
+            timeout (float, optional): The longest time to wait, in seconds. Defaults to None (forever).
+
+        Returns:
+            bool: The variable has the value, False on timeout
+        """
+
+        return self.wait_for([ var ], lambda values: values[0] == value, timeout)
+
+    def close (self):
+        """Stops the background thread
+        """
+
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self._wake.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join()
+        self._thread = None
@@ -1,11 +1,12 @@
 # Local Imports
 from ui import MainWindow, Measure_robot, Measure_latency
-from kuka import KUKA_Handler
+from kuka import KUKA_Handler, PRIORITY_UI, CellRegistry, RunBarrier
 
 # Libs
 import traceback
 import PySimpleGUI as sg
-from threading import Semaphore, Thread
+from threading import Thread
+from multiprocessing import freeze_support
 from typing import List, Any
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -20,17 +21,18 @@ class MainProgram (MainWindow):
     window_latency = []
 
     ### ---- Robots ---- ###
-    robot_handlers: List[KUKA_Handler] = [ None ] * 3
+    robot_handlers: List[KUKA_Handler] = [ ]
     robot_windows: List[Measure_robot] = [ ]
     
     ### ---- Sync Mechanism ---- ###
-    sync_done = 0
-    sync_number = 0
-    sync_sem = Semaphore(0)
+    barrier: RunBarrier = None
+    skew_reported = True
 
     ### ---- Methods ---- ###
     def __init__(self):
-        super().__init__() # super : access to the inherited class MainWindow
+        self.cells = CellRegistry.load()
+        self.robot_handlers = [ None ] * len(self.cells)
+        super().__init__(self.cells) # super : access to the inherited class MainWindow
 
         self.update_disabled_ui()
 
@@ -38,10 +40,10 @@ class MainProgram (MainWindow):
         """Establishes a connection to a robot
 
         Args:
-            cell (int): The number of the cell (from 1 to 3)
+            cell (int): The number of the cell, in the cell registry
         """        
 
-        handler = KUKA_Handler(f"192.168.1.15{cell}", 7000)
+        handler = self.cells.get(cell).handler()
 
         try:
             ok = handler.KUKA_Open()
@@ -54,7 +56,7 @@ class MainProgram (MainWindow):
             self.write_event_value(f"-rob_errored:{cell}-", None)
             return
 
-        self.robot_handlers[cell - 1] = handler    
+        self.robot_handlers[self.cells.index(cell)] = handler    
         self.write_event_value(f"-rob_connected:{cell}-", None)
 
     def update_disabled_ui (self):
@@ -75,21 +77,6 @@ class MainProgram (MainWindow):
                 
         self.collection_settings.update_robot_buttons()
     
-    def done (self):
-        """Called when a robot has collected the samples for a run. 
-        Unlocks the syncing mechanism if all robots are done
-        """        
-
-        self.sync_done += 1
-
-        sync_number = 0
-        for w in self.robot_windows:
-            sync_number += 1 if w is not None and not w.collecting_data_done else 0
-
-        if self.sync_done == sync_number:
-            self.sync_done = 0
-            self.sync_sem.release(sync_number)
-
     def close (self):
         """Closes the main program
         """        
@@ -112,6 +99,7 @@ class MainProgram (MainWindow):
         # Collection method choice 
         dosysvar_method = bool(self.collection_settings.docollect_sysvar.get())
         dotrace_method = bool(self.collection_settings.docollect_trace.get())
+        isolated = bool(self.collection_settings.docollect_process.get())
         
         # Check if one collection method is selected
         if not dosysvar_method and not dotrace_method:
@@ -128,12 +116,11 @@ class MainProgram (MainWindow):
         for i in range(len(self.robot_handlers)):
             r = self.robot_handlers[i]
             if r is not None:
-                self.robot_windows.append(Measure_robot(r, i + 1, dosysvar_method, dotrace_method, file_path))
+                self.robot_windows.append(Measure_robot(r, self.cells[i], dosysvar_method, dotrace_method, file_path, isolated=isolated))
 
-        # Initializing the sync mechanism
-        self.sync_number = len(self.robot_windows)
-        self.sync_sem = Semaphore(0)
-        self.sync_done = 0
+        # Initializing the sync mechanism : the runs of all the robots start together
+        self.barrier = RunBarrier(len(self.robot_windows))
+        self.skew_reported = False
 
         # Getting the configuration
         A_iter = [ values[f'num_of_iter{i}'] for i in range(1,7) ]
@@ -141,6 +128,15 @@ class MainProgram (MainWindow):
         sampling = values["-Sys_sampling-"]
         trace_sampling = values["-Trace_config-"]
 
+        # Running each robot in its own process : the collectors sync their
+        # runs with the barrier in shared memory, and the windows read their progress
+        if isolated:
+            for r in self.robot_windows:
+                r._poll()    # Forces the window to open
+                r.start_process(A_iter, speed, sampling, trace_sampling, self.get_category(r.cell), self.barrier)
+            self.barrier.start()
+            return
+
         # Running the collection for each robot
         for r in self.robot_windows:
             
@@ -152,13 +148,13 @@ class MainProgram (MainWindow):
                 args=[ 
                     A_iter, speed, sampling, trace_sampling,    # Collection settings
                     self.get_category(r.cell),                  # Sample class
-                    self.sync_sem, lambda: self.done()          # Sync mechanism
+                    self.barrier                                # Sync mechanism
                 ], 
                 daemon=False)
             t.start()
 
         # Unlock the robots at the same time
-        self.sync_sem.release(self.sync_number)
+        self.barrier.start()
 
     def measure_latencies (self):
         """Runs a latency measurement for each connected robot
@@ -169,7 +165,7 @@ class MainProgram (MainWindow):
             for i in range(len(self.robot_handlers)):
                 r = self.robot_handlers[i]
                 if r is not None:
-                    w = Measure_latency(f"Latency measurement for Robot {i + 1}")
+                    w = Measure_latency(f"Latency measurement for {self.cells[i].name}")
                     w._poll()
                     self.window_latency.append(w)
                     t = Thread(target=w.measure_latency, args=[r], daemon=False)
@@ -183,28 +179,30 @@ class MainProgram (MainWindow):
         """Toggles a robot state
 
         Args:
-            cell (int): From 1 to 3, the number of the cell
+            cell (int): The number of the cell, in the cell registry
         """     
 
+        i = self.cells.index(cell)
+
         # The robot is already connected   
-        if self.robot_handlers[cell - 1] is not None:
-            print(f"Trying to disconnect from robot {cell}")
-            self.collection_settings.set_robot_connected(cell - 1, False)
-            self.robot_handlers[cell - 1].KUKA_Close()
-            self.robot_handlers[cell - 1] = None
+        if self.robot_handlers[i] is not None:
+            print(f"Trying to disconnect from {self.cells[i].name}")
+            self.collection_settings.set_robot_connected(i, False)
+            self.robot_handlers[i].KUKA_Close()
+            self.robot_handlers[i] = None
             self.update_disabled_ui()
             return
 
         # Connecting to the robot
         self.update_disabled_ui()
-        print(f"Trying to connect to robot {cell}")
+        print(f"Trying to connect to {self.cells[i].name} ({self.cells[i].address})")
         self.perform_long_operation(lambda: self.open_cell(cell), "-connect-call-end-")
 
     def gripper_open (self):
         """Tries to open the gripper of the selected robot
         """        
         if self.robot_handlers[self.gripper._robot_choice - 1] is not None:
-            self.robot_handlers[self.gripper._robot_choice - 1].KUKA_WriteVar('PyOPEN_GRIPPER', True)
+            self.robot_handlers[self.gripper._robot_choice - 1].KUKA_WriteVar('PyOPEN_GRIPPER', True, PRIORITY_UI)
             self.gripper._btn_open.update(disabled=True)
             self.gripper._btn_close.update(disabled=False)
 
@@ -212,7 +210,7 @@ class MainProgram (MainWindow):
         """Tries to close the gripper of the selected robot
         """        
         if self.robot_handlers[self.gripper._robot_choice - 1] is not None:
-            self.robot_handlers[self.gripper._robot_choice - 1].KUKA_WriteVar('PyCLOSE_GRIPPER', True)
+            self.robot_handlers[self.gripper._robot_choice - 1].KUKA_WriteVar('PyCLOSE_GRIPPER', True, PRIORITY_UI)
             self.gripper._btn_open.update(disabled=False)
             self.gripper._btn_close.update(disabled=True)
 
@@ -303,12 +301,12 @@ class MainProgram (MainWindow):
                 
             if "rob_connected" in event:
                 cell = int(event.split(':')[1][:-1])
-                self.collection_settings.set_robot_connected(cell - 1, True)
+                self.collection_settings.set_robot_connected(self.cells.index(cell), True)
                 self.update_disabled_ui()
 
             if "rob_errored" in event:
                 cell = int(event.split(':')[1][:-1])
-                self.collection_settings.set_robot_connected(cell - 1, False, True)
+                self.collection_settings.set_robot_connected(self.cells.index(cell), False, True)
                 self.update_disabled_ui()
 
             ## ---- Gripper Events ---- ##
@@ -363,7 +361,15 @@ class MainProgram (MainWindow):
                     self.robot_windows[i] = None    
                     continue
 
+            # Reporting how closely the runs of the robots started
+            if not self.skew_reported and all(w is None or w.collecting_data_done for w in self.robot_windows):
+                self.skew_reported = True
+                skews = self.barrier.summary()
+                if skews["runs"] > 0:
+                    print(f"Runs started within {skews['max_skew_ms']:.1f} ms of each other (mean {skews['mean_skew_ms']:.1f} ms over {skews['runs']} runs)")
+
 if __name__ == "__main__":
+    freeze_support()
     main = MainProgram()
     main.run()
     main.close()
\ No newline at end of file
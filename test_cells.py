@@ -0,0 +1,61 @@
+"""Checks the registry of the robot cells of kuka.cells
+
+Usage : python -m pytest test_cells.py
+"""
+
+import json
+
+import pytest
+
+from kuka.cells import REGISTRY_FILE, Cell, CellRegistry
+
+CONFIG = {
+    "defaults": { "port": 7001, "pool_size": 3 },
+    "cells": [
+        { "cell": 1, "address": "192.168.1.151" },
+        { "cell": 4, "address": "10.0.0.4", "name": "Press line", "load": 0, "port": 7000 },
+    ],
+}
+
+def write (path, config) -> str:
+    path.write_text(json.dumps(config))
+    return str(path)
+
+def test_load (tmp_path):
+    registry = CellRegistry.load(write(tmp_path / "cells.json", CONFIG))
+    assert registry.numbers == [ 1, 4 ]
+    assert len(registry) == 2
+
+    first, press = registry
+    assert (first.port, first.pool_size, first.name, first.load) == (7001, 3, "Robot 1", -1)
+    assert (press.port, press.pool_size, press.name, press.load) == (7000, 3, "Press line", 0)
+    assert registry.get(4) is press
+    assert registry.index(4) == 1
+    with pytest.raises(KeyError):
+        registry.get(2)
+
+def test_round_trip (tmp_path):
+    registry = CellRegistry.load(write(tmp_path / "cells.json", CONFIG))
+    registry.save(str(tmp_path / "saved.json"))
+    saved = CellRegistry.load(str(tmp_path / "saved.json"))
+    assert [ cell.to_dict() for cell in saved ] == [ cell.to_dict() for cell in registry ]
+    assert saved.path == str(tmp_path / "saved.json")
+
+def test_default (tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    registry = CellRegistry.load()
+    assert registry.numbers == [ 1, 2, 3 ]
+    assert registry[2].address == "192.168.1.153"
+
+    registry.save()
+    assert (tmp_path / REGISTRY_FILE).exists()
+
+def test_invalid (tmp_path):
+    with pytest.raises(ValueError):
+        CellRegistry([ Cell(1, "10.0.0.1"), Cell(1, "10.0.0.2") ])
+    with pytest.raises(ValueError):
+        CellRegistry.load(write(tmp_path / "a.json", { "cells": [ { "cell": 1 } ] }))
+    with pytest.raises(ValueError):
+        CellRegistry.load(write(tmp_path / "b.json", { "cells": [ { "cell": 1, "address": "x", "speed": 1 } ] }))
+    with pytest.raises(ValueError):
+        CellRegistry.load(write(tmp_path / "c.json", { "cells": [] }))
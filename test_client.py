@@ -0,0 +1,79 @@
+"""Checks the resend of the C3 Bridge clients after a reconnection : only
+the requests of a burst not done yet are sent again
+
+Usage : python -m pytest test_client.py
+"""
+
+import asyncio
+import socket
+import struct
+import threading
+
+import pytest
+
+from kuka.aio import openshowvar_async
+from kuka.kukavarproxy import openshowvar
+
+@pytest.fixture
+def bridge ():
+    """A C3 Bridge answering "7" to every request, whose first connection
+    closes after its second response. Yields its port and the requests it
+    received : connection, read (0) or write (1) and variable.
+    """
+
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen()
+    log = []
+
+    def serve ():
+        for connection in range(2):
+            client, _ = server.accept()
+            buffer = b""
+            answered = 0
+            while connection > 0 or answered < 2:
+                data = client.recv(4096)
+                if not data:
+                    break
+                buffer += data
+                while len(buffer) >= 4 and (connection > 0 or answered < 2):
+                    msg_id, length = struct.unpack("!HH", buffer[:4])
+                    if len(buffer) < 4 + length:
+                        break
+                    body, buffer = buffer[4:4 + length], buffer[4 + length:]
+                    mode, size = body[0], struct.unpack("!H", body[1:3])[0]
+                    log.append((connection, mode, body[3:3 + size].decode()))
+                    client.sendall(struct.pack("!HHBH", msg_id, 6 + 1, mode, 1) + b"7" + b"\x00\x01\x01")
+                    answered += 1
+            client.close()
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    yield server.getsockname()[1], log
+    server.close()
+
+# The write is posted first, the first connection then answers it and A
+EXPECTED = [ (0, 1, "W"), (0, 0, "A"), (1, 0, "B"), (1, 0, "C") ]
+
+def test_resend (bridge):
+    port, log = bridge
+    client = openshowvar("127.0.0.1", port)
+    try:
+        assert client.read_many([ "A", "B", "C" ], writes=[ ("W", "1") ]) == [ b"7" ] * 3
+    finally:
+        client.close()
+    assert log == EXPECTED
+
+def test_resend_async (bridge):
+    port, log = bridge
+
+    async def run ():
+        client = openshowvar_async("127.0.0.1", port)
+        await client.connect()
+        try:
+            return await client.read_many([ "A", "B", "C" ], writes=[ ("W", "1") ])
+        finally:
+            await client.close()
+
+    assert asyncio.run(run()) == [ b"7" ] * 3
+    assert log == EXPECTED
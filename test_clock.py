@@ -0,0 +1,55 @@
+"""Checks the clock alignment of kuka.clock on synthetic readings of
+$TIMER[1]
+
+Usage : python -m pytest test_clock.py
+"""
+
+import numpy as np
+import pytest
+
+from kuka.clock import ClockSync
+
+# The robot clock runs 50 ppm fast, and $TIMER[1] was reset at perf_counter() = 100 s
+DRIFT = 50e-6
+RESET = 100.0
+
+def readings (at: float, round_trips = (0.004, 0.001, 0.003)):
+    """Readings of $TIMER[1] around perf_counter() = at, the best one last but one"""
+
+    out = []
+    for rtt in round_trips:
+        timer = (at - RESET) * (1 + DRIFT) * 1000
+        out.append((at - rtt / 2, timer, at + rtt / 2))
+        at += 0.01
+    return out
+
+def test_not_synced ():
+    clock = ClockSync()
+    assert not clock.synced
+    assert not clock.add([])
+    assert np.isnan(clock.to_host([ 0.0, 12.0 ])).all()
+
+def test_offset ():
+    clock = ClockSync()
+    assert clock.add(readings(110.0))
+    assert clock.synced
+    # A single synchronisation does not see the drift, 0.5 ms after 10 s
+    assert clock.offset == pytest.approx(clock._epoch + RESET, abs=1e-3)
+
+    summary = clock.summary()
+    assert summary["syncs"] == 1
+    assert summary["uncertainty_ms"] == pytest.approx(0.5)
+
+def test_drift ():
+    clock = ClockSync()
+    clock.add(readings(110.0))
+    clock.add(readings(410.0))
+    assert clock.summary()["drift_ppm"] == pytest.approx(50, abs=0.1)
+
+    # $TIMER[1] of perf_counter() = 300 s
+    timer = (300.0 - RESET) * (1 + DRIFT) * 1000
+    assert clock.to_host([ timer ])[0] == pytest.approx(clock._epoch + 300.0, abs=1e-6)
+
+    clock.reset()
+    assert not clock.synced
+    assert clock.drift == 0.0
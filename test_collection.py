@@ -0,0 +1,190 @@
+"""Runs system variables collections against the simulated cell of
+kuka.simulator, in each transfer mode of the data reader
+
+Usage : python -m pytest test_collection.py
+"""
+
+import asyncio
+from threading import BrokenBarrierError
+
+import numpy as np
+import pytest
+
+from kuka import KUKA_AsyncDataReader, KUKA_AsyncHandler, KUKA_DataReader, KUKA_Handler, acquire_all
+from kuka import aio
+from kuka.channels import ChannelSet
+from kuka.simulator import KRL_Simulator
+
+# One iteration of A1, at 12 ms
+A_ITER = [ "1", "0", "0", "0", "0", "0" ]
+SPEED = "50"
+SAMPLING = "12"
+
+# Settings of the data reader in each mode
+MODES = {
+    "handshake": { "block_mode": False, "write_behind": False },
+    "block": { "block_mode": True, "write_behind": False },
+    "write_behind": { "block_mode": True, "write_behind": True },
+    "channels": { "channels": ChannelSet.of("Torque", "Current") },
+    "drain": { "drain": True, "drain_period": 0.05 },
+}
+
+@pytest.fixture
+def simulator ():
+    simulator = KRL_Simulator(latency=0.002, jitter=0.001, move_time=0.15, seed=0)
+    port = simulator.start_in_thread()
+    yield simulator, port
+    simulator.stop()
+
+def configure (reader: KUKA_DataReader, mode: str) -> KUKA_DataReader:
+    for name, value in MODES[mode].items():
+        setattr(reader, name, value)
+    return reader
+
+def check (simulator: KRL_Simulator, reader: KUKA_DataReader, data):
+    """The run gave every sample taken by the sub, once and in order"""
+
+    sampled = simulator.vars["SAMPLE_NUMBER"] - 1
+    assert sampled > 0
+    assert len(data) == sampled
+    assert list(data.columns) == reader.channels.columns
+    assert np.array_equal(data["Queue_Read"], np.arange(1, sampled + 1))
+    assert np.all(np.diff(data["Sample_time"]) > 0)
+
+    losses = reader.losses.summary()
+    assert losses["lost"] == 0
+    assert losses["overruns"] == 0
+    assert data["Gap"].sum() == 0
+
+@pytest.mark.parametrize("mode", MODES)
+def test_acquire (simulator, mode):
+    simulator, port = simulator
+    handler = KUKA_Handler("127.0.0.1", port)
+    assert handler.KUKA_Open()
+
+    try:
+        reader = configure(KUKA_DataReader(handler, True, False), mode)
+        data, trace = reader.acquire(A_ITER, SPEED, SAMPLING)
+    finally:
+        handler.KUKA_Close()
+
+    assert trace is None
+    check(simulator, reader, data)
+
+@pytest.mark.parametrize("mode", MODES)
+def test_acquire_async (simulator, mode):
+    simulator, port = simulator
+
+    async def run ():
+        handler = KUKA_AsyncHandler("127.0.0.1", port)
+        assert await handler.KUKA_Open()
+        try:
+            reader = configure(KUKA_AsyncDataReader(handler, True, False), mode)
+            return reader, await reader.acquire(A_ITER, SPEED, SAMPLING)
+        finally:
+            await handler.KUKA_Close()
+
+    reader, (data, trace) = asyncio.run(run())
+
+    assert trace is None
+    check(simulator, reader, data)
+
+def test_drain_lapped ():
+    """Drained every second from a buffer of 60 samples, the sub laps the
+    reader : the overwritten samples are dropped and counted as overruns
+    """
+
+    simulator = KRL_Simulator(latency=0.002, move_time=0.6, buffer_size=60, seed=0)
+    port = simulator.start_in_thread()
+    handler = KUKA_Handler("127.0.0.1", port)
+    assert handler.KUKA_Open()
+
+    try:
+        reader = configure(KUKA_DataReader(handler, True, False), "drain")
+        reader.drain_period = 1.0
+        data, _ = reader.acquire(A_ITER, SPEED, SAMPLING)
+    finally:
+        handler.KUKA_Close()
+        simulator.stop()
+
+    assert 0 < len(data) < 60
+    assert np.all(np.diff(data["Sample_time"]) > 0)
+    assert reader.losses.summary()["overruns"] > 0
+
+    # The sub was acknowledged up to the last sample kept
+    assert simulator.vars["SAMPLE_READ"] == data["Queue_Read"].iloc[-1] % 60 + 1
+
+def test_readers_own_settings (simulator):
+    """The channels and the pending acknowledgement of a reader are not
+    shared with the other readers
+    """
+
+    simulator, port = simulator
+    handler = KUKA_Handler("127.0.0.1", port)
+    assert handler.KUKA_Open()
+
+    try:
+        chosen = KUKA_DataReader(handler, True, False)
+        chosen.channels = ChannelSet.of("Torque")
+        reader = KUKA_DataReader(handler, True, False)
+        assert reader._ack is not chosen._ack
+        data, _ = reader.acquire(A_ITER, SPEED, SAMPLING)
+    finally:
+        handler.KUKA_Close()
+
+    assert reader.channels == ChannelSet()
+    check(simulator, reader, data)
+
+@pytest.mark.parametrize("barrier", [ aio.Barrier, aio._Barrier ], ids=[ "asyncio", "fallback" ])
+def test_acquire_all (monkeypatch, barrier):
+    """Two cells collected together from one event loop, with the barrier
+    of the running Python and the one of Python 3.10
+    """
+
+    monkeypatch.setattr(aio, "Barrier", barrier)
+    simulators = [ KRL_Simulator(latency=0.002, jitter=0.001, move_time=0.15, seed=seed) for seed in range(2) ]
+    ports = [ simulator.start_in_thread() for simulator in simulators ]
+
+    async def run ():
+        handlers = [ KUKA_AsyncHandler("127.0.0.1", port) for port in ports ]
+        for handler in handlers:
+            assert await handler.KUKA_Open()
+        try:
+            readers = [ KUKA_AsyncDataReader(handler, True, False) for handler in handlers ]
+            return readers, await acquire_all(readers, A_ITER, SPEED, SAMPLING)
+        finally:
+            for handler in handlers:
+                await handler.KUKA_Close()
+
+    try:
+        readers, results = asyncio.run(run())
+    finally:
+        for simulator in simulators:
+            simulator.stop()
+
+    for simulator, reader, (data, trace) in zip(simulators, readers, results):
+        assert trace is None
+        check(simulator, reader, data)
+
+def test_barrier ():
+    """The barrier of Python 3.10 releases the tasks together, run after run,
+    and all of them once aborted
+    """
+
+    async def runs ():
+        barrier = aio._Barrier(2)
+        return [ sorted(await asyncio.gather(barrier.wait(), barrier.wait())) for _ in range(2) ]
+
+    assert asyncio.run(runs()) == [ [ 0, 1 ], [ 0, 1 ] ]
+
+    async def run ():
+        barrier = aio._Barrier(3)
+        waiting = [ asyncio.create_task(barrier.wait()) for _ in range(2) ]
+        await asyncio.sleep(0.01)
+        assert not any(task.done() for task in waiting)
+        await barrier.abort()
+        return await asyncio.gather(*waiting, barrier.wait(), return_exceptions=True)
+
+    for result in asyncio.run(run()):
+        assert isinstance(result, BrokenBarrierError)
+
@@ -0,0 +1,104 @@
+"""Checks the loss accounting of kuka.losses on synthetic indices and
+sample times
+
+Usage : python -m pytest test_losses.py
+"""
+
+import numpy as np
+
+from kuka.losses import LossMonitor
+
+def monitor (buffer_size: int = 100) -> LossMonitor:
+    losses = LossMonitor(alert=None)
+    losses.begin(0.012, buffer_size)
+    return losses
+
+def test_poll_follows_the_reader ():
+    losses = monitor()
+    assert losses.poll(10, 20, now=0.0) == 0
+    assert losses.poll(25, 40, now=0.24) == 0
+    assert losses.overruns == 0
+
+def test_poll_wrap_around ():
+    # Both indices wrap around the end of the buffer, 10 samples apart
+    losses = monitor()
+    assert losses.poll(95, 98, now=0.0) == 0
+    assert losses.poll(5, 8, now=0.12) == 0
+    assert losses.overruns == 0
+
+def test_poll_lapped_index ():
+    # 90 samples written while 10 are read, over 29 unread ones
+    losses = monitor()
+    assert losses.poll(50, 80, now=0.0) == 0
+    assert losses.poll(60, 70, now=0.0) == 1
+    assert losses.overruns == 1
+
+def test_poll_whole_turns ():
+    # The write index is 40 samples further, but 140 sample periods elapsed
+    losses = monitor()
+    assert losses.poll(10, 20, now=0.0) == 0
+    assert losses.poll(10, 60, now=1.68) == 1
+    assert losses.overruns == 1
+
+def test_skip ():
+    losses = monitor()
+    losses.poll(50, 80, now=0.0)
+    losses.skip(79, 80)
+    assert losses.poll(85, 86) == 0
+    assert losses.overruns == 0
+
+def test_check_jitter ():
+    # +/- 4 ms around a 12 ms period, and a late sample 2 periods after the previous one
+    losses = monitor(20000)
+    times = 12.0 * np.arange(1, 101) + np.tile([ -4.0, 4.0 ], 50)
+    times[60:] += 12.0
+    mask = losses.check(times, 100, 101, period=0.012)
+    assert mask.sum() == 0
+    assert losses.lost == 0
+    assert losses.gaps == []
+
+def test_check_gap ():
+    losses = monitor(20000)
+    times = 12.0 * np.arange(1, 11)
+    times[5:] += 24.0
+    mask = losses.check(times, 10, 11, period=0.012)
+    assert list(np.flatnonzero(mask)) == [ 5 ]
+    assert losses.lost == 2
+    assert losses.gaps == [ (60.0, 96.0, 2) ]
+
+def test_check_gap_between_readings ():
+    losses = monitor(20000)
+    losses.check(12.0 * np.arange(1, 6), 5, 6)
+    mask = losses.check(12.0 * np.arange(10, 13), 8, 9)
+    assert list(mask) == [ 1, 0, 0 ]
+    assert losses.lost == 4
+
+def test_check_empty_run ():
+    losses = monitor()
+    mask = losses.check(np.array([]), 0, 1)
+    assert len(mask) == 0
+    assert losses.follows(np.array([]))
+
+    summary = losses.summary()
+    assert summary["samples"] == 0
+    assert summary["lost"] == 0
+    assert summary["lost_ratio"] == 0.0
+    assert summary["max_gap"] == 0.0
+
+def test_check_single_sample ():
+    losses = monitor()
+    mask = losses.check(np.array([ 12.0 ]), 1, 2)
+    assert list(mask) == [ 0 ]
+    assert losses.samples == 1
+    assert losses.lost == 0
+    assert losses.follows(np.array([ 24.0 ]))
+    assert not losses.follows(np.array([ 12.0 ]))
+
+def test_keeping_up ():
+    messages = []
+    losses = monitor()
+    losses.alert = messages.append
+    losses.check(np.array([ 12.0 ]), 1, 2, keeping_up=False)
+    losses.check(np.array([ 24.0 ]), 2, 3, keeping_up=False)
+    assert not losses.summary()["keeping_up"]
+    assert len(messages) == 1
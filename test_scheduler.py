@@ -0,0 +1,76 @@
+"""Checks the decisions of kuka.scheduler on synthetic buffer occupancies,
+readings of ColKEEPING_UP and sample times
+
+Usage : python -m pytest test_scheduler.py
+"""
+
+from time import time
+
+import numpy as np
+import pytest
+
+from kuka.scheduler import (
+    DECISION_BACKOFF, DECISION_DRAIN, DECISION_STEADY, DECISION_THROTTLE, PollScheduler
+)
+
+RATE = 0.012
+
+@pytest.fixture
+def scheduler ():
+    return PollScheduler(RATE, 1000)
+
+def test_drain (scheduler):
+    assert scheduler.next_delay(10, 10) == 0.0
+    assert scheduler.decision == DECISION_DRAIN
+    assert scheduler.occupancy == 0.01
+
+def test_steady (scheduler):
+    now = time()
+    scheduler.observe_read(now, now + 0.002)
+    delay = scheduler.next_delay(0, 5)
+    assert scheduler.decision == DECISION_STEADY
+    assert 0.0 <= delay <= RATE
+    assert scheduler.rtt == pytest.approx(0.002, abs=1e-6)
+
+def test_backoff (scheduler):
+    delays = [ scheduler.next_delay(0, 0) for _ in range(6) ]
+    assert scheduler.decision == DECISION_BACKOFF
+    assert delays[:3] == pytest.approx([ RATE / 4, RATE / 2, RATE ])
+    assert delays[-1] == pytest.approx(4 * RATE)
+
+    # A new sample ends the back off
+    scheduler.next_delay(0, 1)
+    assert scheduler.next_delay(0, 0) == pytest.approx(RATE / 4)
+
+def test_throttle (scheduler):
+    scheduler.observe_keeping_up(False)
+    assert scheduler.next_delay(10, 10) == pytest.approx(RATE)
+    assert scheduler.decision == DECISION_THROTTLE
+
+    # Above the high watermark, the buffer is drained anyway
+    assert scheduler.next_delay(100, 10) == 0.0
+    assert scheduler.decision == DECISION_DRAIN
+
+    # A failed reading keeps the state of the sub
+    scheduler.observe_keeping_up(None)
+    scheduler.next_delay(10, 10)
+    assert scheduler.decision == DECISION_THROTTLE
+
+    scheduler.observe_keeping_up(True)
+    scheduler.next_delay(10, 10)
+    assert scheduler.decision == DECISION_DRAIN
+
+    assert scheduler.telemetry()["decisions"] == {
+        DECISION_DRAIN: 2, DECISION_STEADY: 0, DECISION_BACKOFF: 0, DECISION_THROTTLE: 2
+    }
+
+def test_median_period (scheduler):
+    assert scheduler.median_period == RATE
+
+    # The sub samples every 16 ms, with a gap of 10 samples
+    times = 16.0 * np.arange(1, 101)
+    times[50:] += 160.0
+    scheduler.observe_samples(times[:40])
+    scheduler.observe_samples(times[40:])
+    assert scheduler.median_period == pytest.approx(0.016)
+    assert scheduler.period > RATE
@@ -0,0 +1,93 @@
+"""Checks the columnar storage of kuka.store : the samples stored by runs
+come back as the DataFrames of the data reader
+
+Usage : python -m pytest test_store.py
+"""
+
+import numpy as np
+import pandas as pd
+
+from kuka.channels import ChannelSet
+from kuka.store import SampleStore, concat
+
+def rows (start: int, count: int, channels: ChannelSet) -> np.ndarray:
+    """Samples as laid out by the sub : 12 ms apart, A2 moving"""
+
+    out = np.zeros((count, channels.read + 1))
+    read = np.arange(start, start + count)
+    out[:, 0] = 12.0 * read
+    out[:, 1:channels.motor] = read[:, None] + np.arange(channels.motor - 1)
+    out[:, channels.motor] = 2
+    out[:, channels.read] = read
+    return out
+
+def test_round_trip ():
+    store = SampleStore(chunk=8)
+    store.begin(load=1, speed=50)
+    store.extend(rows(1, 5, store.channels), 6, 1.5)
+    store.extend(rows(6, 10, store.channels), 16, 2.5, np.eye(1, 10, 0, np.int8)[0])
+
+    data = store.frame()
+    assert len(store) == 15
+    assert store.last_read == 15
+    assert list(data.columns) == store.channels.columns
+    assert np.array_equal(data["Queue_Read"], np.arange(1, 16))
+    assert np.array_equal(data["Sample_time"], 12.0 * np.arange(1, 16))
+    assert np.array_equal(data[store.channels.data_columns[0]], np.arange(1, 16))
+    assert data["A2"].all() and not data["A1"].any()
+    assert list(data["Queue_Write"].unique()) == [ 6, 16 ]
+    assert list(data["Read_time"].unique()) == [ 1.5, 2.5 ]
+    assert list(data["Gap"]) == [ 0 ] * 5 + [ 1 ] + [ 0 ] * 9
+    assert list(data["Load"].cat.categories) == [ 1 ]
+    assert list(data["Speed"].unique()) == [ "50%" ]
+    assert data["Faulty"].sum() == 0
+    assert data["Host_time"].isna().all()
+
+def test_next_run ():
+    store = SampleStore(chunk=4)
+    store.begin(load=1, speed=50)
+    store.extend(rows(1, 5, store.channels), 6, 1.0)
+
+    store.begin(load=0, speed=30)
+    assert len(store) == 0
+    store.extend(rows(1, 3, store.channels), 4, 1.0)
+    data = store.frame()
+    assert np.array_equal(data["Queue_Read"], [ 1, 2, 3 ])
+    assert data["Faulty"].all()
+
+def test_flush ():
+    store = SampleStore(chunk=4)
+    store.begin(load=1, speed=50)
+    store.extend(rows(1, 5, store.channels), 6, 1.0)
+    assert len(store.flush()) == 5
+    store.discard()
+
+    store.extend(rows(6, 3, store.channels), 9, 1.0)
+    assert store.unflushed == 3
+    data = store.flush()
+    assert len(store) == 8
+    assert store.unflushed == 0
+    assert np.array_equal(data["Queue_Read"], [ 6, 7, 8 ])
+
+def test_channels ():
+    channels = ChannelSet.of("Torque")
+    store = SampleStore()
+    store.begin(channels=channels)
+    store.extend(rows(1, 3, channels), 4, 1.0)
+    data = store.frame()
+    assert list(data.columns) == channels.columns
+    assert np.array_equal(data["Torque_A6"], [ 6, 7, 8 ])
+
+def test_concat ():
+    store = SampleStore()
+    frames = []
+    for load, speed in ((0, 30), (1, 50)):
+        store.begin(load, speed)
+        store.extend(rows(1, 4, store.channels), 5, 1.0)
+        frames.append(store.frame())
+
+    data = concat(frames)
+    assert len(data) == 8
+    assert isinstance(data["Load"].dtype, pd.CategoricalDtype)
+    assert list(data["Load"]) == [ 0 ] * 4 + [ 1 ] * 4
+    assert list(data["Speed"]) == [ "30%" ] * 4 + [ "50%" ] * 4
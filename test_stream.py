@@ -0,0 +1,66 @@
+"""Checks the crash-safe files of kuka.stream : the samples written come
+back from `recover`, up to the last complete batch
+
+Usage : python -m pytest test_stream.py
+"""
+
+import numpy as np
+
+from kuka.store import SampleStore
+from kuka.stream import SampleWriter, recover
+
+def frames ():
+    store = SampleStore()
+    store.begin(load=1, speed=50)
+    width = store.channels.read + 1
+    for start in (1, 6):
+        samples = np.zeros((5, width))
+        samples[:, 0] = 12.0 * np.arange(start, start + 5)
+        samples[:, store.channels.read] = np.arange(start, start + 5)
+        store.extend(samples, start + 5, 1.0)
+        yield store.flush()
+
+def test_round_trip (tmp_path):
+    path = tmp_path / "samples.csv"
+    with SampleWriter(str(path)) as writer:
+        for frame in frames():
+            writer.write(frame)
+    assert writer.rows == 10
+
+    data = recover(str(path))
+    assert data.attrs["complete"]
+    assert len(data) == 10
+    assert np.array_equal(data["Queue_Read"], np.arange(1, 11))
+    assert np.array_equal(data["Sample_time"], 12.0 * np.arange(1, 11))
+    assert list(data["Load"].cat.categories) == [ 1 ]
+
+def test_crash (tmp_path):
+    path = tmp_path / "samples.csv"
+    writer = SampleWriter(str(path))
+    first, second = frames()
+    writer.write(first)
+
+    # The process dies while writing the second batch
+    text = second.to_csv(index=False, header=False, lineterminator="\n")
+    writer._file.write(text[:len(text) // 2])
+    writer._file.close()
+
+    data = recover(str(path))
+    assert not data.attrs["complete"]
+    assert np.array_equal(data["Queue_Read"], np.arange(1, 6))
+
+def test_empty (tmp_path):
+    path = tmp_path / "samples.csv"
+    with SampleWriter(str(path)):
+        pass
+
+    data = recover(str(path))
+    assert data.attrs["complete"]
+    assert len(data) == 0
+    assert "Queue_Read" in data.columns
+
+def test_due (tmp_path):
+    with SampleWriter(str(tmp_path / "samples.csv"), batch=10, period=60) as writer:
+        assert not writer.due(0)
+        assert not writer.due(9)
+        assert writer.due(10)
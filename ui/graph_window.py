@@ -8,7 +8,7 @@ class CollectionGraphWindow (sg.Window):
     lock = Semaphore(1)
     enable = True
 
-    def __init__(self, cell: int, enable: True):
+    def __init__(self, cell: int, enable: True, title: str = None):
         """ : Class constructor
         With __make_layout, generate a pysimplegui window to be shown when a colelction sequence on a robot is lauched
         give a dynamic view of the robot buffer fill level and sample latency with plot
@@ -16,6 +16,7 @@ class CollectionGraphWindow (sg.Window):
         Return : sg.Window
         """
         self.cell = cell
+        self._title_text = title if title is not None else f'Robot {cell}'
 
         self._data_buffer = []
         self._data_latency = []
@@ -23,7 +24,7 @@ class CollectionGraphWindow (sg.Window):
         self._s = 0
         self.enable = enable
         
-        super().__init__(f'Robot {cell}', self.__make_layout(), finalize=True)
+        super().__init__(self._title_text, self.__make_layout(), finalize=True)
         
         # Canvas settings enabled if system variables are collected
         if self.enable:
@@ -45,7 +46,7 @@ class CollectionGraphWindow (sg.Window):
             self._fig_agg.get_tk_widget().pack(side='top', fill='both', expand=1)
         
     def __make_layout (self):
-        self._title = sg.Text(f'Robot {self.cell}', key="-TITLE-", font='Helvetica 20', size=(20,3), justification='center')
+        self._title = sg.Text(self._title_text, key="-TITLE-", font='Helvetica 20', size=(20,3), justification='center')
         self._subtitle = sg.Text("Collecting Data ...", key="Subtitle")
         if self.enable:
             self._canvas_elem = sg.Canvas(size=(480,360), key="-CANVAS-")
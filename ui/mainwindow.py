@@ -6,32 +6,47 @@ from .ui_gripper import UI_Gripper
 from .ui_latency import UI_Latency
 from .ui_robot_load import UI_RobotLoad
 from .ui_trace import UI_KUKATrace
+from kuka.cells import CellRegistry
 
 sg.theme("SystemDefaultForReal")
 
 class MainWindow (sg.Window):
+
+    # Robot load frames per row
+    robots_per_row = 3
     
-    def __init__ (self, *args, **kwargs):
+    def __init__ (self, cells: CellRegistry = None, *args, **kwargs):
         """_summary_ : Class constructor
         With __make_layout, generate the pysimplegui window of the GUI containing all the frames from the other UI class
         Frames are stored in the class variables to be accessed
+        Args:
+            cells (CellRegistry, optional): The robots. Defaults to None (read from cells.json, or the three cells of the lab).
         Return : sg.Window
         """   
+        self.cells = cells if cells is not None else CellRegistry.load()
         super().__init__("Data Collection", self.__make_layout(), finalize = True, *args, *kwargs)
     
     def __make_layout (self):
 
-        self.collection_settings = UI_Collection_Settings()
+        self.collection_settings = UI_Collection_Settings(self.cells)
         self.kukatrace = UI_KUKATrace()
-        self.robots = [ UI_RobotLoad(i) for i in range(1, 4) ]
+        self.robots = [ UI_RobotLoad(cell.number, cell.name) for cell in self.cells ]
         self.latency = UI_Latency()
         self.data = UI_Data()
-        self.gripper = UI_Gripper()
+        self.gripper = UI_Gripper([ cell.name for cell in self.cells ])
+
+        # Load frames, a few per row
+        robot_rows = []
+        for i in range(0, len(self.robots), self.robots_per_row):
+            row = []
+            for robot in self.robots[i:i + self.robots_per_row]:
+                row += [ robot, sg.Push() ]
+            robot_rows.append(row[:-1])
 
         self._layout = [ 
             [ self.collection_settings ],
             [ self.kukatrace ],
-            [ self.robots[0], sg.Push(), self.robots[1], sg.Push(), self.robots[2] ],
+            *robot_rows,
             [ self.latency, self.gripper],
             [  sg.Push(), self.data, sg.Push() ],
             [ sg.Text("COS0028 - PIE0073, from the work of Bc. Adam Batrla BAT0050, 2024")]
@@ -48,10 +63,10 @@ class MainWindow (sg.Window):
         Returns:
             _type_: category of the robot load
         """
-        if cell - 1 > len(self.robots):
+        if cell not in self.cells.numbers:
             return -1
         
-        robot = self.robots[cell - 1]
+        robot = self.robots[self.cells.index(cell)]
 
         setup = robot.setup # method from UI_robotload
         
@@ -1,12 +1,13 @@
 import PySimpleGUI as sg
-import numpy as np
 import traceback
-from threading import Semaphore
-from typing import Callable
 from os import _exit
 
 from ui import CollectionGraphWindow
 from kuka import KUKA_DataReader, KUKA_Handler
+from kuka.cells import Cell
+from kuka.process import KUKA_CollectorProcess, RunBarrier, STATE_COLLECTED, STATE_FAILED, STATE_STORED
+from kuka.stats import LatencyHistogram
+from kuka.stream import SampleWriter
 
 class Measure_robot (CollectionGraphWindow):
     """Measurement window for a robot
@@ -21,31 +22,54 @@ class Measure_robot (CollectionGraphWindow):
     dosysvar = False
     dotrace = False
 
-    # Latency data [Not used]
-    latencies = np.zeros(0)
+    # Latency data (s) between two samples
+    latencies: LatencyHistogram = None
 
-    def __init__ (self, handler: KUKA_Handler, cell: int, dosysvar: bool, dotrace: bool, file_prefix: str, temp_dir: str = ".\\temp"):
+    # Latest sample loss reported by the reader
+    loss_message: str = None
+
+    # Collector process, when the robot is collected in a separate process
+    collector: KUKA_CollectorProcess = None
+    _messages = 0
+
+    def __init__ (self, handler: KUKA_Handler, cell: Cell, dosysvar: bool, dotrace: bool, file_prefix: str, temp_dir: str = ".\\temp", isolated: bool = False):
         """Creates a new measurement window, showing the user the progression of the collection
         If system variables collection is enabled in the measurement config, it will plot the number of buffered data and network latency
         If not, it will be a simple window, updating when robot movement is done and when the data file is saved
 
         Args:
             handler (KUKA_Handler): The Kuka Handler
-            cell (int): The number of the cell (from 1 to 3)
+            cell (Cell): The cell, from the cell registry
             dosysvar / dotrace (bool) : True if the system variable / kuka trace collection method is enabled
             file_prefix (str): The prefix for the output file name     
             temp_dir (str, optional): The temporary working dir for the Kuka Trace parsing. Defaults to ".\temp".
+            isolated (bool, optional): Collects the robot in a separate process, see `start_process`. Defaults to False.
         """        
         
-        super().__init__(cell, dosysvar)
+        super().__init__(cell.number, dosysvar, cell.name)
         self._dosysvar = dosysvar
         self._dotrace = dotrace
 
-        self.cell = cell
-        self.name = f"Robot {cell}"
+        self.cell = cell.number
+        self.name = cell.name
         self.reader = KUKA_DataReader(handler, dosysvar, dotrace)
         self.file_prefix = file_prefix
         self.temp_dir = temp_dir
+        self.latencies = LatencyHistogram()
+        self.reader.losses.alert = self.__on_loss
+
+        if isolated:
+            self.collector = KUKA_CollectorProcess(cell, dosysvar, dotrace)
+
+    def __on_loss (self, message: str):
+        """Reports a sample loss. Called by the collection thread.
+
+        Args:
+            message (str): The description of the loss
+        """
+
+        print(message)
+        self.loss_message = message
         
     def generate_file_name (self, A_iter, speed, sampling, load, trace_config = "4_ms"):
         """Creates a suffix for the output file name containing the acquisition
@@ -84,7 +108,7 @@ class Measure_robot (CollectionGraphWindow):
 
         return self.file_name
     
-    def measure_sequence (self, A_iter, speed, sampling, trace_sampling, load: int = 0, lock: Semaphore = None, done: Callable = None):
+    def measure_sequence (self, A_iter, speed, sampling, trace_sampling, load: int = 0, barrier: RunBarrier = None):
         """Runs the acquisition and saves the result in .xlsx files
 
         Args:
@@ -93,8 +117,7 @@ class Measure_robot (CollectionGraphWindow):
             sampling (str|int): The sampling rate of the system variables
             trace_sampling (str): The name of the configuration for KUKA Trace
             load (int, optional): The class of the acquisition. Defaults to 0.
-            lock (Semaphore, optional): The semaphore used to sync multiple robots. Defaults to None.
-            done (Callable, optional): The function used to declare the end of a run. Defaults to None.
+            barrier (RunBarrier, optional): The barrier used to sync multiple robots. Defaults to None.
         """        
 
         self.generate_file_name(A_iter, speed, sampling, load)
@@ -102,23 +125,82 @@ class Measure_robot (CollectionGraphWindow):
         print("Starting data collection for " + self.name + " with settings " + self.settings)
         
         def next (latency: float, queue_read: int, queue_write: int):
-            # Changer 500 par la taille finale du buffer
-            buffer = queue_write - queue_read if queue_read <= queue_write else 20000 - queue_read + queue_write
+            buffer = queue_write - queue_read if queue_read <= queue_write else self.reader._buffer_size - queue_read + queue_write
             self.add(buffer, latency)
-            self.latencies = np.append(self.latencies, latency)
+            self.latencies.add(latency)
+
+        # Streaming the samples to disk, so that an aborted run can be recovered
+        if self._dosysvar:
+            self.reader.stream = SampleWriter(self.file_name + ".csv")
 
         try:   
             # launch data collection with configuration
-            self.data, self.trace_data = self.reader.acquire(A_iter, speed, sampling, trace_sampling, next, done, load, lock, self.temp_dir)            
+            done = barrier.done if barrier is not None else None
+            self.data, self.trace_data = self.reader.acquire(A_iter, speed, sampling, trace_sampling, next, done, load, barrier, self.temp_dir)            
             self.collecting_data_done = True
 
         except Exception as e:
             self.collecting_data_done = True
             traceback.print_exception(e)
+            if self.reader.stream is not None:
+                print(f"Samples collected from {self.name} until the error are in {self.reader.stream.path}")
+
+        # The other robots no longer wait for this one
+        if barrier is not None:
+            barrier.leave()
+
+        if self.reader.stream is not None:
+            self.reader.stream.close()
 
         # save data in xlsx file
         self.export_measures()
 
+    def start_process (self, A_iter, speed, sampling, trace_sampling, load: int = 0, barrier: RunBarrier = None):
+        """Starts the acquisition in the collector process, which streams and
+        saves the files itself. Its progress is read by `_poll`.
+
+        Args:
+            A_iter (List[int]): The number of iteration for each axis
+            speed (str|int|slice): The speed (range) of the acquisition
+            sampling (str|int): The sampling rate of the system variables
+            trace_sampling (str): The name of the configuration for KUKA Trace
+            load (int, optional): The class of the acquisition. Defaults to 0.
+            barrier (RunBarrier, optional): The barrier used to sync multiple robots. Defaults to None.
+        """
+
+        self.generate_file_name(A_iter, speed, sampling, load)
+
+        print("Starting data collection for " + self.name + " in a separate process with settings " + self.settings)
+
+        self.collector.start(
+            A_iter, speed, sampling, trace_sampling, load, barrier, self.temp_dir,
+            stream_path=self.file_name + ".csv" if self._dosysvar else None,
+            outputs=(self.file_name + ".xlsx", self.trace_file_name + "_TRACE.xlsx")
+        )
+
+    def _pull (self):
+        """Gets the progress of the collector process. MUST BE CALLED BY THE MAIN THREAD.
+        """
+
+        feed = self.collector.feed
+        for buffer, latency in feed.pull():
+            self.add(int(buffer), latency)
+            self.latencies.add(latency)
+        self._s = feed.count
+
+        messages, message = feed.message()
+        if messages != self._messages:
+            self._messages = messages
+            self.loss_message = message
+
+        state = feed.state
+        if state == STATE_FAILED or (state != STATE_STORED and self.collector.process is not None and not self.collector.alive):
+            self.collecting_data_done = True
+            print(self.name + " failed to collect data")
+        elif state >= STATE_COLLECTED:
+            self.collecting_data_done = True
+            self.storing_data_done = state == STATE_STORED
+
     def export_measures (self):
         """Exports the internally-stored DataFrames to .xlsx files
         """        
@@ -148,12 +230,23 @@ class Measure_robot (CollectionGraphWindow):
         """        
 
         event, value = self.read(timeout=10)
+
+        if self.collector is not None and not (self.storing_data_done or self.collecting_data_done):
+            self._pull()
         
         if event == sg.WIN_CLOSED or event == '-colexit-':
             if not (self.storing_data_done or self.collecting_data_done):
+                if self.collector is not None:
+                    self.collector.terminate()
+                    if self._dosysvar:
+                        print(f"Collection aborted, the samples of {self.name} can be recovered from {self.file_name}.csv")
                 if self.dotrace:
                     self.reader.trace.Trace_Stop()
+                if self.reader.stream is not None:
+                    print(f"Collection aborted, the samples of {self.name} can be recovered from {self.reader.stream.path}")
                 _exit(0)
+            if self.collector is not None:
+                self.collector.close()
             self.close()
             return False
         
@@ -165,6 +258,8 @@ class Measure_robot (CollectionGraphWindow):
             self._exit.update(disabled=True, text="Exit")
         elif self._dosysvar:
             self.redraw()
+            if self.loss_message is not None:
+                self._status.update(self.loss_message, text_color="#f80")
         if not self._dosysvar:
             self._subtitle.update("Kuka trace started\nRobot running")
         return True
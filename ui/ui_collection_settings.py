@@ -3,6 +3,8 @@ from datetime import datetime
 from dateutil import tz
 import os
 
+from kuka.cells import CellRegistry
+
 TZ = tz.gettz("Europe/Prague") 
 
 class UI_Collection_Settings (sg.Frame):
@@ -14,14 +16,19 @@ class UI_Collection_Settings (sg.Frame):
     _not_connected = "#99c"
     _connected = "#3f3"
     _errored = "#f33"
-    _robot_status = [ _not_connected, _not_connected, _not_connected ] 
+    _robot_status = [ ]
+
+    # Robot buttons per row
+    robots_per_row = 6
 
-    def __init__ (self):
+    def __init__ (self, cells: CellRegistry = None):
         """_summary_ : Class constructor
         With __make_layout, generate a pysimplegui frame to be integrated in the main window for the configuration related elements
         sg elements like checkbox and buttons are stored in the class to be accessed easily
         Return : sg.Frame
         """
+        self.cells = cells if cells is not None else CellRegistry.default()
+        self._robot_status = [ self._not_connected ] * len(self.cells)
         super().__init__("Collection Settings", self.__make_layout(), expand_x=True)
 
     def __make_layout (self):
@@ -44,10 +51,13 @@ class UI_Collection_Settings (sg.Frame):
         self._input_max_speed =  sg.InputText('40', key='-rob_speed_max-', size=(3, 1), font=("Consolas", 10), disabled=True)
         self._input_speed_step = sg.InputText('10', key='-rob_speed_step-', size=(3, 1), font=("Consolas", 10), disabled=True)
 
-        self._robot_selector = [ sg.Button(f"Robot {i}", key=f"-rob_select:{i}-") for i in range(1,4) ]
+        self._robot_selector = [ sg.Button(cell.name, key=f"-rob_select:{cell.number}-") for cell in self.cells ]
+        n = self.robots_per_row
+        selector_rows = [ [ sg.Push(), *self._robot_selector[i:i + n] ] for i in range(n, len(self._robot_selector), n) ]
 
         self.docollect_sysvar = sg.Checkbox('Enable Sysvar', key='-docollect_sysvar-', size=(15, 1), default=False)
         self.docollect_trace = sg.Checkbox('Enable Kuka Traces', key='-docollect_trace-', size=(15, 1), default=True)
+        self.docollect_process = sg.Checkbox('One process per robot', key='-docollect_process-', size=(20, 1), default=False)
         
         self._layout = [
             [ sg.Text("Dataset name :"), self._input_dataset_name, sg.Button("Auto Name", key="-dataset_auto-name-", font=("Consolas", 10)) ],
@@ -60,8 +70,10 @@ class UI_Collection_Settings (sg.Frame):
                 sg.Text("% To :"),          self._input_max_speed,
                 sg.Text("% Step :"),      self._input_speed_step
             ],
-            [ sg.Text("Selected robots : "), sg.Push(), *self._robot_selector ],
-            [ sg.Text("Colelction methods to use : "), self.docollect_sysvar, self.docollect_trace ]
+            [ sg.Text("Selected robots : "), sg.Push(), *self._robot_selector[:n] ],
+            *selector_rows,
+            [ sg.Text("Colelction methods to use : "), self.docollect_sysvar, self.docollect_trace ],
+            [ sg.Text("Collectors : "), self.docollect_process ]
         ]
         return self._layout
     
@@ -93,7 +105,7 @@ class UI_Collection_Settings (sg.Frame):
         """_summary_
         updates the state of the variable _robot_status, giving the state of the robots
         Args:
-            cell (int): nuber of the robot (1,2,3)
+            cell (int): position of the robot in the cell registry
             connected (bool): give True to indicate that the connection to the robot is successful
             errored (bool, optional): Defaults to False, give True if the robot connection is errored
         """
@@ -154,6 +166,7 @@ class UI_Collection_Settings (sg.Frame):
         self._input_max_speed.update(disabled=self._constant_speed or v, text_color="#000")
         self._input_speed_step.update(disabled=self._constant_speed or v, text_color="#000")
         self.doconst_speed.update(disabled=v)
+        self.docollect_process.update(disabled=v)
         
         self.sample_rate.update(disabled=v)
         
@@ -4,17 +4,18 @@ class UI_Gripper (sg.Frame):
 
     _disabled = False
     
-    def __init__ (self):
+    def __init__ (self, names: list = None):
         """_summary_ : Class constructor
         With __make_layout, generate a pysimplegui frame to be integrated in the main window to control the gripper state of a robot
         If robot selected in the Combo is connected, open or close the gripper with buttons
         Return : sg.Frame
         """         
+        self._names = names if names is not None else [ 'Robot 1', 'Robot 2', 'Robot 3' ]
         super().__init__("Gripper", self.__make_layout())
 
     def __make_layout (self):
 
-        self.robot_choice = sg.Combo(['Robot 1', 'Robot 2', 'Robot 3'], default_value='Robot 2', key='-Rob_choice-')
+        self.robot_choice = sg.Combo(self._names, default_value=self._names[min(1, len(self._names) - 1)], key='-Rob_choice-')
         self._btn_open = sg.Button('Open', key='-BTN_open_gripper-')
         self._btn_close = sg.Button('Close', key='-BTN_close_gripper-')
 
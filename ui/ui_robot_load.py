@@ -4,14 +4,14 @@ class UI_RobotLoad (sg.Frame):
     
     _disabled = False
 
-    def __init__ (self, i: int):
+    def __init__ (self, i: int, name: str = None):
         """_summary_ : Class constructor
         With __make_layout, generate a pysimplegui frame to be integrated in the main window for one Robot load parameters
         sg elements like checkbox and buttons are stored in the class to be accessed easily
         Return : sg.Frame
         """       
         self.i = i
-        super().__init__(f"Robot {i}", self.__make_layout())
+        super().__init__(name if name is not None else f"Robot {i}", self.__make_layout())
 
     def __make_layout (self):
 